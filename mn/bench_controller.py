@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+'''Benchmarks SimpleSwitch14 over TCP with emulated OpenFlow switches.
+
+Like cbench, it starts ryu-manager with simple_switch_14.py (or uses a
+controller that is already listening), connects a number of emulated
+OF1.4 datapaths to it, and has them send packet-ins. The switches
+answer the handshake, echo, barrier and multipart requests the
+controller sends, and otherwise only count what comes back, so no
+Mininet or OVS is needed and the numbers only depend on the
+controller.
+
+Every packet-in carries an ICMP frame to the server from one of --macs
+source MACs in turn, with the server sending every so often so its MAC
+stays learned. With --rate, packet-ins are sent at that total rate;
+without it, each switch keeps --window packet-ins unanswered at all
+times, which measures the most the controller can take.
+
+Reported per run:
+- packet-ins sent and answered (by a PacketOut) per second, over each
+  second of the run,
+- FlowMods per second, and the latency from a packet-in to the FlowMod
+  it caused (percentiles in ms),
+- the controller's resident memory before and after, and its peak.
+
+usage: python3 bench_controller.py [--switches 16] [--macs 100000]
+           [--rate R | --window W] [--duration 10] [--set option=value]
+'''
+
+import argparse
+from collections import deque
+import json
+import os
+import selectors
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+# sets up sys.path so the ryu package isn't shadowed by ryu.py
+import bench_packet_in
+from bench_packet_in import (
+    ATTACKER_PORT,
+    SERVER_EVERY,
+    SERVER_MAC,
+    SERVER_PORT,
+    make_frame,
+)
+
+from ryu.ofproto import ofproto_v1_4 as ofproto
+
+HEADER = struct.Struct('!BBHI')
+FEATURES = struct.Struct(ofproto.OFP_SWITCH_FEATURES_PACK_STR)
+MULTIPART = struct.Struct(ofproto.OFP_MULTIPART_REPLY_PACK_STR)
+PORT = struct.Struct(ofproto.OFP_PORT_PACK_STR)
+PORT_ETHERNET = struct.Struct(ofproto.OFP_PORT_DESC_PROP_ETHERNET_PACK_STR)
+SWITCH_CONFIG = struct.Struct(ofproto.OFP_SWITCH_CONFIG_PACK_STR)
+PACKET_IN = struct.Struct(ofproto.OFP_PACKET_IN_PACK_STR)
+# the FlowMod fields before its match
+FLOW_MOD = struct.Struct('!QQBBHHHIIIHH')
+PACKET_OUT = struct.Struct(ofproto.OFP_PACKET_OUT_PACK_STR)
+OXM_HEADER = struct.Struct('!I')
+
+OFPT_NAMES = {value: name for name, value in vars(ofproto).items()
+              if name.startswith('OFPT_')}
+
+SERVER = bytes.fromhex(SERVER_MAC.replace(':', ''))
+
+# an unanswered switch gives up on its outstanding packet-ins after this
+STALL = 1.0
+
+
+def _message(kind: int, body: bytes = b'', xid: int = 0) -> bytes:
+    return HEADER.pack(ofproto.OFP_VERSION, kind, HEADER.size + len(body),
+                       xid) + body
+
+
+def packet_in(in_port: int, frame: bytes) -> bytes:
+    '''Returns an unbuffered table-miss OFPT_PACKET_IN carrying frame.'''
+    oxm = OXM_HEADER.pack(ofproto.OXM_OF_IN_PORT) + struct.pack('!I', in_port)
+    match = struct.pack('!HH', ofproto.OFPMT_OXM, 4 + len(oxm)) + oxm
+    match += bytes(-len(match) % 8)
+    body = PACKET_IN.pack(ofproto.OFP_NO_BUFFER, len(frame),
+                          ofproto.OFPR_TABLE_MISS, 0, 0) \
+        + match + bytes(2) + frame
+    return _message(ofproto.OFPT_PACKET_IN, body)
+
+
+def _port(port_no: int) -> bytes:
+    prop = PORT_ETHERNET.pack(ofproto.OFPPDPT_ETHERNET, PORT_ETHERNET.size,
+                              0, 0, 0, 0, 10000000, 10000000)
+    hw_addr = bytes([2, 0, 0, 0, 0, port_no & 0xff])
+    name = 'eth{}'.format(port_no).encode()
+    return PORT.pack(port_no, PORT.size + len(prop), hw_addr, name, 0, 0) \
+        + prop
+
+
+def flow_mod_eth_src(msg: bytes) -> Optional[bytes]:
+    '''Returns the eth_src a FlowMod ADD matches on, if any.'''
+    command = msg[HEADER.size + 17]
+    if command != ofproto.OFPFC_ADD:
+        return None
+    offset = HEADER.size + FLOW_MOD.size
+    _, length = struct.unpack_from('!HH', msg, offset)
+    end = offset + length
+    offset += 4
+    while offset + 4 <= end:
+        oxm, = OXM_HEADER.unpack_from(msg, offset)
+        size = oxm & 0xff
+        if (oxm >> 16 == ofproto.OFPXMC_OPENFLOW_BASIC
+                and (oxm >> 9) & 0x7f == ofproto.OFPXMT_OFB_ETH_SRC):
+            return bytes(msg[offset + 4:offset + 10])
+        offset += 4 + size
+    return None
+
+
+def packet_out_eth_src(msg: bytes) -> Optional[bytes]:
+    '''Returns the source MAC of the frame a PacketOut carries, if any.'''
+    _, _, actions_len = PACKET_OUT.unpack_from(msg, HEADER.size)
+    data = HEADER.size + PACKET_OUT.size + actions_len
+    if len(msg) < data + 12:
+        return None
+    return bytes(msg[data + 6:data + 12])
+
+
+class EmulatedSwitch:
+    '''One OF1.4 datapath on its own TCP connection to the controller.'''
+
+    def __init__(self, dpid: int, address, ports: int = 4):
+        self.dpid = dpid
+        self.ports = ports
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+
+        self.rbuf = bytearray()
+        self.wbuf = bytearray()
+        # whether the selector is waiting for the socket to be writable
+        self.writing = False
+        self.ready = False
+
+        # (sent at, source MAC, FlowMod seen) of unanswered packet-ins
+        self.pending = deque()
+        self.last_answer = 0.0
+        self.counts = dict.fromkeys(('packet_ins', 'packet_outs',
+                                     'flow_mods', 'unanswered'), 0)
+        self.latencies = []
+        self.other = {}
+
+        self.wbuf += _message(ofproto.OFPT_HELLO)
+
+    def send_packet_in(self, msg: bytes, src: bytes, now: float):
+        if not self.pending:
+            self.last_answer = now
+        self.wbuf += msg
+        self.pending.append([now, src, False])
+        self.counts['packet_ins'] += 1
+
+    def flush(self) -> bool:
+        '''Writes what it can. Returns True if something is left.'''
+        if self.wbuf:
+            try:
+                sent = self.sock.send(self.wbuf)
+            except BlockingIOError:
+                sent = 0
+            del self.wbuf[:sent]
+        return bool(self.wbuf)
+
+    def receive(self, now: float) -> bool:
+        '''Reads and handles what arrived. Returns False once closed.'''
+        try:
+            data = self.sock.recv(1 << 20)
+        except BlockingIOError:
+            return True
+        if not data:
+            return False
+        self.rbuf += data
+
+        buf = self.rbuf
+        offset = 0
+        while len(buf) - offset >= HEADER.size:
+            _, kind, length, xid = HEADER.unpack_from(buf, offset)
+            if len(buf) - offset < length:
+                break
+            self._handle(kind, xid, bytes(buf[offset:offset + length]), now)
+            offset += length
+        del buf[:offset]
+        return True
+
+    def _handle(self, kind: int, xid: int, msg, now: float):
+        if kind == ofproto.OFPT_PACKET_OUT:
+            self._answered(packet_out_eth_src(msg), now)
+        elif kind == ofproto.OFPT_FLOW_MOD:
+            self.counts['flow_mods'] += 1
+            src = flow_mod_eth_src(msg)
+            if src is not None:
+                for entry in self.pending:
+                    if entry[1] == src and not entry[2]:
+                        entry[2] = True
+                        self.latencies.append(now - entry[0])
+                        break
+        elif kind == ofproto.OFPT_ECHO_REQUEST:
+            self.wbuf += _message(ofproto.OFPT_ECHO_REPLY,
+                                  bytes(msg[HEADER.size:]), xid)
+        elif kind == ofproto.OFPT_FEATURES_REQUEST:
+            self.wbuf += _message(ofproto.OFPT_FEATURES_REPLY, FEATURES.pack(
+                self.dpid, 0, 254, 0, 0, 0), xid)
+        elif kind == ofproto.OFPT_MULTIPART_REQUEST:
+            mp_type, = struct.unpack_from('!H', msg, HEADER.size)
+            body = b''
+            if mp_type == ofproto.OFPMP_PORT_DESC:
+                body = b''.join(_port(port_no)
+                                for port_no in range(1, self.ports + 1))
+                self.ready = True
+            self.wbuf += _message(ofproto.OFPT_MULTIPART_REPLY,
+                                  MULTIPART.pack(mp_type, 0) + body, xid)
+        elif kind == ofproto.OFPT_BARRIER_REQUEST:
+            self.wbuf += _message(ofproto.OFPT_BARRIER_REPLY, b'', xid)
+        elif kind == ofproto.OFPT_GET_CONFIG_REQUEST:
+            self.wbuf += _message(ofproto.OFPT_GET_CONFIG_REPLY,
+                                  SWITCH_CONFIG.pack(0, 0xffff), xid)
+        elif kind != ofproto.OFPT_HELLO:
+            name = OFPT_NAMES.get(kind, kind)
+            self.other[name] = self.other.get(name, 0) + 1
+
+    def _answered(self, src: Optional[bytes], now: float):
+        '''Pops the packet-in a PacketOut answered (and any skipped).'''
+        self.counts['packet_outs'] += 1
+        self.last_answer = now
+        while self.pending:
+            entry = self.pending.popleft()
+            if src is None or entry[1] == src:
+                return
+            self.counts['unanswered'] += 1
+
+    def give_up(self, now: float):
+        '''Forgets packet-ins that have gone unanswered for too long.'''
+        if self.pending and now - self.last_answer > STALL:
+            self.counts['unanswered'] += len(self.pending)
+            self.pending.clear()
+            self.last_answer = now
+
+    def reset(self):
+        self.counts = dict.fromkeys(self.counts, 0)
+        self.latencies = []
+
+    def close(self):
+        self.sock.close()
+
+
+def _rss(pid: int) -> Dict[str, float]:
+    '''Returns the resident and peak memory (MB) of pid and its children.'''
+    total = {'rss': 0.0, 'peak': 0.0}
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open('/proc/{}/status'.format(pid)) as fp:
+                for line in fp:
+                    if line.startswith('VmRSS:'):
+                        total['rss'] += int(line.split()[1]) / 1024
+                    elif line.startswith('VmHWM:'):
+                        total['peak'] += int(line.split()[1]) / 1024
+            with open('/proc/{0}/task/{0}/children'.format(pid)) as fp:
+                pids.extend(int(child) for child in fp.read().split())
+        except OSError:
+            continue
+    return total
+
+
+def start_controller(
+        port: int,
+        options: List[str],
+        log: Optional[str] = None) -> Tuple[subprocess.Popen, str]:
+    '''Starts ryu-manager with simple_switch_14.py on port.
+
+    options are [simple_switch] option=value overrides. Returns the
+    process and the config file written for it, which the caller
+    removes once the process has exited.
+    '''
+    config = tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False)
+    with config:
+        config.write('[simple_switch]\n')
+        for option in options:
+            name, value = option.split('=', 1)
+            config.write('{} = {}\n'.format(name, value))
+
+    app = os.path.join(bench_packet_in.HERE, 'simple_switch_14.py')
+    out = open(log, 'w') if log else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen(
+            ['ryu-manager', '--ofp-tcp-listen-port', str(port),
+             '--config-file', config.name, app],
+            stdout=out, stderr=subprocess.STDOUT)
+    except OSError:
+        os.unlink(config.name)
+        raise
+    finally:
+        if log:
+            # the controller has its own copy
+            out.close()
+    return process, config.name
+
+
+def _wait_listening(address, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(address, timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def make_packet_ins(macs: int, size: int = 0) -> List[tuple]:
+    '''Returns (message, source MAC) pairs, one per distinct source,
+    with a frame from the server every SERVER_EVERY.
+    '''
+    rng = np.random.default_rng(0)
+    sources = rng.integers(0, 1 << 40, macs, dtype=np.uint64) | \
+        np.uint64(0x02 << 40)
+    messages = []
+    for i, source in enumerate(sources):
+        if i % SERVER_EVERY == 0:
+            frame = make_frame(SERVER_MAC, 'ff:ff:ff:ff:ff:ff', size)
+            messages.append((packet_in(SERVER_PORT, frame), SERVER))
+        src = int(source).to_bytes(6, 'big')
+        frame = make_frame(src.hex(':'), SERVER_MAC, size)
+        messages.append((packet_in(ATTACKER_PORT, frame), src))
+    return messages
+
+
+def run(
+        address,
+        switches: int,
+        messages: List[tuple],
+        duration: float,
+        warmup: float = 1.0,
+        rate: float = 0.0,
+        window: int = 64,
+        controller_pid: Optional[int] = None) -> Dict[str, object]:
+    '''Connects the switches, drives them and returns the results.'''
+
+    sel = selectors.DefaultSelector()
+    emulated = [EmulatedSwitch(dpid, address)
+                for dpid in range(1, switches + 1)]
+    for switch in emulated:
+        sel.register(switch.sock, selectors.EVENT_READ, switch)
+
+    def pump(timeout: float, now: float):
+        for key, events in sel.select(timeout):
+            switch = key.data
+            if events & selectors.EVENT_READ and not switch.receive(now):
+                raise ConnectionError('the controller closed switch {}'
+                                      .format(switch.dpid))
+        for switch in emulated:
+            blocked = switch.flush()
+            if blocked != switch.writing:
+                switch.writing = blocked
+                sel.modify(switch.sock, selectors.EVENT_READ
+                           | (selectors.EVENT_WRITE if blocked else 0),
+                           switch)
+
+    # handshake
+    deadline = time.monotonic() + 30
+    while not all(switch.ready for switch in emulated):
+        if time.monotonic() > deadline:
+            raise TimeoutError('switches did not finish the handshake')
+        pump(0.1, time.monotonic())
+    settle = time.monotonic() + 0.5
+    while time.monotonic() < settle:
+        pump(0.05, time.monotonic())
+
+    memory_before = _rss(controller_pid) if controller_pid else None
+
+    cursor = [0] * switches
+    sent = 0
+    start = time.monotonic()
+    measuring = start + warmup
+    end = measuring + duration
+    second = measuring + 1
+    per_second = []
+    answered_before = 0
+    next_switch = 0
+    measured = False
+
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if not measured and now >= measuring:
+            for switch in emulated:
+                switch.reset()
+            measured = True
+            sent = 0
+            start = now
+        if measured and now >= second:
+            answered = sum(s.counts['packet_outs'] for s in emulated)
+            per_second.append(answered - answered_before)
+            answered_before = answered
+            second += 1
+
+        if rate:
+            due = int((now - start) * rate) - sent
+        else:
+            due = switches * window
+        # deal out the packet-ins round-robin
+        idle = 0
+        while due > 0 and idle < switches:
+            switch = emulated[next_switch]
+            next_switch = (next_switch + 1) % switches
+            if not rate and len(switch.pending) >= window:
+                idle += 1
+                continue
+            idle = 0
+            msg, src = messages[cursor[switch.dpid - 1]]
+            cursor[switch.dpid - 1] = (cursor[switch.dpid - 1] + 1) \
+                % len(messages)
+            switch.send_packet_in(msg, src, now)
+            sent += 1
+            due -= 1
+
+        for switch in emulated:
+            switch.give_up(now)
+        pump(1 / rate if rate else 0.001, time.monotonic())
+
+    elapsed = time.monotonic() - start
+    counts = {name: sum(s.counts[name] for s in emulated)
+              for name in emulated[0].counts}
+    latencies = np.concatenate([np.array(s.latencies) for s in emulated]) \
+        * 1000
+    other = {}
+    for switch in emulated:
+        for name, count in switch.other.items():
+            other[name] = other.get(name, 0) + count
+        switch.close()
+    sel.close()
+
+    result = {
+        'switches': switches,
+        'rate': rate,
+        'window': window,
+        'duration': elapsed,
+        'packet_ins_per_sec': counts['packet_ins'] / elapsed,
+        'answered_per_sec': counts['packet_outs'] / elapsed,
+        'flow_mods_per_sec': counts['flow_mods'] / elapsed,
+        'per_second': per_second,
+        'unanswered': counts['unanswered'],
+        'latency_ms': {
+            'samples': len(latencies),
+            'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p90': float(np.percentile(latencies, 90)) if len(latencies) else None,
+            'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'max': float(latencies.max()) if len(latencies) else None,
+        },
+        'other_messages': other,
+    }
+    if controller_pid:
+        after = _rss(controller_pid)
+        result['memory_mb'] = {'before': memory_before['rss'],
+                               'after': after['rss'], 'peak': after['peak']}
+    return result
+
+
+def report(result: Dict[str, object]):
+    per_second = np.array(result['per_second'] or [0])
+    print('{} switches, {}'.format(
+        result['switches'],
+        '{:.0f} packet-ins/s offered'.format(result['rate'])
+        if result['rate'] else
+        'window of {} per switch'.format(result['window'])))
+    print('packet-ins sent:     {:10.0f}/s'
+          .format(result['packet_ins_per_sec']))
+    print('answered:            {:10.0f}/s (per second min {}, max {}, '
+          'std {:.0f})'.format(result['answered_per_sec'], per_second.min(),
+                               per_second.max(), per_second.std()))
+    print('flow mods:           {:10.0f}/s'
+          .format(result['flow_mods_per_sec']))
+    latency = result['latency_ms']
+    if latency['samples']:
+        print('flow mod latency:    p50 {:.2f} ms, p90 {:.2f} ms, '
+              'p99 {:.2f} ms, max {:.2f} ms ({} samples)'
+              .format(latency['p50'], latency['p90'], latency['p99'],
+                      latency['max'], latency['samples']))
+    if result['unanswered']:
+        print('unanswered:          {:10}'.format(result['unanswered']))
+    if 'memory_mb' in result:
+        memory = result['memory_mb']
+        print('controller RSS:      {:.1f} MB -> {:.1f} MB (peak {:.1f} MB)'
+              .format(memory['before'], memory['after'], memory['peak']))
+    if result['other_messages']:
+        print('other messages:      {}'.format(result['other_messages']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--controller', metavar='HOST:PORT',
+                        help='benchmark a controller that is already '
+                             'running instead of starting one')
+    parser.add_argument('--port', type=int, default=6653,
+                        help='port of the controller that is started')
+    parser.add_argument('--switches', type=int, default=16,
+                        help='emulated switches')
+    parser.add_argument('--macs', type=int, default=10000,
+                        help='distinct source MACs per switch')
+    parser.add_argument('--size', type=int, default=0,
+                        help='frame size in bytes (default: minimal ICMP)')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='total packet-ins per second '
+                             '(0: as many as the window allows)')
+    parser.add_argument('--window', type=int, default=64,
+                        help='unanswered packet-ins per switch without '
+                             '--rate')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=1.0,
+                        help='seconds run before measuring')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='OPTION=VALUE',
+                        help='override a [simple_switch] option')
+    parser.add_argument('--log', help='file for the controller output')
+    parser.add_argument('--json', help='file to write the results to')
+    args = parser.parse_args()
+
+    process = config = None
+    if args.controller:
+        host, port = args.controller.rsplit(':', 1)
+        address = (host, int(port))
+    else:
+        address = ('127.0.0.1', args.port)
+        process, config = start_controller(args.port, args.set, args.log)
+
+    try:
+        _wait_listening(address)
+        messages = make_packet_ins(args.macs, args.size)
+        result = run(address, args.switches, messages, args.duration,
+                     args.warmup, args.rate, args.window,
+                     process.pid if process else None)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            os.unlink(config)
+
+    result['options'] = args.set
+    report(result)
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(result, fp, indent=2)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (ConnectionError, TimeoutError) as err:
+        print(err)
+        sys.exit(1)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+'''Compares the single and multi-table pipelines of SimpleSwitch14.
+
+The switch is emulated in-process: it keeps the flows the controller
+installs, looks every frame up in them, and only raises a packet-in on
+a table miss, so both the rule count and the packet-in count come out
+of the same run. Timeouts are not emulated; the counts are what the
+table holds before anything expires.
+
+Each round, every pair of benign hosts exchanges a frame, and the
+networkG.py background load sends 25 frames from fresh random source
+MACs to the server.
+
+usage: python3 bench_pipeline.py [--hosts H] [--rounds R] [--background B]
+'''
+
+import argparse
+import random
+import time
+
+# sets up sys.path so the ryu package isn't shadowed by ryu.py
+import bench_packet_in
+from bench_packet_in import FakeDatapath, make_events
+
+from ryu import cfg
+from ryu.ofproto import ofproto_v1_4_parser
+
+import simple_switch_14
+
+
+def mac(n: int) -> str:
+    return n.to_bytes(6, 'big').hex(':')
+
+
+class EmulatedSwitch(FakeDatapath):
+    '''A FakeDatapath that keeps flow tables and misses like a switch.
+
+    Frames output to a port in links (by a flow or a PacketOut) are
+    received by the switch at its other end, so several of them can
+    form a network.
+    '''
+
+    def __init__(self, dpid: int, app):
+        super().__init__(dpid)
+        self.app = app
+        # table_id -> match field names -> match values -> (priority, inst)
+        self.tables = {}
+        self.packet_ins = 0
+        # port -> (switch, port) at the other end of the link
+        self.links = {}
+        # ports that flooding reaches, besides the links
+        self.ports = set()
+
+    def link(self, port: int, other: 'EmulatedSwitch', other_port: int):
+        '''Connects port to other_port of other.'''
+        self.links[port] = (other, other_port)
+        other.links[other_port] = (self, port)
+
+    def send_msg(self, msg):
+        super().send_msg(msg)
+        if isinstance(msg, ofproto_v1_4_parser.OFPFlowMod):
+            self._flow_mod(msg)
+        elif isinstance(msg, ofproto_v1_4_parser.OFPPacketOut) and msg.data:
+            for action in msg.actions:
+                self._output(action.port, msg.in_port, bytes(msg.data))
+
+    def _output(self, port: int, in_port: int, frame: bytes):
+        if port == self.ofproto.OFPP_FLOOD:
+            ports = sorted((self.ports | set(self.links)) - {in_port})
+        else:
+            ports = [port]
+        for port in ports:
+            if port in self.links:
+                other, other_port = self.links[port]
+                other.receive(other_port, frame)
+
+    def _flow_mod(self, mod):
+        fields = sorted(mod.match.items())
+        names = tuple(name for name, _ in fields)
+        values = tuple(value for _, value in fields)
+        entries = self.tables.setdefault(mod.table_id, {}) \
+                             .setdefault(names, {})
+
+        if mod.command == self.ofproto.OFPFC_ADD:
+            entries[values] = (mod.priority, mod.instructions)
+        elif mod.command == self.ofproto.OFPFC_DELETE_STRICT:
+            entries.pop(values, None)
+
+    def flow_count(self, table_id: int) -> int:
+        return sum(len(entries)
+                   for entries in self.tables.get(table_id, {}).values())
+
+    def _lookup(self, table_id: int, fields):
+        '''Returns the instructions of the best matching flow, or None.'''
+        best = None
+        for names, entries in self.tables.get(table_id, {}).items():
+            try:
+                values = tuple(fields[name] for name in names)
+            except KeyError:
+                continue
+            entry = entries.get(values)
+            if entry is not None and (best is None or entry[0] > best[0]):
+                best = entry
+        return None if best is None else best[1]
+
+    def receive(self, in_port: int, frame: bytes):
+        '''Runs a frame through the pipeline.'''
+        dst, src, eth_type = simple_switch_14.ETH_HEADER.unpack_from(frame)
+        fields = {'in_port': in_port,
+                  'eth_src': src.hex(':'),
+                  'eth_dst': dst.hex(':'),
+                  'eth_type': eth_type}
+
+        table_id = 0
+        while table_id is not None:
+            inst = self._lookup(table_id, fields)
+            if inst is None:
+                return
+            table_id = None
+            for i in inst:
+                if isinstance(i, ofproto_v1_4_parser.OFPInstructionGotoTable):
+                    table_id = i.table_id
+                elif isinstance(i, ofproto_v1_4_parser.OFPInstructionActions):
+                    for action in i.actions:
+                        if action.port != self.ofproto.OFPP_CONTROLLER:
+                            self._output(action.port, in_port, frame)
+                            continue
+                        self.packet_ins += 1
+                        ev = make_events(self, [(in_port, frame)])[0]
+                        self.app._packet_in_handler(ev)
+
+
+def run(pipeline: str, hosts: int, rounds: int, background: int):
+    cfg.CONF.set_override('pipeline', pipeline, group='simple_switch')
+    app = simple_switch_14.SimpleSwitch14()
+    switch = EmulatedSwitch(4, app)
+
+    parser = switch.ofproto_parser
+    features = parser.OFPSwitchFeatures(switch)
+    features.datapath = switch
+    app.switch_features_handler(
+        simple_switch_14.ofp_event.EventOFPSwitchFeatures(features))
+
+    # host i is on port i; host 1 is the server
+    macs = {port: mac(port) for port in range(1, hosts + 1)}
+    attacker_port = hosts + 1
+    frames = []
+    for _ in range(rounds):
+        for a in macs:
+            for b in macs:
+                if a != b:
+                    frames.append((a, bench_packet_in.make_frame(
+                        macs[a], macs[b])))
+        for _ in range(background):
+            src = '02' + mac(random.getrandbits(40))[2:]
+            frames.append((attacker_port, bench_packet_in.make_frame(
+                src, macs[1])))
+
+    start = time.perf_counter()
+    for in_port, frame in frames:
+        switch.receive(in_port, frame)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'frames': len(frames),
+        'packet_ins': switch.packet_ins,
+        'table0': switch.flow_count(0),
+        'table1': switch.flow_count(1),
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=10,
+                        help='benign hosts talking to each other')
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='rounds of traffic')
+    parser.add_argument('--background', type=int, default=25,
+                        help='random-source frames per round (networkG.py)')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='OPTION=VALUE',
+                        help='override a [simple_switch] option')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='ryu')
+    cfg.CONF.set_override('fast_path', True, group='simple_switch')
+    for override in args.set:
+        name, value = override.split('=', 1)
+        cfg.CONF.set_override(name, value, group='simple_switch')
+
+    print('{} hosts, {} rounds, {} background frames per round'
+          .format(args.hosts, args.rounds, args.background))
+    print('{:12} {:>8} {:>10} {:>8} {:>8} {:>12}'.format(
+        'pipeline', 'frames', 'packet-ins', 'table 0', 'table 1',
+        'packet-in/s'))
+    for pipeline in ('single', 'multi-table'):
+        random.seed(0)
+        result = run(pipeline, args.hosts, args.rounds, args.background)
+        print('{:12} {:8} {:10} {:8} {:8} {:12.0f}'.format(
+            pipeline, result['frames'], result['packet_ins'],
+            result['table0'], result['table1'],
+            result['packet_ins'] / result['elapsed']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+'''Generates benign background traffic from precompiled pcap files.
+
+A traffic profile is a number of client flows, each from its own
+source MAC (so each one costs the switch a flow entry, as networkG.py's
+did), arriving at a mean rate of flows per second. Every flow sends a
+number of ICMP echo requests (or UDP datagrams) of some size, spaced
+by random gaps. Inter-arrival times, packets per flow, gaps and frame
+sizes are either Poisson-like (exponential / Poisson) or heavy-tailed
+(Pareto, with the same means, cut off at TAIL_CAP times the mean).
+
+The profile is compiled once into one pcap file per worker, with the
+flows dealt out round-robin, plus a traffic.json manifest. Running
+again with the same profile and directory reuses the files. They are
+then replayed in a loop by one persistent tcpreplay process per file,
+or, if tcpreplay isn't installed, by one Python worker process per
+file sending the same frames through an AF_PACKET socket.
+
+The defaults start about 5 flows per second, as networkG.py's 25
+flows every 5 seconds did. A high rate is opt-in, e.g.
+--flows 10000 --rate 1000, and fills a 100-flow table by itself.
+
+usage: python3 benign_traffic.py [--flows N] [--rate R] [--dist pareto]
+           [--workers W] [--dir D] [--iface bh-eth0]
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import time
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+import numpy as np
+
+from mac_pool import MacPool, to_bytes
+
+PACKET_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('flow', np.uint32),
+    ('seq', np.uint16),
+    ('size', np.uint16),
+])
+
+# frame sizes (without FCS)
+MIN_FRAME = 60
+MAX_FRAME = 1514
+HEADERS = 14 + 20 + 8
+
+PCAP_HEADER = struct.Struct('<IHHiIII')
+PCAP_RECORD = struct.Struct('<IIII')
+PCAP_MAGIC = 0xa1b2c3d4
+LINKTYPE_ETHERNET = 1
+
+IPV4 = struct.Struct('!BBHHHBBH4s4s')
+ICMP_ECHO = struct.Struct('!BBHHH')
+UDP = struct.Struct('!HHHH')
+
+MANIFEST = 'traffic.json'
+
+# heavy-tailed values are cut off at this many times their mean
+TAIL_CAP = 100
+
+
+def _draw(
+        rng: np.random.Generator,
+        dist: str,
+        mean: float,
+        n: int,
+        shape: float) -> np.ndarray:
+    '''Draws n non-negative values with (about) the given mean.'''
+    if dist == 'poisson':
+        return rng.exponential(mean, n)
+    # Lomax (Pareto II) has mean scale / (shape - 1); bounded, or one
+    # draw can outlast the rest of the trace
+    return np.minimum(rng.pareto(shape, n) * mean * (shape - 1),
+                      mean * TAIL_CAP)
+
+
+def _counts(
+        rng: np.random.Generator,
+        dist: str,
+        mean: float,
+        n: int,
+        shape: float,
+        low: int,
+        high: int) -> np.ndarray:
+    '''Draws n integers in [low, high] with a mean near the given one.'''
+    if dist == 'poisson':
+        values = low + rng.poisson(max(mean - low, 0), n)
+    else:
+        values = low + np.floor(_draw(rng, dist, max(mean - low, 0), n, shape))
+    return np.clip(values, low, high).astype(np.int64)
+
+
+class TrafficProfile:
+    '''What the benign clients send.'''
+
+    def __init__(
+            self,
+            flows: int = 1000,
+            rate: float = 5.0,
+            packets: float = 8.0,
+            gap: float = 0.05,
+            size: float = 512.0,
+            dist: str = 'poisson',
+            shape: float = 1.5,
+            proto: str = 'icmp',
+            src: str = '10.0.0.1',
+            dst: str = '10.0.0.3',
+            dst_mac: str = '00:00:00:00:00:03',
+            port: int = 5001,
+            seed: int = 0):
+        '''rate is in new flows per second, packets the mean number of
+        packets per flow, gap the mean seconds between a flow's packets
+        and size the mean frame size in bytes.
+
+        dist is 'poisson' or 'pareto'; shape is the Pareto shape, which
+        must be over 1 for the means to exist.
+        '''
+
+        if flows < 1 or rate <= 0:
+            raise ValueError('flows and rate must be positive (got: {}, {})'
+                             .format(flows, rate))
+        if dist not in ('poisson', 'pareto'):
+            raise ValueError('dist must be poisson or pareto (got: {})'
+                             .format(dist))
+        if dist == 'pareto' and shape <= 1:
+            raise ValueError('shape must be over 1 (got: {})'.format(shape))
+        if proto not in ('icmp', 'udp'):
+            raise ValueError('proto must be icmp or udp (got: {})'
+                             .format(proto))
+
+        self.flows = flows
+        self.rate = rate
+        self.packets = packets
+        self.gap = gap
+        self.size = size
+        self.dist = dist
+        self.shape = shape
+        self.proto = proto
+        self.src = src
+        self.dst = dst
+        self.dst_mac = dst_mac
+        self.port = port
+        self.seed = seed
+
+    def params(self) -> Dict[str, object]:
+        return dict(vars(self))
+
+    def schedule(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns (packets, macs): a PACKET_DTYPE array sorted by time
+        and the source MAC of each flow.
+        '''
+
+        rng = np.random.default_rng(self.seed)
+        n = self.flows
+
+        # scaled so the flows arrive at exactly rate on average, which
+        # a heavy tail otherwise only does over very long traces
+        arrivals = _draw(rng, self.dist, 1 / self.rate, n, self.shape)
+        arrivals[0] = 0
+        if n > 1:
+            arrivals *= (n - 1) / self.rate / arrivals.sum()
+        starts = np.cumsum(arrivals)
+        counts = _counts(rng, self.dist, self.packets, n, self.shape, 1,
+                         0xffff)
+
+        total = int(counts.sum())
+        flow = np.repeat(np.arange(n, dtype=np.uint32), counts)
+        # position of each packet within its flow
+        first = np.cumsum(counts) - counts
+        seq = np.arange(total) - np.repeat(first, counts)
+
+        gaps = _draw(rng, self.dist, self.gap, total, self.shape)
+        gaps[seq == 0] = 0
+        offsets = np.cumsum(gaps)
+        offsets -= np.repeat(offsets[first], counts)
+
+        packets = np.empty(total, dtype=PACKET_DTYPE)
+        packets['time'] = starts[flow] + offsets
+        packets['flow'] = flow
+        packets['seq'] = seq
+        packets['size'] = _counts(rng, self.dist, self.size, total,
+                                  self.shape, MIN_FRAME, MAX_FRAME)
+        packets.sort(order='time', kind='stable')
+
+        macs = MacPool(capacity=n, seed=self.seed).generate(n)
+        return packets, macs
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack('!{}H'.format(len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+class _Framer:
+    '''Builds the frames of a profile.'''
+
+    def __init__(self, profile: TrafficProfile, macs: np.ndarray):
+        self.profile = profile
+        self.proto = 1 if profile.proto == 'icmp' else 17
+        self.src = socket.inet_aton(profile.src)
+        self.dst = socket.inet_aton(profile.dst)
+        dst_mac = bytes.fromhex(profile.dst_mac.replace(':', ''))
+        self.eth = [dst_mac + mac + b'\x08\x00' for mac in to_bytes(macs)]
+        # one ICMP id / UDP source port per flow
+        self.ident = np.random.default_rng(profile.seed).integers(
+            1024, 0xffff, len(macs))
+
+    def frame(self, flow: int, seq: int, size: int) -> bytes:
+        payload = size - HEADERS
+        ip = IPV4.pack(0x45, 0, 20 + 8 + payload, seq, 0x4000, 64,
+                       self.proto, 0, self.src, self.dst)
+        ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+
+        ident = int(self.ident[flow])
+        if self.proto == 1:
+            # the payload is zeros, so it adds nothing to the checksum
+            icmp = ICMP_ECHO.pack(8, 0, 0, ident, seq)
+            l4 = ICMP_ECHO.pack(8, 0, _checksum(icmp), ident, seq)
+        else:
+            # a zero UDP checksum means none over IPv4
+            l4 = UDP.pack(ident, self.profile.port, 8 + payload, 0)
+        return self.eth[flow] + ip + l4 + bytes(payload)
+
+
+def write_pcap(path: str, times: np.ndarray, frames: List[bytes]):
+    with open(path, 'wb') as fp:
+        fp.write(PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, 65535,
+                                  LINKTYPE_ETHERNET))
+        for t, frame in zip(times, frames):
+            sec = int(t)
+            usec = int(round((t - sec) * 1e6))
+            if usec == 1000000:
+                sec, usec = sec + 1, 0
+            fp.write(PCAP_RECORD.pack(sec, usec, len(frame), len(frame)))
+            fp.write(frame)
+
+
+def read_pcap(path: str) -> Tuple[np.ndarray, List[bytes]]:
+    '''Returns the timestamps and frames of a pcap written by write_pcap.'''
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    magic = struct.unpack_from('<I', data)[0]
+    if magic != PCAP_MAGIC:
+        raise ValueError('{} is not a little-endian pcap file'.format(path))
+
+    times = []
+    frames = []
+    offset = PCAP_HEADER.size
+    while offset + PCAP_RECORD.size <= len(data):
+        sec, usec, length, _ = PCAP_RECORD.unpack_from(data, offset)
+        offset += PCAP_RECORD.size
+        times.append(sec + usec / 1e6)
+        frames.append(data[offset:offset + length])
+        offset += length
+    return np.array(times), frames
+
+
+def compile_traffic(
+        profile: TrafficProfile,
+        directory: str,
+        workers: int = 1) -> Dict[str, object]:
+    '''Writes the profile as workers pcap files in directory, unless the
+    manifest there shows they already hold it. Returns the manifest.
+    '''
+
+    params = profile.params()
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as fp:
+            manifest = json.load(fp)
+        if manifest['profile'] == params and manifest['workers'] == workers \
+                and all(os.path.exists(os.path.join(directory, name))
+                        for name in manifest['files']):
+            return manifest
+
+    os.makedirs(directory, exist_ok=True)
+    packets, macs = profile.schedule()
+    framer = _Framer(profile, macs)
+
+    files = []
+    shard = packets['flow'] % workers
+    for worker in range(workers):
+        rows = packets[shard == worker]
+        name = 'traffic-{}.pcap'.format(worker)
+        write_pcap(os.path.join(directory, name), rows['time'],
+                   [framer.frame(int(row['flow']), int(row['seq']),
+                                 int(row['size']))
+                    for row in rows])
+        files.append(name)
+
+    duration = float(packets['time'][-1])
+    arrivals = float(packets['time'][packets['seq'] == 0].max())
+    manifest = {
+        'profile': params,
+        'workers': workers,
+        'files': files,
+        'flows': profile.flows,
+        'packets': len(packets),
+        'bytes': int(packets['size'].sum()),
+        'duration': duration,
+        'arrivals': arrivals,
+    }
+    with open(path, 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+    return manifest
+
+
+def tcpreplay(
+        path: str,
+        iface: str,
+        loop: int = 0,
+        multiplier: float = 1.0) -> subprocess.Popen:
+    '''Starts a tcpreplay process replaying path (forever if loop is 0).'''
+    return subprocess.Popen([
+        'tcpreplay', '--intf1={}'.format(iface), '--loop={}'.format(loop),
+        '--multiplier={}'.format(multiplier), '--preload-pcap', '--quiet',
+        path,
+    ])
+
+
+def replay_worker(
+        path: str,
+        iface: str,
+        loop: int = 0,
+        multiplier: float = 1.0):
+    '''Replays path on iface at its timestamps (forever if loop is 0).'''
+    times, frames = read_pcap(path)
+    if not frames:
+        return
+    times = (times - times[0]) / multiplier
+    # leave a gap as long as the mean one before starting over
+    period = times[-1] + times[-1] / max(len(times) - 1, 1)
+
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((iface, 0))
+    done = 0
+    start = time.monotonic()
+    while not loop or done < loop:
+        for due, frame in zip(times, frames):
+            wait = start + due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            sock.send(frame)
+        done += 1
+        start += period
+    sock.close()
+
+
+def replay(
+        directory: str,
+        manifest: Dict[str, object],
+        iface: str,
+        loop: int = 0,
+        multiplier: float = 1.0,
+        backend: str = 'auto') -> list:
+    '''Starts one replaying process per file. Returns them.'''
+    if backend == 'auto':
+        backend = 'tcpreplay' if shutil.which('tcpreplay') else 'python'
+
+    paths = [os.path.join(directory, name) for name in manifest['files']]
+    if backend == 'tcpreplay':
+        return [tcpreplay(path, iface, loop, multiplier) for path in paths]
+
+    processes = [multiprocessing.Process(target=replay_worker,
+                                         args=(path, iface, loop, multiplier),
+                                         daemon=True)
+                 for path in paths]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def _wait(processes: list):
+    for process in processes:
+        if isinstance(process, subprocess.Popen):
+            process.wait()
+        else:
+            process.join()
+
+
+def _stop(processes: list):
+    for process in processes:
+        process.terminate()
+    _wait(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flows', type=int, default=1000,
+                        help='flows in the compiled traffic')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='mean new flows per second (the default '
+                             'fits in a 100-flow table with idle '
+                             'timeouts of 10 s)')
+    parser.add_argument('--packets', type=float, default=8.0,
+                        help='mean packets per flow')
+    parser.add_argument('--gap', type=float, default=0.05,
+                        help="mean seconds between a flow's packets")
+    parser.add_argument('--size', type=float, default=512.0,
+                        help='mean frame size in bytes')
+    parser.add_argument('--dist', choices=('poisson', 'pareto'),
+                        default='poisson',
+                        help='distribution of arrivals, flow and frame sizes')
+    parser.add_argument('--shape', type=float, default=1.5,
+                        help='Pareto shape (heavier tail when closer to 1)')
+    parser.add_argument('--proto', choices=('icmp', 'udp'), default='icmp',
+                        help='ICMP echo requests or UDP datagrams')
+    parser.add_argument('--src', default='10.0.0.1', help='source IP')
+    parser.add_argument('--dst', default='10.0.0.3', help='server IP')
+    parser.add_argument('--dst-mac', default='00:00:00:00:00:03',
+                        help='server MAC')
+    parser.add_argument('--port', type=int, default=5001,
+                        help='UDP destination port')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='pcap files / replaying processes')
+    parser.add_argument('--dir', default='benign-traffic',
+                        help='directory of the compiled pcap files')
+    parser.add_argument('--iface', help='interface to send on '
+                                        "(default: scapy's)")
+    parser.add_argument('--loop', type=int, default=0,
+                        help='times to replay the traffic (0: forever)')
+    parser.add_argument('--multiplier', type=float, default=1.0,
+                        help='replay this many times faster')
+    parser.add_argument('--backend', choices=('auto', 'tcpreplay', 'python'),
+                        default='auto', help='what replays the pcap files')
+    parser.add_argument('--compile-only', action='store_true',
+                        help="write the pcap files but don't send them")
+    args = parser.parse_args()
+
+    profile = TrafficProfile(args.flows, args.rate, args.packets, args.gap,
+                             args.size, args.dist, args.shape, args.proto,
+                             args.src, args.dst, args.dst_mac, args.port,
+                             args.seed)
+    start = time.perf_counter()
+    manifest = compile_traffic(profile, args.dir, args.workers)
+    print('{} flows starting over {:.1f}s ({:.0f} flows/s), {} packets and '
+          '{:.1f} MB over {:.1f}s ({:.0f} packets/s) in {} file(s), '
+          'ready in {:.1f}s'
+          .format(manifest['flows'], manifest['arrivals'],
+                  manifest['flows'] / max(manifest['arrivals'], 1e-6),
+                  manifest['packets'], manifest['bytes'] / 1e6,
+                  manifest['duration'],
+                  manifest['packets'] / max(manifest['duration'], 1e-6),
+                  len(manifest['files']), time.perf_counter() - start),
+          flush=True)
+    if args.compile_only:
+        return
+
+    iface = args.iface
+    if iface is None:
+        from scapy.all import conf
+        iface = str(conf.iface)
+    processes = replay(args.dir, manifest, iface, args.loop,
+                       args.multiplier, args.backend)
+    try:
+        _wait(processes)
+    except KeyboardInterrupt:
+        _stop(processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import ryu
+from flow_monitor import FlowMonitor
 import sys
 import os
+import subprocess
 import json
 import time
 
@@ -9,33 +11,38 @@ print("Made Ryu API instance")
 
 def getDataMetrics():
 
-    #Lists to hold flow rules
-    flow_rulesS4 = []
-    flow_rulesS5 = []
-    
-    while 1:
-        print("Getting JSON Response")
-        JSON_ResponseS4 = ryuI.aggregate_flow_stats(4)
-        JSON_ResponseS5 = ryuI.aggregate_flow_stats(5)
-    
-        print(JSON_ResponseS4)
-        print(JSON_ResponseS5)
-        print(time.asctime(time.localtime(time.time())))
-
-        print("Acquring flow count")
-        flow_rulesS4.append(JSON_ResponseS4['4'][0]['flow_count'])
-        flow_rulesS5.append( JSON_ResponseS5['5'][0]['flow_count'])
-        time.sleep(5)
-
-        print(flow_rulesS4)
-        print(flow_rulesS5)
-
-def changeSDNRuleCount():
-    os.system("ovs-vsctl -- --id=@ft create Flow_Table flow_limit=100 overflow_policy=refuse -- set Bridge s4 flow_tables=0=@ft")
-    os.system("ovs-vsctl -- --id=@ft create Flow_Table flow_limit=100 overflow_policy=refuse -- set Bridge s5 flow_tables=0=@ft")
-
-
-changeSDNRuleCount()
+    # samples every switch connected to the controller each second into
+    # a ring buffer and flows.bin, printing a summary every 5 seconds
+    monitor = FlowMonitor(ryuI, None, interval=1.0, output='flows.bin',
+                          summary=5.0)
+    monitor.run()
+
+def controllerBridges():
+    # the bridges of the switches connected to this controller, not
+    # every bridge on the host (other Mininet networks may run beside)
+    for _ in range(10):
+        dpids = ryuI.get_switches()
+        if dpids:
+            break
+        time.sleep(1)
+    else:
+        sys.exit("No switches are connected to the controller")
+
+    bridges = []
+    for dpid in dpids:
+        bridges += subprocess.run(
+            ["ovs-vsctl", "--bare", "--columns=name", "find", "Bridge",
+             'datapath_id="{:016x}"'.format(dpid)],
+            capture_output=True, text=True).stdout.split()
+    return bridges
+
+def changeSDNRuleCount(bridges):
+    for bridge in bridges:
+        os.system("ovs-vsctl -- --id=@ft create Flow_Table flow_limit=100 overflow_policy=refuse -- set Bridge {} flow_tables=0=@ft".format(bridge))
+
+
+# bridges may also be named on the command line, e.g. s4 s5
+changeSDNRuleCount(sys.argv[1:] or controllerBridges())
 print("Successfully changed rule count")
 
 getDataMetrics()
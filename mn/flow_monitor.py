@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+'''Samples the flow counts of a set of switches through RyuAPI.
+
+Every interval seconds, the aggregate flow stats of all the switches
+are requested concurrently. Each answer becomes one SAMPLE_DTYPE row,
+which goes into a fixed-size in-memory RingBuffer and, optionally, a
+TimeSeriesFile. Every summary seconds, one line per switch reports the
+latest count and the min/mean/max over the samples since the last
+summary.
+
+The time-series file can be read with load_time_series() while the
+monitor is still writing it.
+
+usage: python3 flow_monitor.py [--url HOST:PORT] [--dpids 4 5 ...]
+           [--interval 0.2] [--summary 5] [--output flows.bin]
+'''
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import (
+    Iterable,
+    Optional,
+)
+
+import numpy as np
+
+from ryu import RyuAPI, SwitchList
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('dpid', np.uint64),
+    ('flow_count', np.uint64),
+    ('packet_count', np.uint64),
+    ('byte_count', np.uint64),
+])
+
+# magic, version, record size, record count; padded to HEADER_SIZE
+HEADER = struct.Struct('<8sIIQ')
+HEADER_SIZE = 64
+MAGIC = b'LOFTFLOW'
+VERSION = 1
+
+# the file grows by at least this many bytes at a time
+GROW_BYTES = 1 << 20
+
+
+class RingBuffer:
+    '''Keeps the last capacity rows of a NumPy dtype.'''
+
+    def __init__(self, capacity: int, dtype: np.dtype = SAMPLE_DTYPE):
+        if capacity < 1:
+            raise ValueError('capacity must be positive (got: {})'
+                             .format(capacity))
+
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=dtype)
+        # total number of rows ever appended
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, rows: np.ndarray):
+        '''Adds rows, overwriting the oldest ones once full.'''
+        rows = rows[-self.capacity:]
+        start = self.count % self.capacity
+        head = min(len(rows), self.capacity - start)
+        self.data[start:start + head] = rows[:head]
+        self.data[:len(rows) - head] = rows[head:]
+        self.count += len(rows)
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        '''Returns a copy of the last n rows (default: all), oldest first.'''
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity
+        index = np.arange(end - n, end) % self.capacity
+        return self.data[index]
+
+
+class TimeSeriesFile:
+    '''An append-only file of rows, written through a memory map.
+
+    The header holds the number of complete rows, and it is only
+    updated after the rows themselves are written, so a reader never
+    sees a partial row. Space is allocated ahead in GROW_BYTES steps,
+    and the file is trimmed to its rows on close(). Opening an
+    existing file appends to it.
+    '''
+
+    def __init__(self, path: str, dtype: np.dtype = SAMPLE_DTYPE):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        size = os.fstat(self.fd).st_size
+        if size == 0:
+            self.count = 0
+            os.ftruncate(self.fd, HEADER_SIZE + GROW_BYTES)
+        else:
+            magic, version, itemsize, self.count = HEADER.unpack(
+                os.pread(self.fd, HEADER.size, 0))
+            if (magic, version, itemsize) != (MAGIC, VERSION,
+                                              self.dtype.itemsize):
+                os.close(self.fd)
+                raise ValueError('{} is not a compatible time-series file'
+                                 .format(path))
+        self._map()
+        self._write_header()
+
+    def _map(self):
+        self.size = os.fstat(self.fd).st_size
+        self.mm = mmap.mmap(self.fd, self.size)
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, self.dtype.itemsize,
+                         self.count)
+
+    def append(self, rows: np.ndarray):
+        '''Writes rows at the end of the file.'''
+        data = np.ascontiguousarray(rows, dtype=self.dtype).tobytes()
+        start = HEADER_SIZE + self.count * self.dtype.itemsize
+        end = start + len(data)
+
+        if end > self.size:
+            self.mm.close()
+            os.ftruncate(self.fd, end + GROW_BYTES)
+            self._map()
+
+        self.mm[start:end] = data
+        self.count += len(rows)
+        self._write_header()
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        os.ftruncate(self.fd, HEADER_SIZE + self.count * self.dtype.itemsize)
+        os.close(self.fd)
+
+
+def load_time_series(
+        path: str,
+        dtype: np.dtype = SAMPLE_DTYPE) -> np.ndarray:
+    '''Returns the rows written to a TimeSeriesFile so far.
+
+    The result is a read-only memory map, so this is cheap even for
+    large files and can be called while the file is being written.
+    '''
+
+    with open(path, 'rb') as f:
+        magic, version, itemsize, count = HEADER.unpack(f.read(HEADER.size))
+    if (magic, version, itemsize) != (MAGIC, VERSION, np.dtype(dtype).itemsize):
+        raise ValueError('{} is not a compatible time-series file'
+                         .format(path))
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE,
+                     shape=(count,))
+
+
+class FlowMonitor:
+    '''Samples aggregate flow stats into a RingBuffer and a TimeSeriesFile.
+
+    Ticks are scheduled on a fixed grid of interval seconds. If a round
+    of requests takes longer than that, the missed ticks are skipped
+    (and counted) rather than run back to back.
+    '''
+
+    def __init__(
+            self,
+            api: RyuAPI,
+            dpids: Optional[Iterable[int]] = None,
+            interval: float = 1.0,
+            ring_size: int = 4096,
+            output: Optional[str] = None,
+            summary: float = 5.0):
+        '''With dpids=None, the switches are discovered (and refreshed)
+        through the controller's /stats/switches.
+        '''
+        if interval <= 0:
+            raise ValueError('interval must be positive (got: {})'
+                             .format(interval))
+
+        self.api = api
+        self.switches = SwitchList(api, dpids)
+        self.dpids = self.switches.dpids
+        self.interval = interval
+        self.summary = summary
+        self.ring = RingBuffer(ring_size)
+        self.store = TimeSeriesFile(output) if output else None
+
+        self.samples = 0
+        self.errors = 0
+        self.skipped = 0
+        # ring.count at the last summary
+        self._summarized = 0
+
+    def sample(self) -> np.ndarray:
+        '''Queries every switch once and records the answers.'''
+        self.dpids = self.switches()
+        now = time.time()
+        responses = self.api.aggregate_flow_stats_many(
+            self.dpids, timeout=self.interval)
+
+        rows = []
+        for dpid, restful_json in responses.items():
+            if restful_json is None:
+                self.errors += 1
+                continue
+            stats = restful_json[str(dpid)][0]
+            rows.append((now, dpid, stats['flow_count'],
+                         stats['packet_count'], stats['byte_count']))
+
+        rows = np.array(rows, dtype=SAMPLE_DTYPE)
+        self.ring.append(rows)
+        if self.store is not None:
+            self.store.append(rows)
+        self.samples += len(rows)
+        return rows
+
+    def report(self) -> str:
+        '''Summarizes the samples taken since the last report.'''
+        window = self.ring.latest(self.ring.count - self._summarized)
+        self._summarized = self.ring.count
+
+        lines = ['{} samples={} errors={} skipped={}'.format(
+            time.strftime('%H:%M:%S'), self.samples, self.errors,
+            self.skipped)]
+        for dpid in self.dpids:
+            counts = window['flow_count'][window['dpid'] == dpid]
+            if not len(counts):
+                lines.append('  s{}: no samples'.format(dpid))
+                continue
+            lines.append('  s{}: flows={} min={} mean={:.1f} max={} n={}'
+                         .format(dpid, counts[-1], counts.min(),
+                                 counts.mean(), counts.max(), len(counts)))
+        return '\n'.join(lines)
+
+    def run(self, duration: Optional[float] = None):
+        '''Samples until duration seconds have passed (or forever).'''
+        start = time.monotonic()
+        next_tick = start
+        next_summary = start + self.summary
+
+        try:
+            while duration is None or next_tick - start < duration:
+                self.sample()
+
+                now = time.monotonic()
+                if self.summary and now >= next_summary:
+                    print(self.report(), flush=True)
+                    next_summary += self.summary * (
+                        (now - next_summary) // self.summary + 1)
+
+                next_tick += self.interval
+                if now > next_tick:
+                    missed = int((now - next_tick) // self.interval) + 1
+                    self.skipped += missed
+                    next_tick += missed * self.interval
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+        finally:
+            if self.store is not None:
+                self.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='localhost:8080',
+                        help='host:port of the Ryu REST API')
+    parser.add_argument('--dpids', type=int, nargs='+',
+                        help='switches to sample (default: every switch '
+                             'the controller reports)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between samples')
+    parser.add_argument('--summary', type=float, default=5.0,
+                        help='seconds between summaries (0 to disable)')
+    parser.add_argument('--ring-size', type=int, default=4096,
+                        help='samples kept in memory')
+    parser.add_argument('--output', help='time-series file to append to')
+    parser.add_argument('--duration', type=float,
+                        help='stop after this many seconds')
+    args = parser.parse_args()
+
+    with RyuAPI(args.url, timeout=args.interval) as api:
+        monitor = FlowMonitor(api, args.dpids, args.interval,
+                              args.ring_size, args.output, args.summary)
+        try:
+            monitor.run(args.duration)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,667 @@
+#!/usr/bin/env python3
+'''A discrete-event simulator of an OVS-like flow table.
+
+SimulatedSwitch holds exact-match flows keyed by an int (a source MAC
+in practice) with idle and hard timeouts, up to flow_limit of them.
+When the table is full a new flow is either refused (OVS's default:
+the packet still reaches the controller, but nothing is installed) or
+evicts the flow closest to expiring. Expiry happens on a tick, like a
+switch that sweeps its table periodically (0 expires flows exactly on
+time). Everything runs on a SimClock, so waiting 20 s for a hard
+timeout costs nothing.
+
+A table miss asks a SimulatedController for the flow's timeouts. It
+uses the same TimeoutPolicy and (optional) FlowTable eviction as
+SimpleSwitch14, with FlowTable driven by the simulated clock, so the
+controller policies can be compared offline.
+
+Traffic is a pair of arrays (times, keys) sorted by time: benign()
+turns a benign_traffic.TrafficProfile into one, flood() makes the
+attack's one-new-source-per-packet stream, and merge() combines them.
+
+The switch also has the probe() and send() methods of RTTEngine, with
+hit and miss RTTs drawn from a noise model, so probe.Probing runs
+against it in simulated time (see probe_scenario). sweep() runs a
+scenario over a grid of parameters on all cores.
+
+usage: python3 flow_sim.py probes [--idle 5 10] [--hard 0 20] [--runs 20]
+       python3 flow_sim.py attack [--flow-limit 100] [--overflow refuse evict]
+'''
+
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import math
+import multiprocessing
+import time
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from benign_traffic import TrafficProfile
+from flow_table import FlowTable
+from timeout_policy import POLICIES, TimeoutPolicy
+
+# attack keys start here, outside the 48-bit MAC space
+ATTACK_BASE = 1 << 48
+
+# index of each field in a flow's list
+INSTALLED, LAST, IDLE, HARD = range(4)
+
+
+class SimClock:
+    '''Simulated time. sleep() returns at once, having moved time on.'''
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+    def advance(self, to: float):
+        '''Moves time forward to to (never backwards).'''
+        if to > self.now:
+            self.now = to
+
+
+class SimulatedController:
+    '''Picks the timeouts of new flows, like SimpleSwitch14.
+
+    With a flow_table (a FlowTable on the simulated clock), the
+    controller models the switch and deletes flows itself before the
+    switch fills up, as with the flow_table_size option.
+    '''
+
+    def __init__(
+            self,
+            policy: TimeoutPolicy = None,
+            flow_table: FlowTable = None,
+            delay: float = 0.0):
+        '''delay is how long after the miss the flow is installed.'''
+        self.policy = policy or TimeoutPolicy()
+        self.flow_table = flow_table
+        self.delay = delay
+
+    def install(self, switch: 'SimulatedSwitch', key: Hashable) \
+            -> Optional[Tuple[int, int]]:
+        '''Returns (idle_timeout, hard_timeout) for a new flow, or None
+        if it shouldn't be installed.
+        '''
+        occupancy = rate = 0.0
+        flows = self.flow_table
+        if flows is not None:
+            if key not in flows:
+                for victim in flows.evict():
+                    switch.delete(victim)
+            occupancy = flows.occupancy()
+            rate = flows.rate(key)
+            flows.add(key)
+        return self.policy.timeouts(occupancy, rate)
+
+    def removed(self, key: Hashable, reason: str):
+        '''Called when the switch removes a flow by itself.'''
+        if self.flow_table is not None:
+            self.flow_table.remove(key, reason)
+
+
+class SimulatedSwitch:
+    '''An exact-match flow table with timeouts and a flow_limit.'''
+
+    OVERFLOW = ('refuse', 'evict')
+
+    def __init__(
+            self,
+            clock: SimClock,
+            controller: SimulatedController = None,
+            flow_limit: int = 0,
+            overflow: str = 'refuse',
+            tick: float = 0.0,
+            hit_rtt: float = 0.001,
+            miss_rtt: float = 0.010,
+            jitter: float = 0.2,
+            tail: float = 0.0,
+            loss: float = 0.0,
+            send_time: float = 1e-4,
+            seed: int = None):
+        '''flow_limit 0 means no limit.
+
+        Probe RTTs are hit_rtt or miss_rtt times a lognormal factor
+        (sigma jitter); with probability tail a Pareto delay is added,
+        and with probability loss the probe is lost. Each probe sent
+        takes send_time of simulated time.
+        '''
+
+        if overflow not in self.OVERFLOW:
+            raise ValueError('overflow must be one of {} (got: {})'
+                             .format(self.OVERFLOW, overflow))
+
+        self.clock = clock
+        self.controller = controller or SimulatedController()
+        self.flow_limit = flow_limit
+        self.overflow = overflow
+        self.tick = tick
+        self.hit_rtt = hit_rtt
+        self.miss_rtt = miss_rtt
+        self.jitter = jitter
+        self.tail = tail
+        self.loss = loss
+        self.send_time = send_time
+        self.rng = np.random.default_rng(seed)
+
+        # key -> [installed, last hit, idle_timeout, hard_timeout]
+        self.flows = {}
+        # (deadline no later than the real one, key); stale entries are
+        # fixed up when they reach the top
+        self._deadlines = []
+
+        self.counts = dict.fromkeys(
+            ('hits', 'misses', 'installed', 'refused', 'evicted', 'deleted',
+             'idle', 'hard'), 0)
+
+    def __len__(self) -> int:
+        return len(self.flows)
+
+    def _deadline(self, flow: list) -> Tuple[float, str]:
+        '''Returns when (and why) a flow expires.'''
+        idle = flow[LAST] + flow[IDLE] if flow[IDLE] else math.inf
+        hard = flow[INSTALLED] + flow[HARD] if flow[HARD] else math.inf
+        deadline, reason = (hard, 'hard') if hard <= idle else (idle, 'idle')
+        if self.tick and deadline < math.inf:
+            deadline = math.ceil(deadline / self.tick) * self.tick
+        return deadline, reason
+
+    def expire(self, now: float = None):
+        '''Removes the flows whose timeouts have passed by now.'''
+        if now is None:
+            now = self.clock.now
+        heap = self._deadlines
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            flow = self.flows.get(key)
+            if flow is None:
+                continue
+            deadline, reason = self._deadline(flow)
+            if deadline <= now:
+                del self.flows[key]
+                self.counts[reason] += 1
+                self.controller.removed(key, reason)
+            else:
+                heapq.heappush(heap, (deadline, key))
+
+    def _evict(self):
+        '''Removes the flow that would expire first.'''
+        heap = self._deadlines
+        while heap:
+            expected, key = heapq.heappop(heap)
+            flow = self.flows.get(key)
+            if flow is None:
+                continue
+            deadline, _ = self._deadline(flow)
+            if deadline == expected:
+                del self.flows[key]
+                self.counts['evicted'] += 1
+                self.controller.removed(key, 'eviction')
+                return
+            heapq.heappush(heap, (deadline, key))
+
+        # nothing has a timeout; evict the oldest
+        key = next(iter(self.flows))
+        del self.flows[key]
+        self.counts['evicted'] += 1
+        self.controller.removed(key, 'eviction')
+
+    def delete(self, key: Hashable):
+        '''Deletes a flow at the controller's request.'''
+        if self.flows.pop(key, None) is not None:
+            self.counts['deleted'] += 1
+
+    def packet(self, key: Hashable) -> bool:
+        '''Looks a packet up at the current time. Returns True on a hit.
+
+        On a miss, the controller is asked for the flow, which is
+        installed after its delay if there is room (or room is made).
+        '''
+        now = self.clock.now
+        self.expire(now)
+
+        flow = self.flows.get(key)
+        if flow is not None:
+            if now >= flow[INSTALLED]:
+                flow[LAST] = now
+                self.counts['hits'] += 1
+                return True
+            # the FlowMod is still on its way
+            self.counts['misses'] += 1
+            return False
+
+        self.counts['misses'] += 1
+        timeouts = self.controller.install(self, key)
+        if timeouts is None:
+            return False
+
+        if self.flow_limit and len(self.flows) >= self.flow_limit:
+            if self.overflow == 'refuse':
+                self.counts['refused'] += 1
+                return False
+            self._evict()
+
+        installed = now + self.controller.delay
+        flow = [installed, installed, timeouts[0], timeouts[1]]
+        self.flows[key] = flow
+        heapq.heappush(self._deadlines, (self._deadline(flow)[0], key))
+        self.counts['installed'] += 1
+        return False
+
+    def _rtt(self, hit: bool) -> float:
+        rtt = (self.hit_rtt if hit else self.miss_rtt) \
+            * self.rng.lognormal(0, self.jitter)
+        if self.tail and self.rng.random() < self.tail:
+            rtt += self.rng.pareto(1.5) * self.miss_rtt
+        return rtt
+
+    @staticmethod
+    def _key(pkt) -> int:
+        return int(pkt.src.replace(':', ''), 16)
+
+    def send(self, pkts):
+        '''RTTEngine.send(): looks the frames up without timing them.'''
+        for pkt in pkts:
+            self.packet(self._key(pkt))
+            self.clock.sleep(self.send_time)
+
+    def probe(
+            self,
+            pkts,
+            timeout: float = 1.0,
+            spacing: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        '''RTTEngine.probe(): returns (rtts, lost) in simulated time.'''
+        n = len(pkts)
+        rtts = np.full(n, np.nan)
+        lost = np.zeros(n, dtype=bool)
+        for i, pkt in enumerate(pkts):
+            hit = self.packet(self._key(pkt))
+            if self.loss and self.rng.random() < self.loss:
+                lost[i] = True
+            else:
+                rtts[i] = self._rtt(hit)
+            self.clock.sleep(self.send_time + spacing)
+
+        # probe() returns once every reply is in, or at the timeout
+        replies = rtts[~lost]
+        self.clock.sleep(timeout if lost.any()
+                         else (replies.max() if len(replies) else 0.0))
+        return rtts, lost
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counts)
+        stats['flows'] = len(self.flows)
+        return stats
+
+
+def benign(profile: TrafficProfile) -> Tuple[np.ndarray, np.ndarray]:
+    '''Returns the (times, keys) of a benign traffic profile.'''
+    packets, macs = profile.schedule()
+    return packets['time'], macs[packets['flow']].astype(np.int64)
+
+
+def flood(
+        rate: float,
+        duration: float,
+        start: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    '''Returns (times, keys) of packets from a new source each, at rate.'''
+    n = int(rate * duration)
+    return (start + np.arange(n) / rate,
+            ATTACK_BASE + np.arange(n, dtype=np.int64))
+
+
+def merge(*streams: Tuple[np.ndarray, np.ndarray]) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''Merges (times, keys) streams. Returns (times, keys, source), where
+    source is the index of the stream each packet came from.
+    '''
+    times = np.concatenate([t for t, _ in streams])
+    keys = np.concatenate([k for _, k in streams])
+    source = np.concatenate([np.full(len(t), i, dtype=np.int8)
+                             for i, (t, _) in enumerate(streams)])
+    order = np.argsort(times, kind='stable')
+    return times[order], keys[order], source[order]
+
+
+def run(
+        switch: SimulatedSwitch,
+        times: np.ndarray,
+        keys: np.ndarray,
+        source: np.ndarray = None,
+        sample: float = 1.0) -> Dict[str, object]:
+    '''Plays packets through switch.
+
+    Returns the switch's counters, the hits and misses of each source,
+    and the table occupancy every sample seconds.
+    '''
+    clock = switch.clock
+    if source is None:
+        source = np.zeros(len(times), dtype=np.int8)
+    n_sources = int(source.max()) + 1 if len(source) else 1
+    hits = np.zeros(len(times), dtype=bool)
+
+    occupancy = []
+    next_sample = clock.now
+    packet = switch.packet
+    for i, (t, key) in enumerate(zip(times.tolist(), keys.tolist())):
+        while t >= next_sample:
+            clock.advance(next_sample)
+            switch.expire()
+            occupancy.append(len(switch))
+            next_sample += sample
+        clock.advance(t)
+        hits[i] = packet(key)
+
+    by_source = []
+    for s in range(n_sources):
+        mine = source == s
+        by_source.append({
+            'packets': int(mine.sum()),
+            'misses': int((mine & ~hits).sum()),
+            'keys': int(len(np.unique(keys[mine]))),
+        })
+
+    result = switch.stats()
+    result['sources'] = by_source
+    result['occupancy'] = occupancy
+    return result
+
+
+def probe_scenario(
+        idle: int = 10,
+        hard: int = 20,
+        sequential: bool = True,
+        tick: float = 0.5,
+        jitter: float = 0.2,
+        tail: float = 0.0,
+        loss: float = 0.0,
+        p1: float = 0.7,
+        t_max: int = 90,
+        flow_limit: int = 0,
+        overflow: str = 'refuse',
+        seed: int = 0) -> Dict[str, object]:
+    '''Probes a simulated switch's timeouts the way probing_accuracy.py
+    does. Returns the true and probed values, the simulated time and
+    how many of the probes' flows the switch refused or evicted.
+
+    t_max is the longest hard timeout the probe looks for (it must be
+    above hard), and the idle search's limit when none is found. p1 is
+    the sequential tests' (see sequential.SignSPRT); undecided counts
+    the ones that ran out of pairs and fell back to a t-test.
+    '''
+    import random
+
+    import probe
+
+    random.seed(seed)
+    clock = SimClock()
+    switch = SimulatedSwitch(
+        clock, SimulatedController(TimeoutPolicy(idle, hard)), flow_limit,
+        overflow, tick=tick, jitter=jitter, tail=tail, loss=loss, seed=seed)
+    prober = probe.Probing(sequential=sequential, p1=p1, engine=switch,
+                           clock=clock.time, sleep=clock.sleep)
+
+    start = time.perf_counter()
+    # the probes print their progress; keep sweeps readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        probed_hard = prober.mac_hard_timeout_probing(t_max=t_max)
+        t_sup = probed_hard if probed_hard > 0 else t_max
+        probed_idle = prober.mac_idle_timeout_search(t_sup=t_sup,
+                                                     t_hard=probed_hard)
+    return {
+        'idle': idle,
+        'hard': hard,
+        'probed_idle': probed_idle,
+        'probed_hard': probed_hard,
+        'idle_bound': prober.reports['mac_idle_timeout_search']['bound'],
+        'samples': sum(r['samples'] for r in prober.reports.values()),
+        'decisions': sum(r['decisions'] for r in prober.reports.values()),
+        'undecided': sum(r['undecided'] for r in prober.reports.values()),
+        'refused': switch.counts['refused'],
+        'evicted': switch.counts['evicted'],
+        'simulated': clock.now,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def attack_scenario(
+        flow_limit: int = 100,
+        overflow: str = 'refuse',
+        idle: int = 10,
+        hard: int = 20,
+        policy: str = 'fixed',
+        flow_table_size: int = 0,
+        attack_rate: float = 500.0,
+        attack_start: float = 10.0,
+        duration: float = 60.0,
+        flows: int = 1000,
+        rate: float = 5.0,
+        packets: float = 8.0,
+        gap: float = 0.5,
+        seed: int = 0) -> Dict[str, object]:
+    '''Runs benign clients and a flow-table flood through one switch.
+
+    The benign clients alone (rate new flows per second, each sending
+    packets packets gap seconds apart) fit in flow_limit; a flood of
+    attack_rate new sources per second does not. Returns the share of
+    benign packets that missed the table (so went through the
+    controller) with the flood and, from a run of the same benign
+    traffic without it, the baseline share, plus the switch counters.
+
+    A policy that uses the table's occupancy needs flow_table_size, as
+    in SimpleSwitch14; without it, it would run as fixed.
+    '''
+    if POLICIES[policy].uses_occupancy and flow_table_size <= 0:
+        raise ValueError('policy {} needs flow_table_size (got: {})'
+                         .format(policy, flow_table_size))
+
+    profile = TrafficProfile(flows=flows, rate=rate, packets=packets,
+                             gap=gap, seed=seed)
+    clients = benign(profile)
+
+    def play(attack: float) -> Tuple[Dict[str, object], int, float]:
+        clock = SimClock()
+        table = None
+        if flow_table_size:
+            table = FlowTable(flow_table_size, clock=clock.time)
+        controller = SimulatedController(
+            POLICIES[policy](idle_timeout=idle, hard_timeout=hard), table)
+        switch = SimulatedSwitch(clock, controller, flow_limit, overflow,
+                                 seed=seed)
+
+        times, keys, source = merge(
+            clients, flood(attack, duration - attack_start, attack_start))
+        keep = times < duration
+        times, keys, source = times[keep], keys[keep], source[keep]
+
+        start = time.perf_counter()
+        result = run(switch, times, keys, source)
+        return result, len(times), time.perf_counter() - start
+
+    def miss_ratio(result: Dict[str, object]) -> float:
+        clients = result['sources'][0]
+        return clients['misses'] / max(clients['packets'], 1)
+
+    baseline, _, baseline_elapsed = play(0.0)
+    result, packets, elapsed = play(attack_rate)
+    return {
+        'baseline_miss_ratio': miss_ratio(baseline),
+        'benign_miss_ratio': miss_ratio(result),
+        'packets': packets,
+        'refused': result['refused'],
+        'evicted': result['evicted'] + result['deleted'],
+        'mean_flows': float(np.mean(result['occupancy'] or [0])),
+        'simulated': 2 * duration,
+        'elapsed': baseline_elapsed + elapsed,
+    }
+
+
+def _call(job: Tuple[Callable, Dict[str, object]]) \
+        -> Tuple[Dict[str, object], Dict[str, object]]:
+    function, params = job
+    return params, function(**params)
+
+
+def sweep(
+        function: Callable[..., Dict[str, object]],
+        grid: Dict[str, Iterable],
+        processes: int = None) -> List[Tuple[Dict[str, object],
+                                             Dict[str, object]]]:
+    '''Calls function with every combination of the grid's values, in
+    processes worker processes (default: one per core).
+
+    Returns (params, result) pairs in grid order.
+    '''
+    names = list(grid)
+    jobs = [(function, dict(zip(names, values)))
+            for values in itertools.product(*(grid[name] for name in names))]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_call, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int,
+                        help='worker processes (default: one per core)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    probes = commands.add_parser('probes', help='probe simulated timeouts')
+    probes.add_argument('--idle', type=int, nargs='+', default=[5, 10, 30])
+    probes.add_argument('--hard', type=int, nargs='+', default=[0, 20, 60])
+    probes.add_argument('--jitter', type=float, nargs='+', default=[0.2],
+                        help='sigma of the lognormal RTT noise')
+    probes.add_argument('--tail', type=float, nargs='+', default=[0.0],
+                        help='share of RTTs with a heavy-tailed delay')
+    probes.add_argument('--p1', type=float, nargs='+', default=[0.7],
+                        help='how often the sequential tests take a miss '
+                             'to be slower than a hit')
+    probes.add_argument('--t-max', type=int,
+                        help='longest hard timeout probed for (default: '
+                             'the largest --hard plus 30)')
+    probes.add_argument('--fixed', action='store_true',
+                        help='use t-tests instead of sequential tests')
+    probes.add_argument('--flow-limit', type=int, nargs='+', default=[0],
+                        help='flows the switch holds (0: no limit)')
+    probes.add_argument('--overflow', nargs='+', default=['refuse'],
+                        choices=SimulatedSwitch.OVERFLOW)
+    probes.add_argument('--runs', type=int, default=10,
+                        help='seeds per combination')
+
+    attack = commands.add_parser('attack',
+                                 help='flood a simulated flow table')
+    attack.add_argument('--flow-limit', type=int, nargs='+', default=[100])
+    attack.add_argument('--overflow', nargs='+', default=['refuse', 'evict'],
+                        choices=SimulatedSwitch.OVERFLOW)
+    attack.add_argument('--policy', nargs='+', default=['fixed'],
+                        choices=sorted(POLICIES))
+    attack.add_argument('--flow-table-size', type=int, nargs='+',
+                        default=[0],
+                        help='controller-side eviction (0 disables it)')
+    attack.add_argument('--attack-rate', type=float, nargs='+',
+                        default=[500],
+                        help='new attack sources per second (each run is '
+                             'also compared with one without the attack)')
+    attack.add_argument('--idle', type=int, nargs='+', default=[10])
+    attack.add_argument('--hard', type=int, nargs='+', default=[20])
+    attack.add_argument('--duration', type=float, default=120.0)
+    attack.add_argument('--runs', type=int, default=1,
+                        help='seeds per combination')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'probes':
+        # a hard timeout of exactly t_max reads as none at all
+        t_max = args.t_max or max(args.hard) + 30
+        grid = {'idle': args.idle, 'hard': args.hard,
+                'jitter': args.jitter, 'tail': args.tail, 'p1': args.p1,
+                'sequential': [not args.fixed], 't_max': [t_max],
+                'flow_limit': args.flow_limit, 'overflow': args.overflow,
+                'seed': range(args.runs)}
+        results = sweep(probe_scenario, grid, args.processes)
+
+        print('{:>5} {:>5} {:>6} {:>5} {:>5} {:>6} {:>8} {:>9} {:>9} '
+              '{:>10} {:>10} {:>10} {:>10}'.format(
+                  'idle', 'hard', 'jitter', 'tail', 'p1', 'limit',
+                  'overflow', 'idle ok', 'hard ok', 'pairs/run',
+                  'undecided', 'lost/run', 'sim s/run'))
+        key = lambda item: (item[0]['idle'], item[0]['hard'],
+                            item[0]['jitter'], item[0]['tail'], item[0]['p1'],
+                            item[0]['flow_limit'], item[0]['overflow'])
+        for (idle, hard, jitter, tail, p1, limit, overflow), group in \
+                itertools.groupby(sorted(results, key=key), key=key):
+            group = [result for _, result in group]
+            # the probes report the first whole second the flows are gone
+            if idle < (hard or math.inf):
+                idle_ok = '{}/{}'.format(
+                    sum(abs(r['probed_idle'] - idle) <= 1 for r in group),
+                    len(group))
+            else:
+                # the hard timeout removes the flows first
+                idle_ok = 'n/a'
+            hard_ok = sum(abs(r['probed_hard'] - hard) <= 1 for r in group)
+            # share of the decisions that fell back to a t-test
+            undecided = (sum(r['undecided'] for r in group)
+                         / max(sum(r['decisions'] for r in group), 1))
+            # probe flows the full table refused or evicted
+            lost = np.mean([r['refused'] + r['evicted'] for r in group])
+            print('{:5} {:5} {:6.2f} {:5.2f} {:5.2f} {:6} {:>8} {:>9} {:>9} '
+                  '{:10.0f} {:10.2f} {:10.1f} {:10.0f}'
+                  .format(idle, hard, jitter, tail, p1, limit, overflow,
+                          idle_ok, '{}/{}'.format(hard_ok, len(group)),
+                          np.mean([r['samples'] for r in group]), undecided,
+                          lost, np.mean([r['simulated'] for r in group])))
+    else:
+        # occupancy would always be 0, so these would act like fixed
+        occupancy = [policy for policy in args.policy
+                     if POLICIES[policy].uses_occupancy]
+        if occupancy and 0 in args.flow_table_size:
+            parser.error('--policy {} needs a --flow-table-size above 0'
+                         .format(' '.join(occupancy)))
+        grid = {'flow_limit': args.flow_limit, 'overflow': args.overflow,
+                'policy': args.policy,
+                'flow_table_size': args.flow_table_size,
+                'attack_rate': args.attack_rate, 'idle': args.idle,
+                'hard': args.hard, 'duration': [args.duration],
+                'seed': range(args.runs)}
+        results = sweep(attack_scenario, grid, args.processes)
+
+        print('{:>6} {:>8} {:>9} {:>6} {:>7} {:>5} {:>5} {:>10} {:>10} '
+              '{:>8} {:>8} {:>6}'.format(
+                  'limit', 'overflow', 'policy', 'model', 'attack', 'idle',
+                  'hard', 'no attack', 'attacked', 'refused', 'evicted',
+                  'flows'))
+        for params, result in results:
+            print('{:6} {:>8} {:>9} {:6} {:7.0f} {:5} {:5} {:10.3f} {:10.3f} '
+                  '{:8} {:8} {:6.0f}'.format(
+                      params['flow_limit'], params['overflow'],
+                      params['policy'], params['flow_table_size'],
+                      params['attack_rate'], params['idle'], params['hard'],
+                      result['baseline_miss_ratio'],
+                      result['benign_miss_ratio'], result['refused'],
+                      result['evicted'], result['mean_flows']))
+
+    simulated = sum(result['simulated'] for _, result in results)
+    elapsed = time.perf_counter() - start
+    print('{} runs, {:.0f}s simulated in {:.1f}s ({:.0f}x real time)'
+          .format(len(results), simulated, elapsed, simulated / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+'''Streaming parser for Ryu's /stats/flow/<dpid> responses.
+
+A flow stats dump with tens of thousands of flows decodes into a large
+tree of dicts with resp.json(). parse_flow_stats() instead decodes one
+flow object at a time as the bytes arrive and keeps only the fields we
+analyse, in a NumPy structured array of FLOW_DTYPE. Memory then grows
+with the number of flows times the size of one row.
+'''
+
+import codecs
+import json
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+)
+
+import numpy as np
+
+# MACs are 48-bit ints; ports, MACs and timeouts are 0 when absent
+FLOW_DTYPE = np.dtype([
+    ('in_port', np.uint32),
+    ('eth_src', np.uint64),
+    ('eth_dst', np.uint64),
+    ('priority', np.uint16),
+    ('table_id', np.uint8),
+    ('idle_timeout', np.uint16),
+    ('hard_timeout', np.uint16),
+    ('packet_count', np.uint64),
+    ('byte_count', np.uint64),
+    ('duration', np.float64),
+])
+
+# rows decoded before they are packed into an array
+BATCH = 4096
+
+_decoder = json.JSONDecoder()
+
+
+def _mac(value) -> int:
+    '''Returns a MAC (possibly 'mac/mask') as an int, 0 if absent.'''
+    if not value:
+        return 0
+    return int(value.split('/', 1)[0].replace(':', ''), 16)
+
+
+def _row(flow: Dict[str, Any]) -> tuple:
+    match = flow.get('match', {})
+    return (
+        match.get('in_port', 0),
+        _mac(match.get('eth_src', match.get('dl_src'))),
+        _mac(match.get('eth_dst', match.get('dl_dst'))),
+        flow.get('priority', 0),
+        flow.get('table_id', 0),
+        flow.get('idle_timeout', 0),
+        flow.get('hard_timeout', 0),
+        flow.get('packet_count', 0),
+        flow.get('byte_count', 0),
+        flow.get('duration_sec', 0) + flow.get('duration_nsec', 0) / 1e9,
+    )
+
+
+def parse_flow_stats(chunks: Iterable[bytes]) -> np.ndarray:
+    '''Parses a {"<dpid>": [flow, ...]} body into a FLOW_DTYPE array.
+
+    chunks is any iterable of byte strings, e.g. resp.iter_content().
+    Only the first dpid in the body is read, which is all Ryu sends
+    for a single-switch request. Raises ValueError if the body ends
+    before the flow list does.
+    '''
+
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    in_list = False
+    done = False
+
+    rows = []
+    arrays = []
+
+    for chunk in chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+        if not in_list:
+            # skip '{"<dpid>": ['
+            start = buf.find('[')
+            if start < 0:
+                continue
+            pos = start + 1
+            in_list = True
+
+        while True:
+            # skip separators up to the next object or the list end
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf) or buf[pos] == ']':
+                break
+
+            try:
+                flow, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # the object continues in the next chunk
+                break
+            rows.append(_row(flow))
+            pos = end
+
+            if len(rows) == BATCH:
+                arrays.append(np.array(rows, dtype=FLOW_DTYPE))
+                rows = []
+
+        if in_list and pos < len(buf) and buf[pos] == ']':
+            done = True
+            break
+
+    if not done:
+        raise ValueError('flow stats body ended before the flow list')
+    if rows or not arrays:
+        arrays.append(np.array(rows, dtype=FLOW_DTYPE))
+    return np.concatenate(arrays)
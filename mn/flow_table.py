@@ -0,0 +1,258 @@
+'''Controller-side bookkeeping of the flows installed on switches.
+
+SimpleSwitch14 installs its exact-match flows with OFPFF_SEND_FLOW_REM
+and keeps a FlowTable per datapath, updated from FlowRemoved messages
+(and optionally flow stats replies). When the model gets close to the
+switch's flow_limit, the controller deletes flows itself, so new
+legitimate flows still fit instead of being refused by OVS.
+
+PendingInstalls tracks FlowMods that are still in flight, so a burst
+of packet-ins for the same flow only installs it once.
+'''
+
+from collections import OrderedDict
+import heapq
+import time
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+)
+
+
+class _Flow:
+    '''Bookkeeping for one installed flow.'''
+
+    __slots__ = ('installed', 'last_active', 'packet_count')
+
+    def __init__(self, now: float):
+        self.installed = now
+        self.last_active = now
+        self.packet_count = 0
+
+    def rate(self, now: float) -> float:
+        '''Packets per second since the flow was installed.'''
+        return self.packet_count / max(now - self.installed, 1e-3)
+
+
+class FlowTable:
+    '''Tracks installed flows and picks which ones to evict.
+
+    Flows are keyed by whatever the caller uses to identify a match,
+    e.g. (in_port, eth_src, eth_dst). Once the model holds
+    watermark * capacity flows, evict() returns enough victims to get
+    back below that mark. The victims are chosen by policy:
+
+    - 'lru': the flows that have gone longest without activity. Without
+      flow stats, activity is only seen at install time, so this
+      evicts the oldest flows first.
+    - 'least-active': the flows with the lowest packet rate since they
+      were installed, which needs flow stats to be meaningful.
+
+    The packet rate of recently removed flows is remembered (up to
+    capacity of them), so a flow that comes back can be recognised as
+    an established one.
+    '''
+
+    POLICIES = ('lru', 'least-active')
+
+    def __init__(
+            self,
+            capacity: int,
+            watermark: float = 0.9,
+            policy: str = 'lru',
+            clock: Callable[[], float] = time.monotonic):
+        if capacity < 1:
+            raise ValueError('capacity must be positive (got: {})'
+                             .format(capacity))
+        if not 0 < watermark <= 1:
+            raise ValueError('watermark must be in (0, 1] (got: {})'
+                             .format(watermark))
+        if policy not in self.POLICIES:
+            raise ValueError('policy must be one of {} (got: {})'
+                             .format(self.POLICIES, policy))
+
+        self.capacity = capacity
+        self.watermark = watermark
+        self.policy = policy
+        self.clock = clock
+        self.threshold = max(1, int(capacity * watermark))
+
+        # key -> _Flow, least recently active first
+        self._flows = OrderedDict()
+        # key -> packets per second, for flows no longer installed
+        self._history = OrderedDict()
+
+        self.installed = 0
+        self.evictions = 0
+        self.removed = {}
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flows
+
+    def occupancy(self) -> float:
+        '''Returns the fraction of the capacity in use.'''
+        return len(self._flows) / self.capacity
+
+    def rate(self, key: Hashable) -> float:
+        '''Returns the last known packet rate of a flow, or 0.'''
+        flow = self._flows.get(key)
+        if flow is not None and flow.packet_count:
+            return flow.rate(self.clock())
+        return self._history.get(key, 0.0)
+
+    def _remember(self, key: Hashable, rate: float):
+        history = self._history
+        history.pop(key, None)
+        history[key] = rate
+        if len(history) > self.capacity:
+            history.popitem(last=False)
+
+    def add(self, key: Hashable):
+        '''Records that a flow was installed (or reinstalled).'''
+        now = self.clock()
+        flows = self._flows
+        if key in flows:
+            flows.move_to_end(key)
+            flow = flows[key]
+            flow.last_active = now
+        else:
+            flows[key] = _Flow(now)
+        self.installed += 1
+
+    def touch(self, key: Hashable, packet_count: int):
+        '''Updates a flow's packet count from a flow stats reply.'''
+        flow = self._flows.get(key)
+        if flow is None:
+            return
+
+        if packet_count > flow.packet_count:
+            flow.last_active = self.clock()
+            self._flows.move_to_end(key)
+        flow.packet_count = packet_count
+
+    def remove(
+            self,
+            key: Hashable,
+            reason: str = 'unknown',
+            rate: Optional[float] = None) -> bool:
+        '''Forgets a flow the switch removed. Returns False if unknown.
+
+        rate is the flow's packet rate over its lifetime, as reported
+        in the FlowRemoved message.
+        '''
+        flow = self._flows.pop(key, None)
+        if flow is None:
+            return False
+        if rate is None:
+            rate = flow.rate(self.clock())
+        self._remember(key, rate)
+        self.removed[reason] = self.removed.get(reason, 0) + 1
+        return True
+
+    def evict(self) -> List[Hashable]:
+        '''Returns (and forgets) the flows to delete to make room for one more.
+
+        The list is empty while the model is below the watermark.
+        '''
+        excess = len(self._flows) - self.threshold + 1
+        if excess <= 0:
+            return []
+
+        flows = self._flows
+        now = self.clock()
+        if self.policy == 'lru':
+            victims = [key for key, _ in zip(flows, range(excess))]
+        else:
+            victims = heapq.nsmallest(
+                excess, flows,
+                key=lambda k: (flows[k].rate(now), flows[k].last_active))
+
+        for key in victims:
+            self._remember(key, flows.pop(key).rate(now))
+        self.evictions += len(victims)
+        return victims
+
+    def stats(self) -> Dict[str, object]:
+        '''Returns occupancy and churn counters.'''
+        return {
+            'flows': len(self._flows),
+            'capacity': self.capacity,
+            'installed': self.installed,
+            'evictions': self.evictions,
+            'removed': dict(self.removed),
+        }
+
+
+class PendingInstalls:
+    '''Remembers the flows sent to switches in the last ttl seconds.
+
+    Until a FlowMod takes effect, more packets of the same flow keep
+    missing the table. claim() returns True only for the first of
+    those packet-ins, so the rest can just be forwarded instead of
+    reinstalling the same flow. Entries expire in the order they were
+    claimed, so cleanup is O(1) per expired entry.
+    '''
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        if ttl <= 0:
+            raise ValueError('ttl must be positive (got: {})'.format(ttl))
+
+        self.ttl = ttl
+        self.clock = clock
+
+        # key -> time claimed, oldest first
+        self._pending = OrderedDict()
+
+        self.claimed = 0
+        self.suppressed = 0
+        self.confirmed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _expire(self, now: float):
+        pending = self._pending
+        deadline = now - self.ttl
+        while pending:
+            key, claimed = next(iter(pending.items()))
+            if claimed > deadline:
+                break
+            del pending[key]
+
+    def claim(self, key: Hashable) -> bool:
+        '''Returns True if key isn't already pending, and marks it pending.'''
+        now = self.clock()
+        self._expire(now)
+        if key in self._pending:
+            self.suppressed += 1
+            return False
+
+        self._pending[key] = now
+        self.claimed += 1
+        return True
+
+    def confirm(self, sent: float):
+        '''Records a barrier reply for an install sent at time sent.'''
+        latency = self.clock() - sent
+        self.confirmed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self) -> Dict[str, float]:
+        '''Returns coalescing and confirmation counters.'''
+        return {
+            'pending': len(self._pending),
+            'claimed': self.claimed,
+            'suppressed': self.suppressed,
+            'confirmed': self.confirmed,
+            'confirm_latency_total': self.latency_total,
+            'confirm_latency_max': self.latency_max,
+        }
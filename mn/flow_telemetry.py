@@ -0,0 +1,268 @@
+'''Pushes live per-switch flow counts to local subscribers.
+
+Run alongside the switch app:
+
+    ryu-manager simple_switch_14.py flow_telemetry.py
+
+On connect, every switch gets an OpenFlow 1.4 flow monitor for all of
+its tables. The switch then reports the flows it has, and afterwards
+every flow added, modified or removed, without being polled.
+FlowRemoved messages (for flows installed with OFPFF_SEND_FLOW_REM)
+update the same counts. Flows are tracked by (table, priority, match),
+so a removal reported both ways is only counted once. On a switch
+that doesn't answer the flow monitor, only the removals are counted.
+
+After every change, one line of JSON per switch is written to each
+client of a Unix socket ([flow_telemetry] socket, default
+/tmp/loft-telemetry.sock), e.g.
+
+    {"time": 1612345678.9, "dpid": 4, "event": "update", "flows": 57,
+     "added": 120, "removed": 63, "reasons": {"idle_timeout": 63}}
+
+A client first gets one "snapshot" line per connected switch.
+subscribe() reads the stream. A client that falls more than
+[flow_telemetry] client_backlog lines behind is disconnected.
+'''
+
+import json
+import os
+import socket
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+)
+
+from ryu import cfg
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER, DEAD_DISPATCHER
+from ryu.controller.handler import set_ev_cls
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_4
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('socket', default='/tmp/loft-telemetry.sock',
+               help='Unix socket that flow count updates are published on'),
+    cfg.BoolOpt('flow-monitor', default=True,
+                help='subscribe to OpenFlow 1.4 flow monitor updates '
+                     '(otherwise only FlowRemoved messages are counted)'),
+    cfg.IntOpt('client-backlog', default=10000,
+               help='updates queued for a client before it is dropped'),
+], group='flow_telemetry')
+
+MONITOR_ID = 1
+
+
+def subscribe(path: str = '/tmp/loft-telemetry.sock') -> Iterator[Dict[str, Any]]:
+    '''Yields the updates published on a telemetry socket.'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    with sock, sock.makefile('r') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+class _SwitchFlows:
+    '''The flows one switch is known to have, and churn counters.'''
+
+    def __init__(self):
+        # (table_id, priority, match fields)
+        self.flows = set()
+        self.added = 0
+        self.removed = 0
+        self.reasons = {}
+        self.paused = False
+        # set once the switch has sent a flow monitor reply
+        self.monitored = False
+
+    def add(self, key) -> bool:
+        if key in self.flows:
+            return False
+        self.flows.add(key)
+        self.added += 1
+        return True
+
+    def remove(self, key, reason: str) -> bool:
+        if key in self.flows:
+            self.flows.remove(key)
+        elif self.monitored:
+            # already counted from the monitor
+            return False
+        self.removed += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        return True
+
+
+class FlowTelemetry(app_manager.RyuApp):
+    OFP_VERSIONS = [ofproto_v1_4.OFP_VERSION]
+
+    def __init__(self, *args, **kwargs):
+        super(FlowTelemetry, self).__init__(*args, **kwargs)
+        conf = self.CONF.flow_telemetry
+        self.socket_path = conf.socket
+        self.flow_monitor = conf.flow_monitor
+        self.client_backlog = conf.client_backlog
+
+        # dpid -> _SwitchFlows
+        self.switches = {}
+        # client socket -> queue of lines to send it
+        self.clients = {}
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = hub.StreamServer((self.socket_path,), self._serve)
+        self.server_thread = hub.spawn(self.server.serve_forever)
+
+    def stop(self):
+        hub.kill(self.server_thread)
+        for queue in self.clients.values():
+            queue.put(None)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        super(FlowTelemetry, self).stop()
+
+    def stats(self):
+        '''Returns the current counts, keyed by dpid.'''
+        return {dpid: self._record(dpid, 'snapshot')
+                for dpid in self.switches}
+
+    def _record(self, dpid, event):
+        switch = self.switches[dpid]
+        return {
+            'time': time.time(),
+            'dpid': dpid,
+            'event': event,
+            'flows': len(switch.flows),
+            'added': switch.added,
+            'removed': switch.removed,
+            'reasons': dict(switch.reasons),
+        }
+
+    def _serve(self, sock, addr):
+        queue = hub.Queue()
+        for record in self.stats().values():
+            queue.put(json.dumps(record) + '\n')
+        self.clients[sock] = queue
+
+        try:
+            while True:
+                line = queue.get()
+                if line is None:
+                    break
+                sock.sendall(line.encode())
+        except OSError:
+            pass
+        finally:
+            self.clients.pop(sock, None)
+            sock.close()
+
+    def _publish(self, dpid, event):
+        if not self.clients:
+            return
+        line = json.dumps(self._record(dpid, event)) + '\n'
+        for sock, queue in list(self.clients.items()):
+            if queue.qsize() >= self.client_backlog:
+                self.logger.warning("dropping slow telemetry client")
+                self.clients.pop(sock, None)
+                # wakes _serve up to close it
+                queue.put(None)
+                continue
+            queue.put(line)
+
+    def _request_monitor(self, datapath, command):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        flags = (ofproto.OFPFMF_INITIAL | ofproto.OFPFMF_ADD |
+                 ofproto.OFPFMF_REMOVED | ofproto.OFPFMF_MODIFY |
+                 ofproto.OFPFMF_NO_ABBREV)
+        req = parser.OFPFlowMonitorRequest(
+            datapath, monitor_id=MONITOR_ID, monitor_flags=flags,
+            table_id=ofproto.OFPTT_ALL, command=command,
+            match=parser.OFPMatch())
+        datapath.send_msg(req)
+
+    @set_ev_cls(ofp_event.EventOFPStateChange,
+                [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        if datapath.id is None:
+            return
+
+        if ev.state == MAIN_DISPATCHER:
+            self.switches[datapath.id] = _SwitchFlows()
+            if self.flow_monitor:
+                self._request_monitor(datapath,
+                                      datapath.ofproto.OFPFMC_ADD)
+            self._publish(datapath.id, 'connected')
+        elif ev.state == DEAD_DISPATCHER and datapath.id in self.switches:
+            # the switch forgets its flows when the connection drops
+            self.switches[datapath.id].flows.clear()
+            self._publish(datapath.id, 'disconnected')
+            del self.switches[datapath.id]
+
+    @staticmethod
+    def _key(table_id, priority, match):
+        return table_id, priority, tuple(sorted(match.items()))
+
+    @staticmethod
+    def _reason(ofproto, reason):
+        return {
+            ofproto.OFPRR_IDLE_TIMEOUT: 'idle_timeout',
+            ofproto.OFPRR_HARD_TIMEOUT: 'hard_timeout',
+            ofproto.OFPRR_DELETE: 'delete',
+            ofproto.OFPRR_GROUP_DELETE: 'group_delete',
+            ofproto.OFPRR_METER_DELETE: 'meter_delete',
+            ofproto.OFPRR_EVICTION: 'switch_eviction',
+        }.get(reason, 'other')
+
+    @set_ev_cls(ofp_event.EventOFPFlowMonitorReply, MAIN_DISPATCHER)
+    def _flow_monitor_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        ofproto = datapath.ofproto
+        switch = self.switches.get(datapath.id)
+        if switch is None:
+            return
+
+        switch.monitored = True
+        changed = False
+        event = 'update'
+        for update in ev.msg.body:
+            if update.event in (ofproto.OFPFME_INITIAL,
+                                ofproto.OFPFME_ADDED,
+                                ofproto.OFPFME_MODIFIED):
+                key = self._key(update.table_id, update.priority,
+                                update.match)
+                changed |= switch.add(key)
+            elif update.event == ofproto.OFPFME_REMOVED:
+                key = self._key(update.table_id, update.priority,
+                                update.match)
+                changed |= switch.remove(
+                    key, self._reason(ofproto, update.reason))
+            elif update.event == ofproto.OFPFME_PAUSED:
+                # updates were lost; the counts are stale until resumed
+                switch.paused = True
+                changed, event = True, 'paused'
+            elif update.event == ofproto.OFPFME_RESUMED:
+                # start over from a fresh list of the switch's flows
+                switch.paused = False
+                switch.flows.clear()
+                self._request_monitor(datapath, ofproto.OFPFMC_MODIFY)
+                changed, event = True, 'resumed'
+
+        if changed:
+            self._publish(datapath.id, event)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        switch = self.switches.get(msg.datapath.id)
+        if switch is None:
+            return
+
+        key = self._key(msg.table_id, msg.priority, msg.match)
+        if switch.remove(key, self._reason(ofproto, msg.reason)):
+            self._publish(msg.datapath.id, 'removed')
@@ -0,0 +1,155 @@
+'''A bounded pool of spoofed MAC addresses backed by a NumPy array.
+
+The probes and traffic generators need many distinct source MACs.
+MacPool draws them in bulk as 48-bit ints in a uint64 array, with some
+bits fixed by a pattern (by default, the multicast bit is clear so
+every address is a valid source). It remembers the last capacity
+addresses it handed out, so new ones never repeat those and its memory
+stays the same however long it runs.
+
+to_strings() and to_bytes() format arrays of addresses for scapy or
+for raw frames, and from_strings() parses them back.
+'''
+
+from typing import (
+    Iterable,
+    List,
+)
+
+import numpy as np
+
+MAC_BITS = 48
+MAC_MASK = (1 << MAC_BITS) - 1
+
+# bits of the first octet
+MULTICAST = 1 << 40
+LOCAL = 1 << 41
+
+
+def to_strings(macs: np.ndarray) -> List[str]:
+    '''Formats addresses as 'xx:xx:xx:xx:xx:xx'.'''
+    return [mac.hex(':') for mac in to_bytes(macs)]
+
+
+def to_bytes(macs: np.ndarray) -> List[bytes]:
+    '''Returns the 6 bytes of each address, in network order.'''
+    octets = np.asarray(macs, dtype='>u8').reshape(-1, 1).view(np.uint8)
+    data = octets[:, 8 - MAC_BITS // 8:].tobytes()
+    return [data[i:i + 6] for i in range(0, len(data), 6)]
+
+
+def from_strings(macs: Iterable[str]) -> np.ndarray:
+    '''Parses 'xx:xx:xx:xx:xx:xx' addresses into a uint64 array.'''
+    return np.array([int(mac.replace(':', ''), 16) for mac in macs],
+                    dtype=np.uint64)
+
+
+class MacPool:
+    '''Hands out unique MAC addresses and remembers the last capacity.'''
+
+    def __init__(
+            self,
+            capacity: int = 1 << 16,
+            mask: int = MULTICAST,
+            value: int = 0,
+            seed: int = None):
+        '''Generated addresses have (mac & mask) == value.
+
+        Once capacity addresses are held, adding more forgets the
+        oldest ones.
+        '''
+
+        if capacity < 1:
+            raise ValueError('capacity must be positive (got: {})'
+                             .format(capacity))
+        if value & ~mask & MAC_MASK:
+            raise ValueError('value {:012x} sets bits outside mask {:012x}'
+                             .format(value, mask))
+
+        self.capacity = capacity
+        self.mask = np.uint64(mask & MAC_MASK)
+        self.value = np.uint64(value)
+        self.rng = np.random.default_rng(seed)
+
+        self._macs = np.zeros(capacity, dtype=np.uint64)
+        self._size = 0
+        # where the next address is written, once the pool is full
+        self._next = 0
+        # sorted copy of the held addresses, rebuilt after changes
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, mac: int) -> bool:
+        return bool(self.contains(np.array([mac], dtype=np.uint64))[0])
+
+    def contains(self, macs: np.ndarray) -> np.ndarray:
+        '''Returns which of macs are held.'''
+        if self._sorted is None:
+            self._sorted = np.sort(self._macs[:self._size])
+        macs = np.asarray(macs, dtype=np.uint64)
+        index = np.searchsorted(self._sorted, macs)
+        found = np.zeros(len(macs), dtype=bool)
+        inside = index < len(self._sorted)
+        found[inside] = self._sorted[index[inside]] == macs[inside]
+        return found
+
+    def add(self, macs: np.ndarray):
+        '''Holds macs, forgetting the oldest addresses if full.'''
+        macs = np.asarray(macs, dtype=np.uint64)[-self.capacity:]
+        n = len(macs)
+        if not n:
+            return
+
+        free = self.capacity - self._size
+        if free:
+            fill = min(free, n)
+            self._macs[self._size:self._size + fill] = macs[:fill]
+            self._size += fill
+            macs = macs[fill:]
+
+        # wrap around over the oldest
+        index = (self._next + np.arange(len(macs))) % self.capacity
+        self._macs[index] = macs
+        self._next = (self._next + len(macs)) % self.capacity
+        self._sorted = None
+
+    def generate(self, n: int) -> np.ndarray:
+        '''Returns (and holds) n new random addresses matching the pattern.'''
+        if n > self.capacity:
+            raise ValueError('cannot hold {} addresses (capacity {})'
+                             .format(n, self.capacity))
+        free_bits = MAC_BITS - bin(int(self.mask)).count('1')
+        if n > (1 << free_bits) - self._size:
+            raise ValueError('pattern leaves too few addresses for {}'
+                             .format(n))
+
+        macs = np.empty(0, dtype=np.uint64)
+        while len(macs) < n:
+            # draw a few extra to cover duplicates
+            drawn = self.rng.integers(0, 1 << MAC_BITS, size=2 * (n - len(macs)),
+                                      dtype=np.uint64)
+            drawn = (drawn & ~self.mask & np.uint64(MAC_MASK)) | self.value
+            drawn = drawn[~self.contains(drawn)]
+            macs = np.concatenate([macs, drawn])
+            # keep the first occurrence of each, in drawn order
+            _, first = np.unique(macs, return_index=True)
+            macs = macs[np.sort(first)]
+
+        macs = macs[:n]
+        self.add(macs)
+        return macs
+
+    def flip(self, base: int, bits: Iterable[int]) -> np.ndarray:
+        '''Returns (and holds) the addresses reached from base by flipping
+        each of bits in turn, as Mac.modify_val() does.
+        '''
+        bits = np.asarray(list(bits), dtype=np.uint64)
+        if len(bits) and bits.max() >= MAC_BITS:
+            raise ValueError('Bit invalid for MAC flipping (got: {})'
+                             .format(int(bits.max())))
+        macs = np.bitwise_xor.accumulate(np.uint64(1) << bits) \
+            ^ np.uint64(base)
+        self.add(macs)
+        return macs
@@ -0,0 +1,105 @@
+'''A bounded, aging MAC learning table.
+
+SimpleSwitch14 keeps one of these per datapath instead of a plain
+dict, so a flood of random source MACs can't grow controller memory
+without bound.
+'''
+
+from collections import OrderedDict
+import time
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+)
+
+
+class MacTable:
+    '''Maps 48-bit MAC addresses (as ints) to switch ports.
+
+    Entries are kept in least-recently-learned order, so both aging
+    and eviction only ever look at the front of the table. Refreshing
+    an entry moves it to the back. Learning into a full table evicts
+    the stalest entry, which is O(1).
+
+    A max_age of 0 disables aging; entries then only leave the table
+    when it is full.
+    '''
+
+    def __init__(
+            self,
+            capacity: int = 4096,
+            max_age: float = 300,
+            clock: Callable[[], float] = time.monotonic):
+        if capacity < 1:
+            raise ValueError('capacity must be positive (got: {})'
+                             .format(capacity))
+
+        self.capacity = capacity
+        self.max_age = max_age
+        self.clock = clock
+
+        # mac -> (port, last seen)
+        self._entries = OrderedDict()
+
+        self.learned = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, mac: int) -> bool:
+        return self.get(mac) is not None
+
+    def _expire(self, now: float):
+        '''Drops entries at the front that haven't been seen in max_age.'''
+        if not self.max_age:
+            return
+
+        entries = self._entries
+        deadline = now - self.max_age
+        while entries:
+            mac, (_, seen) = next(iter(entries.items()))
+            if seen > deadline:
+                break
+            del entries[mac]
+            self.expirations += 1
+
+    def learn(self, mac: int, port: int):
+        '''Records that mac was seen on port.'''
+        now = self.clock()
+        self._expire(now)
+
+        entries = self._entries
+        if mac in entries:
+            entries.move_to_end(mac)
+        else:
+            self.learned += 1
+            if len(entries) >= self.capacity:
+                entries.popitem(last=False)
+                self.evictions += 1
+        entries[mac] = (port, now)
+
+    def get(self, mac: int) -> Optional[int]:
+        '''Returns the port mac was last seen on, or None.'''
+        entry = self._entries.get(mac)
+        if entry is None:
+            return None
+
+        port, seen = entry
+        if self.max_age and self.clock() - seen >= self.max_age:
+            del self._entries[mac]
+            self.expirations += 1
+            return None
+        return port
+
+    def stats(self) -> Dict[str, int]:
+        '''Returns occupancy and churn counters.'''
+        return {
+            'entries': len(self._entries),
+            'capacity': self.capacity,
+            'learned': self.learned,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -3,10 +3,12 @@
 
 # (c) 2021 Sohum Mendon
 
-from collections import OrderedDict
 import random
 import time
-import textwrap
+from typing import (
+    Callable,
+    Tuple,
+)
 
 import numpy as np
 from scapy.all import (
@@ -20,6 +22,10 @@ from scapy.all import (
 )
 from scipy.stats import ttest_ind
 
+from mac_pool import MacPool, to_strings
+from rtt_engine import RTTEngine
+from sequential import SignSPRT
+
 
 class Field:
     '''Represents a probable field.'''
@@ -46,6 +52,9 @@ class Mac(Field):
     MAC addresses are not bitmasked typically.
     '''
 
+    # how many previous addresses are remembered
+    CACHE_SIZE = 1024
+
     def __init__(self, field: str):
 
         # store it as a 48-bit binary number
@@ -53,7 +62,8 @@ class Mac(Field):
             raise ValueError('MAC address should be len 17 but was len {}'
                              .format(len(field)))
         self.field = self._convert_to_bits(field)
-        self.cache = OrderedDict({self.field: (-1, None)})  # keep track of previous addresses
+        self.cache = MacPool(self.CACHE_SIZE)  # keep track of previous addresses
+        self.cache.add([self.field])
 
     # various methods for constructing MAC objects
     # from a string or from a bitstring
@@ -65,7 +75,7 @@ class Mac(Field):
 
     @staticmethod
     def _convert_to_mac(mac: int) -> str:
-        return ':'.join(textwrap.wrap('{:012x}'.format(mac), width=2))
+        return mac.to_bytes(6, 'big').hex(':')
 
     @staticmethod
     def _convert_to_bits(mac: str) -> int:
@@ -73,18 +83,19 @@ class Mac(Field):
 
     # shortcut methods
     def get_bits(self) -> int:
-        return self._convert_to_bits(self.field)
+        return self.field
 
     def get_mac(self) -> str:
         return self._convert_to_mac(self.field)
 
     def modify_val(
             self,
-            bit: int = random.randint(0, 47),
+            bit: int = None,
             retry: bool = True) -> str:
         '''Flips a bit for probing.
 
-        You can also specify precisely which bit to flip.
+        You can also specify precisely which bit to flip
+        (a random one by default).
         retry sets whether or not we should make sure this MAC address
         is unique, according to the previous addresses that have been seen.
 
@@ -92,6 +103,8 @@ class Mac(Field):
         which could be extended in an IP class.
         '''
 
+        if bit is None:
+            bit = random.randint(0, 47)
         if bit > 47 or bit < 0:
             raise ValueError('Bit invalid for MAC flipping (got: {})'
                              .format(bit))
@@ -115,22 +128,23 @@ class Mac(Field):
             if not retry:
                 break
 
-        # cache which bit we flipped
-        # and the previous key
-        self.cache[flipped] = (bit, self.field)
+        # remember the new address
+        self.cache.add([flipped])
         self.field = flipped
 
         return self.get_mac()
 
-    def set_value(self, new_val: int = random.getrandbits(48)) -> str:
+    def set_value(self, new_val: int = None) -> str:
         '''Sets the value to new_val. Defaults to a random bitstring.'''
+        if new_val is None:
+            new_val = random.getrandbits(48)
         if new_val in self.cache:
             print('MAC {} already set previously'
                   .format(new_val))
         
         # add to cache regardless
 
-        self.cache[new_val] = (-1, self.field)
+        self.cache.add([new_val])
         self.field = new_val
 
         return self.get_mac()
@@ -139,8 +153,72 @@ class Mac(Field):
 class Probing:
     '''A class for methods that probe the network for configuration parameters.'''
 
-    def __init__(self):
+    def __init__(
+            self,
+            iface: str = None,
+            timeout: float = 1.0,
+            spacing: float = 0.0,
+            use_engine: bool = True,
+            sequential: bool = False,
+            beta: float = 0.05,
+            p1: float = 0.7,
+            max_samples: int = 30,
+            group: int = 2,
+            engine=None,
+            clock: Callable[[], float] = time.time,
+            sleep: Callable[[float], None] = time.sleep,
+            recorder=None):
+        '''Probes are timed with an RTTEngine on iface (default: scapy's).
+
+        timeout is how long to wait for a reply before counting a probe
+        as lost, and spacing the pause between the probes of a batch.
+        With use_engine=False, every probe goes through srp() instead.
+        engine replaces the RTTEngine with anything that has the same
+        probe() and send() methods, and clock and sleep replace
+        time.time and time.sleep; together they let the probes run
+        against a simulated switch (see flow_sim.py).
+
+        With sequential=True, each comparison of RTTs is a SignSPRT
+        with error rates (alpha, beta), fed group pairs at a time, and
+        stops as soon as it decides; the n arguments of the probes are
+        then replaced by max_samples. p1 is how often a miss is taken
+        to be slower than a hit, and should not be above what the
+        network shows (see sequential.py).
+
+        After each probe, self.reports[probe name] holds the number of
+        RTT pairs it compared, the number of decisions it made, and
+        the lowest confidence among them (sequential) or the last
+        t-test p-value (fixed n). A SignSPRT that runs out of pairs
+        without deciding falls back to a one-sided t-test of the same
+        pairs; those are counted in its 'undecided'. A recorder (a results_store.Run) is
+        also given every batch of RTTs and every test. A probe raises
+        RuntimeError when a comparison gets no replies at all, rather
+        than reading that as no difference.
+        '''
         self.cache = dict()
+        self.iface = iface
+        self.timeout = timeout
+        self.spacing = spacing
+        self.use_engine = use_engine
+        self.sequential = sequential
+        self.beta = beta
+        self.p1 = p1
+        self.max_samples = max_samples
+        self.group = group
+        self.reports = dict()
+        # every spoofed source address, so flow sets never overlap
+        self.macs = MacPool()
+        self._engine = engine
+        self.clock = clock
+        self.sleep = sleep
+        self.recorder = recorder
+        # name of the probe running, for the recorder
+        self._probe = None
+
+    def _rtt_engine(self) -> RTTEngine:
+        if self._engine is None:
+            self._engine = RTTEngine(self.iface)
+        return self._engine
 
     def _get_mac(self, ip: str, force=False) -> str:
         '''Sends an ARP requests for the given IP.
@@ -168,16 +246,49 @@ class Probing:
         self.cache[ip] = resp.hwsrc
         return resp.hwsrc
 
+    def _send(self, pkt: Ether):
+        if self.use_engine:
+            self._rtt_engine().send([pkt])
+        else:
+            sendp(pkt)
+
+    def _get_packet_delays(self, pkts) -> Tuple[np.ndarray, np.ndarray]:
+        '''Sends a batch of ICMP echo frames and records their RTTs.
+
+        Returns (rtts, lost): the RTT of each frame in seconds, NaN
+        where no reply came back, and the mask of those lost frames.
+        '''
+        sent = self.clock()
+        if not self.use_engine:
+            rtts = np.array([self._get_packet_delay(pkt) for pkt in pkts])
+            lost = np.isinf(rtts)
+            rtts[lost] = np.nan
+        else:
+            rtts, lost = self._rtt_engine().probe(pkts, self.timeout,
+                                                  self.spacing)
+        if self.recorder is not None:
+            self.recorder.rtts(self._probe, sent, rtts)
+        return rtts, lost
+
     def _get_packet_delay(self, pkt: Ether) -> float:
         '''Sends an Ethernet frame and records the RTT.
-        
+
+        Returns infinity if there is no reply.
+
         There are some issues with determining RTT in the
         library. Check the documentation:
 
         - https://github.com/secdev/scapy/issues/2277
+
+        so by default the RTT is taken from kernel timestamps by
+        an RTTEngine instead.
         '''
+        if self.use_engine:
+            rtts, lost = self._rtt_engine().probe([pkt], self.timeout)
+            return float('Inf') if lost[0] else rtts[0]
+
         ans, unans = srp(pkt, timeout=5, verbose=0)
-        if ans is None:
+        if not ans:
             return float('Inf')
         pair = ans[0]
         ping, pong = pair
@@ -188,6 +299,159 @@ class Probing:
             rtt = 0 
         return rtt
 
+    def _start_report(self, name: str) -> dict:
+        report = {'samples': 0, 'decisions': 0, 'undecided': 0,
+                  'confidence': None, 'p_value': None}
+        self.reports[name] = report
+        self._probe = name
+        return report
+
+    def _add_test(self, report: dict, test: SignSPRT):
+        '''Counts a SignSPRT. Raises RuntimeError if it got no pairs.'''
+        confidence = test.confidence()
+        if self.recorder is not None:
+            self.recorder.test(self._probe, self.clock(), 'sprt',
+                               test.samples, test.llr,
+                               confidence=confidence,
+                               decision=test.decision)
+        if not test.samples:
+            # llr would still be 0, which reads as "no difference"
+            raise RuntimeError('{}: no pair of probes got both replies'
+                               .format(self._probe))
+
+        report['samples'] += test.samples
+        report['decisions'] += 1
+        if report['confidence'] is None or confidence < report['confidence']:
+            report['confidence'] = confidence
+
+    def _decide(
+            self,
+            report: dict,
+            test: SignSPRT,
+            rtt_a: np.ndarray,
+            rtt_b: np.ndarray,
+            alpha: float) -> bool:
+        '''Counts a SignSPRT fed from rtt_a and rtt_b. Returns True if
+        rtt_a was judged slower.
+
+        A test that used up its pairs without crossing a bound is
+        settled by a one-sided t-test of the same pairs instead.
+        '''
+        self._add_test(report, test)
+        if test.decision is not None:
+            return test.decision
+
+        report['undecided'] += 1
+        result = ttest_ind(rtt_a, rtt_b, nan_policy='omit',
+                           alternative='greater')
+        p = float(result.pvalue)
+        report['p_value'] = p
+        if self.recorder is not None:
+            self.recorder.test(self._probe, self.clock(), 'ttest',
+                               test.samples, float(result.statistic),
+                               p_value=p)
+        return p < alpha
+
+    def _require_replies(self, *batches: np.ndarray):
+        '''Raises RuntimeError if every probe of a batch was lost.
+
+        A t-test without replies has a NaN p-value, which would read
+        as "no difference" just like a flow that is gone.
+        '''
+        for rtts in batches:
+            if not np.isfinite(rtts).any():
+                raise RuntimeError('{}: every probe of a batch was lost'
+                                   .format(self._probe))
+
+    def _add_ttest(self, report: dict, samples: int, result) -> float:
+        '''Counts a t-test (a scipy TtestResult). Returns its p-value.'''
+        p = float(result.pvalue)
+        report['samples'] += samples
+        report['decisions'] += 1
+        report['p_value'] = p
+        if self.recorder is not None:
+            self.recorder.test(self._probe, self.clock(), 'ttest', samples,
+                               float(result.statistic), p_value=p)
+        return p
+
+    def _slower_than_before(
+            self,
+            rtt_0: np.ndarray,
+            pkts,
+            alpha: float,
+            report: dict,
+            keep_alive: bool = False) -> bool:
+        '''Re-measures pkts, group by group, until rtt_0 is judged
+        slower than the new RTTs (True) or not (False).
+
+        With keep_alive, every packet is re-measured in one batch (so
+        that none of the flows idles out) and the test only reads as
+        many pairs as it needs.
+        '''
+        test = SignSPRT(alpha, self.beta, self.p1, max_samples=len(pkts))
+        if keep_alive:
+            rtt_1, _ = self._get_packet_delays(pkts)
+            test.update(rtt_0, rtt_1)
+        else:
+            rtt_1 = np.full(len(pkts), np.nan)
+            for start in range(0, len(pkts), self.group):
+                end = start + self.group
+                rtt_1[start:end], _ = self._get_packet_delays(
+                    pkts[start:end])
+                if test.update(rtt_0[start:end],
+                               rtt_1[start:end]) is not None:
+                    break
+
+        return self._decide(report, test, rtt_0, rtt_1, alpha)
+
+    def _flow_set(self, src: str, dst: str, bit: int, n: int) -> list:
+        '''Returns n echo requests, each from a new spoofed MAC address.
+
+        The addresses are a random one with bits bit, bit+1, ...
+        flipped in turn, as Mac.modify_val() would.
+        '''
+        base = int(self.macs.generate(1)[0])
+        return [
+            Ether(src=mac)
+            / IP(src=src, dst=dst)
+            / ICMP(id=RandShort())
+            for mac in to_strings(self.macs.flip(base, range(bit, bit + n)))
+        ]
+
+    def _still_installed(
+            self,
+            rtt_0: np.ndarray,
+            pkts,
+            alpha: float,
+            report: dict) -> bool:
+        '''Re-measures every packet of pkts in one batch. Returns True if
+        they are faster than rtt_0, which was measured when their flows
+        were installed.
+        '''
+        if self.sequential:
+            return self._slower_than_before(rtt_0, pkts, alpha, report,
+                                            keep_alive=True)
+
+        rtt_1, _ = self._get_packet_delays(pkts)
+        self._require_replies(rtt_0, rtt_1)
+        p = self._add_ttest(report, len(pkts), ttest_ind(
+            rtt_0, rtt_1, nan_policy='omit', alternative='greater'))
+        return p < alpha
+
+    @staticmethod
+    def _idle_candidates(lo: int, hi: int, k: int) -> np.ndarray:
+        '''Returns up to k whole idle periods in (lo, hi) to test at once.
+
+        While there is no lower bound they are spaced geometrically,
+        so the first miss comes at a small multiple of the timeout
+        rather than after a fixed fraction of the search range.
+        '''
+        if lo == 0:
+            points = np.geomspace(1, hi - 1, k)
+        else:
+            points = np.linspace(lo, hi, k + 2)[1:-1]
+        return np.unique(np.clip(np.round(points), lo + 1, hi - 1)).astype(int)
+
     def mac_field_probing(
             self,
             src: str = '10.0.0.1',
@@ -202,33 +466,49 @@ class Probing:
         # generate a random MAC address
         # and compose the ethernet frame
         # use random ICMP ids to minimize chance of RTT overlap
-        spoofed_src = random.getrandbits(48)
+        spoofed_src = int(self.macs.generate(1)[0])
         spoofed_src = Mac.from_bits(spoofed_src)
         pkt = Ether(src=spoofed_src.get_mac())/IP(src=src, dst=dst)/ICMP(id=RandShort())
 
+        report = self._start_report('mac_field_probing')
+        test = SignSPRT(alpha, self.beta, self.p1,
+                        max_samples=self.max_samples)
+        if self.sequential:
+            n = self.max_samples
+
         # make arrays for the RTT
-        rtt_0 = np.array([])
-        rtt_1 = np.array([])
+        rtt_0 = np.full(n, np.nan)
+        rtt_1 = np.full(n, np.nan)
 
         for i in range(n):
-            sendp(pkt)  # ensure the packet is inside of the flow rule
+            self._send(pkt)  # ensure the packet is inside of the flow rule
 
-            spoofed_src.modify_val(bit=i)  # modify the ith bit
+            spoofed_src.modify_val(bit=i % 48)  # modify the ith bit
             # spoofed_src.set_value()  # randomizes the MAC address
             pkt = Ether(src=spoofed_src.get_mac())/IP(src=src, dst=dst)/ICMP(id=RandShort())
 
             # measure RTT
-            rtt_0 = np.append(rtt_0, self._get_packet_delay(pkt))
-            rtt_1 = np.append(rtt_1, self._get_packet_delay(pkt))
+            rtt_0[i] = self._get_packet_delay(pkt)
+            rtt_1[i] = self._get_packet_delay(pkt)
 
-        # is RTT 0 > RTT 1?
-        # if it is, RTT 1 triggered an installation
-        p = ttest_ind(rtt_0, rtt_1, nan_policy='omit', alternative='greater').pvalue
+            # stop once it's clear whether RTT 0 > RTT 1
+            if self.sequential and test.update(rtt_0[i], rtt_1[i]) is not None:
+                break
+
+        if self.sequential:
+            installs = self._decide(report, test, rtt_0, rtt_1, alpha)
+        else:
+            # is RTT 0 > RTT 1?
+            # if it is, RTT 1 triggered an installation
+            self._require_replies(rtt_0, rtt_1)
+            p = self._add_ttest(report, n, ttest_ind(
+                rtt_0, rtt_1, nan_policy='omit', alternative='greater'))
+            installs = p < alpha
 
         # return the bitmask of the field
         # for MAC addresses, this is essentially
         # true / false
-        if p < alpha:
+        if installs:
             return 'ff:ff:ff:ff:ff:ff'
         else:
             return '00:00:00:00:00:00'
@@ -247,37 +527,41 @@ class Probing:
         See the paper for more information about the algorithm used.
         '''
 
-        # make a new randomized packet
+        report = self._start_report('mac_hard_timeout_probing')
+        if self.sequential:
+            n = self.max_samples
+
+        # make new randomized packets
         # we know at this point that MAC addresses
         # insert new rules
-        spoofed_src = random.getrandbits(48)
-        spoofed_src = Mac.from_bits(spoofed_src)
-
-        # could use spoofed_src.set_value() for randomization
-        pkts = [
-            Ether(src=spoofed_src.modify_val(bit=bit+i))
-            / IP(src=src, dst=dst)
-            / ICMP(id=RandShort())
-            for i in range(n)
-        ]
+        pkts = self._flow_set(src, dst, bit, n)
 
         # log present time and
         # send all the packets to get RTT
-        t_start = time.time()
-        rtt_0 = [self._get_packet_delay(pkt) for pkt in pkts]
+        t_start = self.clock()
+        rtt_0, _ = self._get_packet_delays(pkts)
 
         while True:
-            time.sleep(t_wait)  # wait 0.5s
-            t_end = time.time() # log the end time
-            rtt_1 = [self._get_packet_delay(pkt) for pkt in pkts]
+            self.sleep(t_wait)  # wait 0.5s
+            t_end = self.clock() # log the end time
 
             # is RTT_0 = RTT_1?
             # if it is, we know the hard timeout
-            p = ttest_ind(rtt_0, rtt_1, nan_policy='omit').pvalue
+            # (every flow is re-measured, or the ones left out would
+            # hit their idle timeout first)
+            if self.sequential:
+                same = not self._slower_than_before(rtt_0, pkts, alpha,
+                                                    report, keep_alive=True)
+            else:
+                rtt_1, _ = self._get_packet_delays(pkts)
+                self._require_replies(rtt_0, rtt_1)
+                p = self._add_ttest(report, n, ttest_ind(
+                    rtt_0, rtt_1, nan_policy='omit'))
+                same = p > alpha
 
             # break loop if maximum time allotted exceeds
             # or if we discover hard timeout
-            if (t_end - t_start > t_max) or (p > alpha):
+            if (t_end - t_start > t_max) or same:
                 break
         
         # if we terminated due to a timeout
@@ -300,34 +584,35 @@ class Probing:
         See the paper for more information about the algorithm used.
         '''
 
-        spoofed_src = random.getrandbits(48)
-        spoofed_src = Mac.from_bits(spoofed_src)
+        report = self._start_report('mac_idle_timeout_probing')
+        if self.sequential:
+            n = self.max_samples
 
-        # could use spoofed_src.set_value() for randomization
-        pkts = [
-            Ether(src=spoofed_src.modify_val(bit=bit+i))
-            / IP(src=src, dst=dst)
-            / ICMP(id=RandShort())
-            for i in range(n)
-        ]
+        pkts = self._flow_set(src, dst, bit, n)
 
         l = 0
         r = t_sup
         while l < r:
             print('In l {} < r {} loop'.format(l, r))
-            rtt_0 = [self._get_packet_delay(pkt) for pkt in pkts]
+            rtt_0, _ = self._get_packet_delays(pkts)
             mid = (l+r)//2
             print('Sleeping for mid = {}'.format(mid))
-            time.sleep(mid)
-
-            rtt_1 = [self._get_packet_delay(pkt) for pkt in pkts]
+            self.sleep(mid)
 
             # is RTT_0 = RTT_1?
             # if it is, we know the idle timeout < mid
             # else idle timeout > mid
-            p = ttest_ind(rtt_0, rtt_1, nan_policy='omit').pvalue
+            if self.sequential:
+                same = not self._slower_than_before(rtt_0, pkts, alpha,
+                                                    report)
+            else:
+                rtt_1, _ = self._get_packet_delays(pkts)
+                self._require_replies(rtt_0, rtt_1)
+                p = self._add_ttest(report, n, ttest_ind(
+                    rtt_0, rtt_1, nan_policy='omit'))
+                same = p > alpha
 
-            if p > alpha:
+            if same:
                 r = mid - 1
             else:
                 l = mid + 1
@@ -335,12 +620,134 @@ class Probing:
             print("Sleeping r = {} seconds".format(r))
             # if r < 0, don't sleep because it's negative
             if r >= 0:
-                time.sleep(r)
+                self.sleep(r)
             else:
-                time.sleep(0)
+                self.sleep(0)
 
         l = round(l)
         if l >= t_sup:
             return 0
         else:
             return l
+
+    def mac_idle_timeout_search(
+            self,
+            src: str = '10.0.0.1',
+            dst: str = '10.0.0.3',
+            bit: int = 0,
+            n: int = 5,
+            t_sup: int = 500,
+            t_hard: int = 0,
+            sets: int = 8,
+            resolution: int = 1,
+            alpha: float = 0.01,
+            max_flows: int = 64) -> int:
+        '''Returns an integer representing the probed idle timeout.
+
+        Finds the same value as mac_idle_timeout_probing (the shortest
+        whole idle period after which the flows are gone, or 0 if they
+        outlive t_sup) without sleeping through every bisection step
+        and flush in turn.
+
+        It keeps sets disjoint sets of n flows. Sending a set arms its
+        flows: they are installed if they had expired, or their idle
+        timer restarts if not. Each round arms every set, then tests up
+        to sets idle periods at once by re-sending set k after the k-th
+        shortest one; the first set found expired ends the round, since
+        the longer periods would expire too. The timeout is known to be
+        in (lower, upper] and each round shrinks that to the gap
+        between two tested periods, until it is at most resolution
+        seconds wide. Arming a set is itself a test of the time since
+        it was last sent, so nothing is waited out twice.
+
+        t_hard is the hard timeout (0 if none). A set whose flows would
+        reach it during a round is replaced by new addresses. A search
+        makes a few dozen decisions and never revisits one, hence the
+        lower default alpha.
+
+        All sets together hold at most max_flows flows, so n is cut to
+        max_flows // sets (including max_samples in sequential mode).
+        Keep it well below the switch's flow limit: a refused flow
+        never hits, and reads as expired however long it waited. The
+        default leaves room in a 100-flow table for the hard timeout
+        probe's flows, which may still be idling out. Few flows per set
+        make weak tests when RTTs are heavy-tailed; fewer sets keep
+        more flows each, at the cost of more rounds.
+
+        self.reports['mac_idle_timeout_search'] also holds lower,
+        upper, the error bound (upper - lower), the number of rounds
+        and the elapsed wall time.
+        '''
+
+        if max_flows < sets:
+            raise ValueError('max_flows must be at least sets (got: {} < {})'
+                             .format(max_flows, sets))
+
+        report = self._start_report('mac_idle_timeout_search')
+        if self.sequential:
+            n = self.max_samples
+        n = min(n, max_flows // sets)
+        t_start = self.clock()
+
+        flow_sets = [None] * sets
+        # RTTs of each set when its flows were installed
+        reference = [None] * sets
+        installed = np.zeros(sets)
+        sent = np.zeros(sets)
+
+        lo = 0
+        hi = t_sup + 1
+        rounds = 0
+        while hi - lo > resolution:
+            rounds += 1
+
+            # arm the sets
+            for k in range(sets):
+                now = self.clock()
+                if flow_sets[k] is None or (
+                        t_hard and now + hi - installed[k] >= t_hard):
+                    flow_sets[k] = self._flow_set(src, dst, bit, n)
+                    reference[k], _ = self._get_packet_delays(flow_sets[k])
+                    installed[k] = sent[k] = now
+                    continue
+
+                gap = now - sent[k]
+                if self._still_installed(reference[k], flow_sets[k], alpha,
+                                         report):
+                    if lo < np.floor(gap) < hi:
+                        lo = int(np.floor(gap))
+                else:
+                    installed[k] = now
+                    if lo < np.ceil(gap) < hi:
+                        hi = int(np.ceil(gap))
+                sent[k] = now
+
+            if hi - lo <= resolution:
+                break
+
+            candidates = self._idle_candidates(lo, hi, sets)
+            print('Testing idle periods {} in ({}, {}]'
+                  .format(list(candidates), lo, hi))
+            for k, idle in enumerate(candidates):
+                self.sleep(max(0.0, sent[k] + idle - self.clock()))
+                now = self.clock()
+                alive = self._still_installed(reference[k], flow_sets[k],
+                                              alpha, report)
+                sent[k] = now
+                if alive:
+                    lo = int(idle)
+                else:
+                    installed[k] = now
+                    hi = int(idle)
+                    break
+
+        report['lower'] = lo
+        report['upper'] = hi
+        report['bound'] = hi - lo
+        report['rounds'] = rounds
+        report['elapsed'] = self.clock() - t_start
+
+        if lo >= t_sup:
+            return 0
+        else:
+            return hi
@@ -8,11 +8,18 @@ IP address.
 
 import csv
 import importlib
+import os
 import sys
+import tempfile
+import threading
 import time
 
+import numpy as np
+
 import probe
 import ryu
+from flow_monitor import FlowMonitor
+from results_store import ResultsStore
 topology = importlib.import_module('topo-2sw-3host')
 
 from mininet.node import Ryu, OVSSwitch
@@ -21,57 +28,181 @@ from mininet.util import dumpNodeConnections
 from mininet.log import setLogLevel
 
 PROGRAM_FILE = '/home/mininet/rigel-sdn-dos/mn/probing_accuracy.py'
+SWITCH_APP = '/home/mininet/rigel-sdn-dos/mn/simple_switch_14.py'
+RESULTS_FILE = '/home/mininet/results.csv'
+RESULTS_STORE = '/home/mininet/results.db'
 
+# instance i listens for OpenFlow on 6653+i and serves REST on 8080+i
+OPENFLOW_PORT = 6653
+REST_PORT = 8080
 
-def probe_test():
-    '''This method configures Mininet and launches the probe.'''
+# seconds between flow-count samples during a run
+FLOW_INTERVAL = 1.0
 
-    # configure mininet instance
-    topo = topology.TestbedTopo()
-    args = 'ryu.app.ofctl_rest /home/mininet/rigel-sdn-dos/mn/simple_switch_14.py'
-    net = Mininet(
-        topo, 
-        controller = lambda name: Ryu( 'c0' , args)
-    )
-    net.start()
-    net.waitConnected()
+# fixed-n t-tests by default; sequential tests hold up better against
+# heavy-tailed RTTs but, in flow_sim.py, find fewer idle timeouts on
+# clean ones with twice the RTT pairs
+SEQUENTIAL = False
 
-    # print debugging information
-    dumpNodeConnections(net.hosts)
 
-    # extract the relevant hosts
-    attacker = net.get( 'ah' )
-    server = net.get( 'sh' )
+def _sample_flows(monitor: FlowMonitor, stop: threading.Event, rows: list):
+    while not stop.wait(monitor.interval):
+        rows.append(monitor.sample())
 
-    # run the probing code on the attacker
-    result = attacker.cmd('python3 {} probe {} {}'.format(PROGRAM_FILE, attacker.IP(), server.IP()))
-    print(result)
 
-    # shutdown
-    net.stop()
+def probe_test(
+        instance: int = None,
+        idle_timeout: int = None,
+        hard_timeout: int = None,
+        flow_limit: int = 0,
+        results: str = RESULTS_FILE,
+        store: str = RESULTS_STORE) -> str:
+    '''This method configures Mininet and launches the probe.
+
+    With an instance number, the network's node names and controller
+    ports are its own, so several can run at once (see
+    probing_runner.py). idle_timeout and hard_timeout override the
+    controller's, and a flow_limit caps the switches' tables. The
+    probe appends its result to results; its output is returned.
+
+    The run, its RTTs and tests, and the switches' flow counts
+    (sampled every FLOW_INTERVAL seconds) are also saved to store, a
+    results_store.ResultsStore.
+    '''
+
+    # configure mininet instance
+    topo = topology.TestbedTopo(instance)
+    index = instance or 0
+    args = '--wsapi-port {} ryu.app.ofctl_rest {}'.format(REST_PORT + index,
+                                                          SWITCH_APP)
+
+    options = {'idle_timeout': idle_timeout, 'hard_timeout': hard_timeout}
+    config = None
+    if any(value is not None for value in options.values()):
+        config = tempfile.NamedTemporaryFile('w', suffix='.conf',
+                                             delete=False)
+        with config:
+            config.write('[simple_switch]\n')
+            for name, value in options.items():
+                if value is not None:
+                    config.write('{} = {}\n'.format(name, value))
+        args = '--config-file {} {}'.format(config.name, args)
+
+    with ResultsStore(store) as results_store:
+        run = results_store.start_run('probing_accuracy', {
+            'instance': instance, 'idle_timeout': idle_timeout,
+            'hard_timeout': hard_timeout, 'flow_limit': flow_limit})
+
+    net = Mininet(
+        topo, 
+        controller = lambda name: Ryu( 'c{}'.format(index), args,
+                                       port=OPENFLOW_PORT + index )
+    )
+    try:
+        net.start()
+        net.waitConnected()
+
+        if flow_limit:
+            # as controller.py does, but on this network's bridges
+            for switch in net.switches:
+                switch.vsctl('-- --id=@ft create Flow_Table flow_limit={} '
+                             'overflow_policy=refuse -- set Bridge {} '
+                             'flow_tables=0=@ft'
+                             .format(flow_limit, switch.name))
+
+        # print debugging information
+        dumpNodeConnections(net.hosts)
+
+        monitor = FlowMonitor(
+            ryu.RyuAPI('localhost:{}'.format(REST_PORT + index)), None,
+            interval=FLOW_INTERVAL, summary=0)
+        stop = threading.Event()
+        flow_counts = []
+        sampler = threading.Thread(target=_sample_flows,
+                                   args=(monitor, stop, flow_counts),
+                                   daemon=True)
+        sampler.start()
+
+        # extract the relevant hosts
+        suffix = '' if instance is None else str(instance)
+        attacker = net.get( 'ah' + suffix )
+        server = net.get( 'sh' + suffix )
+
+        # run the probing code on the attacker
+        try:
+            result = attacker.cmd('python3 {} probe {} {} {} {} {}'.format(
+                PROGRAM_FILE, attacker.IP(), server.IP(), results, store,
+                run.id))
+        finally:
+            stop.set()
+            sampler.join()
+            if flow_counts:
+                with ResultsStore(store) as results_store:
+                    results_store.add_flow_counts(
+                        run.id, np.concatenate(flow_counts))
+        print(result)
+        return result
+    finally:
+        # shutdown
+        net.stop()
+        if config is not None:
+            os.unlink(config.name)
 
 
 def launch_attack():
     '''This code collects arguments passed on the commandline and probes timeouts.'''
-    prober = probe.Probing()
-
     # get the IP addresses from the command line
     src = sys.argv[2]
     dst = sys.argv[3]
 
+    # record every RTT and test in the store (and run) probe_test
+    # passed, or in a new run in mininet's home directory
+    if len(sys.argv) > 6:
+        store = ResultsStore(sys.argv[5])
+        run = store.run(int(sys.argv[6]))
+    else:
+        store = ResultsStore(RESULTS_STORE)
+        run = store.start_run('probing_accuracy', {'src': src, 'dst': dst})
+
+    prober = probe.Probing(sequential=SEQUENTIAL, recorder=run)
+
     # launch the probing code
     hard_timeout = prober.mac_hard_timeout_probing(src=src, dst=dst)
     print('Hard timeout: {}'.format(hard_timeout))
     t_sup = hard_timeout if hard_timeout > 0 else 60  # if hard timeout = 0, we did not detect a hard timeout
-    time.sleep(t_sup)  # flush the hard timeout
-    idle_timeout = prober.mac_idle_timeout_probing(src=src, dst=dst, t_sup=t_sup)
-    print('Idle timeout: {}'.format(idle_timeout))
-
-    # append the result in mininet's home directory
-    # with a timestamp
-    with open('/home/mininet/results.csv', 'a+', newline='') as fp:
+    # the search uses new addresses, so the hard timeout's flows
+    # needn't be flushed first
+    idle_timeout = prober.mac_idle_timeout_search(src=src, dst=dst, t_sup=t_sup,
+                                                  t_hard=hard_timeout)
+    hard_report = prober.reports['mac_hard_timeout_probing']
+    idle_report = prober.reports['mac_idle_timeout_search']
+    print('Idle timeout: {} (in ({}, {}], {} rounds, {:.0f}s)'
+          .format(idle_timeout, idle_report['lower'], idle_report['upper'],
+                  idle_report['rounds'], idle_report['elapsed']))
+    for name, report in (('Hard', hard_report), ('Idle', idle_report)):
+        if report['confidence'] is None:
+            print('{} timeout probe: {} samples, {} decisions, last p = {:.3g}'
+                  .format(name, report['samples'], report['decisions'],
+                          report['p_value']))
+        else:
+            print('{} timeout probe: {} samples, {} decisions ({} undecided), '
+                  'confidence >= {:.3f}'
+                  .format(name, report['samples'], report['decisions'],
+                          report['undecided'], report['confidence']))
+
+    # append the result in mininet's home directory (or the file
+    # given after the IPs) with a timestamp
+    results = sys.argv[4] if len(sys.argv) > 4 else RESULTS_FILE
+    with open(results, 'a+', newline='') as fp:
         writer = csv.writer(fp, delimiter=',')
-        writer.writerow((time.ctime(), hard_timeout, idle_timeout))
+        writer.writerow((time.ctime(), hard_timeout, idle_timeout,
+                         hard_report['samples'], hard_report['confidence'],
+                         idle_report['samples'], idle_report['confidence'],
+                         idle_report['bound']))
+
+    run.finish({'hard_timeout': hard_timeout, 'idle_timeout': idle_timeout,
+                'reports': prober.reports})
+    store.close()
 
 
 if __name__ == '__main__':
@@ -86,6 +217,6 @@ if __name__ == '__main__':
         probe_test()
     else:
         if len(sys.argv) < 4:
-            print('usage: {} probe <attacker ip> <server ip>'.format(sys.argv[0]))
+            print('usage: {} probe <attacker ip> <server ip> [results.csv [results.db run]]'.format(sys.argv[0]))
             sys.exit(-1)
         launch_attack()
@@ -1,9 +1,7 @@
 #!/bin/bash
 # (c) 2021 Sohum Mendon
 # This simple bash script launches the probing experiment
-# 5 times, and it cleans up the leftover mininet files.
+# 5 times, side by side, and it cleans up the leftover mininet files.
 
-for i in {1..5}; do
-	sudo python3 probing_accuracy.py experiment	
-	sudo mn -c
-done
+sudo python3 probing_runner.py --repeat 5
+sudo mn -c
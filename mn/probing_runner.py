@@ -0,0 +1,154 @@
+'''Runs many probing_accuracy.py experiments at once.
+
+Every combination of the given idle timeouts, hard timeouts and flow
+limits is run --repeat times. Each run is a separate Mininet network
+(see probing_accuracy.probe_test) with its own node names, bridges,
+controller and REST ports, so up to --processes of them run side by
+side. The probed timeouts of every run are gathered into one CSV
+together with the parameters that produced them, and every run's raw
+RTTs, tests and flow counts go into one results_store.ResultsStore.
+
+Must be run as root, like probing_accuracy.py. Concurrent runs share
+the CPU, so keep --processes at or below the number of cores or the
+probes' RTTs get noisier.
+
+usage: sudo python3 probing_runner.py --idle 5 10 --hard 0 20 --repeat 5
+
+(c) 2021 Sohum Mendon
+'''
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from mininet.clean import cleanup
+from mininet.log import setLogLevel
+
+import probing_accuracy
+
+# columns probing_accuracy.py writes, after its timestamp
+RESULT_FIELDS = ('probed_hard', 'probed_idle', 'hard_samples',
+                 'hard_confidence', 'idle_samples', 'idle_confidence',
+                 'idle_bound')
+PARAM_FIELDS = ('instance', 'idle_timeout', 'hard_timeout', 'flow_limit',
+                'repeat')
+
+
+def _run(job: Tuple[Dict[str, int], str, str, str]) -> Dict[str, object]:
+    params, workdir, store, log_level = job
+    setLogLevel(log_level)
+
+    instance = params['instance']
+    results = os.path.join(workdir, 'run{}.csv'.format(instance))
+    start = time.monotonic()
+    try:
+        probing_accuracy.probe_test(
+            instance, params['idle_timeout'], params['hard_timeout'],
+            params['flow_limit'], results, store)
+    except Exception as e:
+        print('run {} failed: {!r}'.format(instance, e))
+
+    row = dict(params)
+    row['elapsed'] = round(time.monotonic() - start, 1)
+    try:
+        with open(results, newline='') as fp:
+            values = next(csv.reader(fp))[1:]
+        row.update(zip(RESULT_FIELDS, values))
+    except (OSError, StopIteration):
+        # the probe never wrote its result
+        pass
+    return row
+
+
+def jobs(
+        idle: List[int],
+        hard: List[int],
+        flow_limits: List[int],
+        repeat: int) -> List[Dict[str, int]]:
+    '''Returns the parameters of every run, numbered from 1.'''
+    return [
+        dict(zip(PARAM_FIELDS, (i, *values)))
+        for i, values in enumerate(
+            itertools.product(idle, hard, flow_limits, range(repeat)),
+            start=1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--idle', type=int, nargs='+', default=[10],
+                        help='idle timeouts to configure')
+    parser.add_argument('--hard', type=int, nargs='+', default=[20],
+                        help='hard timeouts to configure (0 disables)')
+    parser.add_argument('--flow-limit', type=int, nargs='+', default=[0],
+                        help='switch flow_limits (0 leaves them unset)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per combination')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='networks running at once (default: one per '
+                             'core)')
+    parser.add_argument('--out', default='probing_runs.csv',
+                        help='CSV to append the runs to')
+    parser.add_argument('--store', default='probing_runs.db',
+                        help='SQLite results store for the raw data')
+    parser.add_argument('--log-level', default='warning',
+                        help="each network's Mininet log level")
+    args = parser.parse_args()
+
+    runs = jobs(args.idle, args.hard, args.flow_limit, args.repeat)
+    print('{} runs, {} at a time'.format(len(runs), args.processes))
+
+    # clear what an interrupted experiment left behind, once: mn -c
+    # would tear down the other runs' networks
+    cleanup()
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory() as workdir:
+        # the probe runs as a process on a host, which must be able to
+        # write its result
+        os.chmod(workdir, 0o777)
+        # a fresh process per network, so no Mininet state is shared
+        with multiprocessing.Pool(args.processes, maxtasksperchild=1) as pool:
+            rows = pool.map(
+                _run, [(run, workdir, os.path.abspath(args.store),
+                        args.log_level) for run in runs],
+                chunksize=1)
+    elapsed = time.monotonic() - start
+    cleanup()
+
+    fields = PARAM_FIELDS + RESULT_FIELDS + ('elapsed',)
+    new_file = not os.path.exists(args.out)
+    with open(args.out, 'a', newline='') as fp:
+        writer = csv.DictWriter(fp, fields, restval='')
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+    print('{:>5} {:>5} {:>6} {:>8} {:>8} {:>7}'.format(
+        'idle', 'hard', 'limit', 'idle ok', 'hard ok', 'failed'))
+    key = lambda row: (row['idle_timeout'], row['hard_timeout'],
+                       row['flow_limit'])
+    for (idle, hard, limit), group in itertools.groupby(rows, key):
+        group = [row for row in group if 'probed_idle' in row]
+        # the probes report whole seconds
+        idle_ok = sum(abs(int(row['probed_idle']) - idle) <= 1
+                      for row in group)
+        hard_ok = sum(abs(int(row['probed_hard']) - hard) <= 1
+                      for row in group)
+        print('{:5} {:5} {:6} {:>8} {:>8} {:7}'.format(
+            idle, hard, limit, '{}/{}'.format(idle_ok, len(group)),
+            '{}/{}'.format(hard_ok, len(group)), args.repeat - len(group)))
+    print('{} runs in {:.0f}s, saved to {}'.format(len(rows), elapsed,
+                                                  args.out))
+
+
+if __name__ == '__main__':
+    main()
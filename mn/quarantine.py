@@ -0,0 +1,102 @@
+'''Detects ingress ports that create flows too fast.
+
+A host flooding frames from random source MACs makes SimpleSwitch14
+install one exact-match flow per frame until the switch refuses new
+flows. PortQuarantine counts the flows installed for each
+(dpid, in_port). Once a port installs more than threshold flows within
+window seconds, it is quarantined for duration seconds: the controller
+covers the whole port with one high-priority rule and stops learning
+and installing flows for it.
+'''
+
+import time
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    List,
+)
+
+
+class PortQuarantine:
+    '''Per-port new-flow counters and the ports currently quarantined.'''
+
+    def __init__(
+            self,
+            threshold: int,
+            window: float = 1.0,
+            duration: float = 30.0,
+            clock: Callable[[], float] = time.monotonic):
+        if threshold < 1:
+            raise ValueError('threshold must be positive (got: {})'
+                             .format(threshold))
+        if window <= 0 or duration <= 0:
+            raise ValueError('window and duration must be positive '
+                             '(got: {}, {})'.format(window, duration))
+
+        self.threshold = threshold
+        self.window = window
+        self.duration = duration
+        self.clock = clock
+
+        # port -> [window start, flows installed in the window]
+        self._counts = {}
+        # port -> time the quarantine ends
+        self._until = {}
+
+        self.started = 0
+        self.suppressed = 0
+
+    def active(self, port: Hashable) -> bool:
+        '''Returns True if the port is quarantined.'''
+        until = self._until.get(port)
+        if until is None:
+            return False
+        if self.clock() < until:
+            return True
+        del self._until[port]
+        return False
+
+    def suppress(self, port: Hashable) -> bool:
+        '''Returns True (and counts it) if a packet-in from port is ignored.'''
+        if not self.active(port):
+            return False
+        self.suppressed += 1
+        return True
+
+    def record(self, port: Hashable) -> bool:
+        '''Counts a flow installed for port.
+
+        Returns True if that put the port over the threshold, in which
+        case it is now quarantined.
+        '''
+        now = self.clock()
+        count = self._counts.get(port)
+        if count is None or now - count[0] >= self.window:
+            count = self._counts[port] = [now, 0]
+        count[1] += 1
+        if count[1] <= self.threshold:
+            return False
+
+        del self._counts[port]
+        self._until[port] = now + self.duration
+        self.started += 1
+        return True
+
+    def forget(self, predicate: Callable[[Hashable], bool]):
+        '''Drops the counters and quarantines of the matching ports.'''
+        self._counts = {port: count for port, count in self._counts.items()
+                        if not predicate(port)}
+        self._until = {port: until for port, until in self._until.items()
+                       if not predicate(port)}
+
+    def ports(self) -> List[Hashable]:
+        '''Returns the ports that are quarantined.'''
+        return [port for port in list(self._until) if self.active(port)]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'active': len(self.ports()),
+            'started': self.started,
+            'suppressed': self.suppressed,
+        }
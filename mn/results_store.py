@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+'''An append-only SQLite store of experiment runs and their raw data.
+
+Each run has a row in runs with its configuration and, once finished,
+its results (both JSON). Its raw data goes into three tables that are
+only ever appended to:
+
+    rtts         every RTT a probe measured (NULL when lost), with the
+                 time its batch was sent and its index in the batch
+    tests        every t-test or SignSPRT the probes ran: samples,
+                 statistic (t or log-likelihood ratio), p-value or
+                 confidence, and decision
+    flow_counts  flow_monitor.SAMPLE_DTYPE rows sampled during the run
+
+Appends are buffered and written with executemany in one transaction,
+and the database is in WAL mode, so several processes (e.g. the
+networks of probing_runner.py) can append to one file at once while
+it is being read. Queries stream rows through a cursor, in chunks, so
+thousands of runs never have to fit in memory.
+
+usage: python3 results_store.py results.db [--name NAME] [--run ID]
+'''
+
+import argparse
+import json
+import sqlite3
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+import numpy as np
+
+from flow_monitor import SAMPLE_DTYPE
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    config TEXT NOT NULL,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name, started);
+
+CREATE TABLE IF NOT EXISTS rtts (
+    run INTEGER NOT NULL,
+    probe TEXT NOT NULL,
+    time REAL NOT NULL,
+    seq INTEGER NOT NULL,
+    rtt REAL
+);
+CREATE INDEX IF NOT EXISTS rtts_run ON rtts (run, probe);
+
+CREATE TABLE IF NOT EXISTS tests (
+    run INTEGER NOT NULL,
+    probe TEXT NOT NULL,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    statistic REAL,
+    p_value REAL,
+    confidence REAL,
+    decision INTEGER
+);
+CREATE INDEX IF NOT EXISTS tests_run ON tests (run, probe);
+
+CREATE TABLE IF NOT EXISTS flow_counts (
+    run INTEGER NOT NULL,
+    time REAL NOT NULL,
+    dpid INTEGER NOT NULL,
+    flow_count INTEGER NOT NULL,
+    packet_count INTEGER NOT NULL,
+    byte_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flow_counts_run ON flow_counts (run, time);
+'''
+
+RTT_DTYPE = np.dtype([
+    ('run', np.int64),
+    ('time', np.float64),
+    ('seq', np.int32),
+    ('rtt', np.float64),
+])
+
+# rows fetched per round trip when streaming
+CHUNK = 65536
+
+
+def _to_json(value: Dict[str, Any]) -> str:
+    # results often hold NumPy scalars
+    return json.dumps(value, sort_keys=True,
+                      default=lambda o: o.item() if hasattr(o, 'item')
+                      else str(o))
+
+
+class Run:
+    '''Appends one run's data to a ResultsStore.
+
+    This is the recorder probe.Probing takes. Rows are buffered and
+    written once buffer of them are waiting, and by flush() and
+    finish().
+    '''
+
+    def __init__(self, store: 'ResultsStore', id: int, buffer: int = 10000):
+        self.store = store
+        self.id = id
+        self.buffer = buffer
+        self._rtts = []
+        self._tests = []
+
+    def rtts(self, probe: str, sent: float, rtts: np.ndarray):
+        '''Records a batch of RTTs sent at sent (NaN where lost).'''
+        rtts = np.asarray(rtts, dtype=np.float64)
+        self._rtts.extend(
+            (self.id, probe, sent, seq, None if rtt != rtt else rtt)
+            for seq, rtt in enumerate(rtts.tolist()))
+        if len(self._rtts) >= self.buffer:
+            self.flush()
+
+    def test(
+            self,
+            probe: str,
+            at: float,
+            kind: str,
+            samples: int,
+            statistic: float,
+            p_value: Optional[float] = None,
+            confidence: Optional[float] = None,
+            decision: Optional[bool] = None):
+        '''Records a statistical test the probe ran.'''
+        if statistic is not None and statistic != statistic:
+            statistic = None
+        if p_value is not None and p_value != p_value:
+            p_value = None
+        self._tests.append((self.id, probe, at, kind, samples, statistic,
+                            p_value, confidence,
+                            None if decision is None else int(decision)))
+        if len(self._tests) >= self.buffer:
+            self.flush()
+
+    def flow_counts(self, samples: np.ndarray):
+        '''Records flow_monitor.SAMPLE_DTYPE rows.'''
+        self.store.add_flow_counts(self.id, samples)
+
+    def flush(self):
+        '''Writes the buffered rows.'''
+        rtts, self._rtts = self._rtts, []
+        tests, self._tests = self._tests, []
+        with self.store.db:
+            self.store.db.executemany(
+                'INSERT INTO rtts VALUES (?, ?, ?, ?, ?)', rtts)
+            self.store.db.executemany(
+                'INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', tests)
+
+    def finish(self, results: Dict[str, Any]):
+        '''Writes the buffered rows and the run's results.'''
+        self.flush()
+        self.store.finish(self.id, results)
+
+
+class ResultsStore:
+    '''A SQLite file of runs, RTT samples, tests and flow counts.'''
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        '''timeout is how long to wait for another writer's lock.'''
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        # durable at checkpoints rather than at every commit
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start_run(
+            self,
+            name: str,
+            config: Dict[str, Any],
+            started: float = None) -> Run:
+        '''Adds a run (e.g. name='probing_accuracy') and returns it.'''
+        with self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (name, started, config) VALUES (?, ?, ?)',
+                (name, time.time() if started is None else started,
+                 _to_json(config)))
+        return Run(self, cursor.lastrowid)
+
+    def run(self, id: int) -> Run:
+        '''Returns a Run to append to an existing run.'''
+        if self.db.execute('SELECT 1 FROM runs WHERE id = ?',
+                           (id,)).fetchone() is None:
+            raise ValueError('no run {} in {}'.format(id, self.path))
+        return Run(self, id)
+
+    def finish(self, id: int, results: Dict[str, Any]):
+        with self.db:
+            self.db.execute(
+                'UPDATE runs SET finished = ?, results = ? WHERE id = ?',
+                (time.time(), _to_json(results), id))
+
+    def add_flow_counts(self, id: int, samples: np.ndarray):
+        rows = ((id, *row) for row in
+                np.asarray(samples, dtype=SAMPLE_DTYPE).tolist())
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO flow_counts VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def runs(
+            self,
+            name: str = None,
+            finished: bool = None) -> Iterator[Dict[str, Any]]:
+        '''Yields the runs (oldest first), with config and results parsed.'''
+        query = 'SELECT id, name, started, finished, config, results ' \
+                'FROM runs'
+        clauses, params = [], []
+        if name is not None:
+            clauses.append('name = ?')
+            params.append(name)
+        if finished is not None:
+            clauses.append('finished IS {}NULL'.format('NOT ' if finished
+                                                       else ''))
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        for id, name, started, end, config, results in self.db.execute(
+                query + ' ORDER BY id', params):
+            yield {'id': id, 'name': name, 'started': started,
+                   'finished': end, 'config': json.loads(config),
+                   'results': json.loads(results) if results else None}
+
+    def iter_rtts(
+            self,
+            runs: List[int] = None,
+            probe: str = None,
+            chunk: int = CHUNK) -> Iterator[np.ndarray]:
+        '''Yields RTT_DTYPE arrays of at most chunk rows (lost as NaN).
+
+        runs (default: all) and probe narrow the rows down.
+        '''
+        query = 'SELECT run, time, seq, rtt FROM rtts'
+        clauses, params = [], []
+        if runs is not None:
+            runs = list(runs)
+            clauses.append('run IN ({})'.format(', '.join('?' * len(runs))))
+            params.extend(runs)
+        if probe is not None:
+            clauses.append('probe = ?')
+            params.append(probe)
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+
+        cursor = self.db.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                return
+            yield np.array([row[:3] + (np.nan if row[3] is None else row[3],)
+                            for row in rows], dtype=RTT_DTYPE)
+
+    def rtts(self, run: int, probe: str = None) -> np.ndarray:
+        '''Returns one run's RTTs as an RTT_DTYPE array.'''
+        chunks = list(self.iter_rtts([run], probe))
+        if not chunks:
+            return np.zeros(0, dtype=RTT_DTYPE)
+        return np.concatenate(chunks)
+
+    def tests(self, run: int, probe: str = None) -> List[Dict[str, Any]]:
+        '''Returns one run's tests, in the order they ran.'''
+        query = 'SELECT * FROM tests WHERE run = ?'
+        params = [run]
+        if probe is not None:
+            query += ' AND probe = ?'
+            params.append(probe)
+        cursor = self.db.execute(query + ' ORDER BY rowid', params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def flow_counts(self, run: int) -> np.ndarray:
+        '''Returns one run's flow counts as flow_monitor.SAMPLE_DTYPE rows.'''
+        rows = self.db.execute(
+            'SELECT time, dpid, flow_count, packet_count, byte_count '
+            'FROM flow_counts WHERE run = ? ORDER BY time', (run,)).fetchall()
+        return np.array(rows, dtype=SAMPLE_DTYPE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='SQLite file')
+    parser.add_argument('--name', help='only list runs with this name')
+    parser.add_argument('--run', type=int,
+                        help='summarize the RTTs and tests of one run')
+    args = parser.parse_args()
+
+    with ResultsStore(args.path) as store:
+        if args.run is None:
+            for run in store.runs(args.name):
+                print('{:6} {:20} {} {} -> {}'.format(
+                    run['id'], run['name'], time.ctime(run['started']),
+                    json.dumps(run['config'], sort_keys=True),
+                    json.dumps(run['results'], sort_keys=True)))
+            return
+
+        tests = store.tests(args.run)
+        counts = store.flow_counts(args.run)
+        print('run {}: {} tests, {} flow-count samples'.format(
+            args.run, len(tests), len(counts)))
+        probes = [probe for probe, in store.db.execute(
+            'SELECT DISTINCT probe FROM rtts WHERE run = ?', (args.run,))]
+        for probe in probes:
+            rtts = store.rtts(args.run, probe)['rtt']
+            lost = np.isnan(rtts)
+            print('  {:26} {} RTTs, {} lost, median {:.2f} ms'.format(
+                probe, len(rtts), int(lost.sum()),
+                float(np.median(rtts[~lost])) * 1e3 if (~lost).any()
+                else float('nan')))
+        for test in tests:
+            print('  {:26} {:5} n={:<3} statistic={:8.3f} {} decision={}'
+                  .format(test['probe'], test['kind'], test['samples'],
+                          test['statistic'] if test['statistic'] is not None
+                          else float('nan'),
+                          'p={:.4f}'.format(test['p_value'])
+                          if test['p_value'] is not None
+                          else 'confidence={:.4f}'.format(test['confidence']),
+                          test['decision']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+'''Measures ICMP echo RTTs of crafted Ethernet frames in batches.
+
+srp() opens a capture socket per call and timestamps in userspace
+(see https://github.com/secdev/scapy/issues/2277). RTTEngine instead
+keeps two AF_PACKET sockets open on one interface: one to send the
+frames, and one to capture both the outgoing echo requests and the
+echo replies, with the kernel's receive timestamp (SO_TIMESTAMPNS) on
+every frame. An RTT is the difference between the two timestamps of a
+request/reply pair, matched by ICMP id and sequence number, so neither
+Python nor scapy sits inside the measured interval.
+
+Linux only, and it needs CAP_NET_RAW like scapy does.
+'''
+
+import select
+import socket
+import struct
+import time
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+import numpy as np
+from scapy.all import (
+    ICMP,
+    Ether,
+    conf,
+)
+
+ETH_P_IP = 0x0800
+# from <asm-generic/socket.h>; not exported by the socket module
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+TIMESPEC = struct.Struct('@ll')
+ICMP_ECHO = struct.Struct('!BBHHH')
+
+
+def _kernel_time(ancdata) -> float:
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            sec, nsec = TIMESPEC.unpack_from(data)
+            return sec + nsec / 1e9
+    return time.time()
+
+
+def _parse_echo(frame: bytes):
+    '''Returns (icmp type, id, seq) of an IPv4 ICMP echo frame, or None.'''
+    if len(frame) < 14 + 20 + 8:
+        return None
+    if frame[12:14] != b'\x08\x00' or frame[23] != 1:
+        return None
+    offset = 14 + (frame[14] & 0x0f) * 4
+    if len(frame) < offset + ICMP_ECHO.size:
+        return None
+    kind, _, _, ident, seq = ICMP_ECHO.unpack_from(frame, offset)
+    if kind not in (ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY):
+        return None
+    return kind, ident, seq
+
+
+class RTTEngine:
+    '''Sends batches of ICMP echo frames and times their replies.'''
+
+    def __init__(self, iface: str = None, ident: int = None):
+        '''iface defaults to scapy's conf.iface.
+
+        ident is the ICMP id stamped on every probe (random by
+        default); replies to other ids are ignored.
+        '''
+
+        self.iface = str(iface or conf.iface)
+        self.ident = ident if ident is not None \
+            else int.from_bytes(np.random.bytes(2), 'big')
+        self.seq = 0
+
+        self.tx = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        self.tx.bind((self.iface, 0))
+
+        # the kernel doesn't loop a socket's own frames back to it, so
+        # requests are captured on a second socket
+        self.rx = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                socket.htons(ETH_P_IP))
+        self.rx.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        self.rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.rx.bind((self.iface, ETH_P_IP))
+        self.rx.setblocking(False)
+
+    def close(self):
+        self.tx.close()
+        self.rx.close()
+
+    def __enter__(self) -> 'RTTEngine':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_seq(self) -> int:
+        self.seq = (self.seq + 1) & 0xffff
+        return self.seq
+
+    def _drain(self):
+        '''Discards frames captured before this batch.'''
+        while True:
+            try:
+                self.rx.recv(65535)
+            except BlockingIOError:
+                return
+
+    def send(self, pkts: List[Ether]):
+        '''Sends each frame once, without waiting for replies.'''
+        for pkt in pkts:
+            self.tx.send(bytes(pkt))
+
+    def probe(
+            self,
+            pkts: List[Ether],
+            timeout: float = 1.0,
+            spacing: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        '''Sends each frame once and returns (rtts, lost).
+
+        The frames must be IPv4 ICMP echo requests; their ICMP id and
+        sequence number are overwritten so replies can be matched.
+        spacing is the pause between sends. Waits at most timeout
+        seconds after the last send. rtts is in seconds; lost is True
+        (and the RTT NaN) where no reply came back.
+        '''
+
+        n = len(pkts)
+        rtts = np.full(n, np.nan)
+        lost = np.ones(n, dtype=bool)
+        # seq -> index, and the timestamps seen so far
+        index = {}
+        sent_at = np.full(n, np.nan)
+        user_sent = np.full(n, np.nan)
+
+        frames = []
+        for i, pkt in enumerate(pkts):
+            pkt = pkt.copy()
+            seq = self._next_seq()
+            pkt[ICMP].id = self.ident
+            pkt[ICMP].seq = seq
+            del pkt[ICMP].chksum
+            frames.append(bytes(pkt))
+            index[seq] = i
+
+        self._drain()
+        remaining = n
+        for i, frame in enumerate(frames):
+            user_sent[i] = time.time()
+            self.tx.send(frame)
+            remaining -= self._collect(index, sent_at, user_sent, rtts, lost)
+            if spacing > 0 and i + 1 < n:
+                time.sleep(spacing)
+
+        deadline = time.monotonic() + timeout
+        while remaining > 0:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            if select.select([self.rx], [], [], wait)[0]:
+                remaining -= self._collect(index, sent_at, user_sent, rtts,
+                                           lost)
+
+        return rtts, lost
+
+    def _collect(
+            self,
+            index: Dict[int, int],
+            sent_at: np.ndarray,
+            user_sent: np.ndarray,
+            rtts: np.ndarray,
+            lost: np.ndarray) -> int:
+        '''Reads what has been captured. Returns how many replies matched.'''
+        matched = 0
+        while True:
+            try:
+                frame, ancdata, _, addr = self.rx.recvmsg(
+                    65535, socket.CMSG_SPACE(TIMESPEC.size))
+            except BlockingIOError:
+                return matched
+
+            echo = _parse_echo(frame)
+            if echo is None:
+                continue
+            kind, ident, seq = echo
+            if ident != self.ident or seq not in index:
+                continue
+
+            i = index[seq]
+            stamp = _kernel_time(ancdata)
+            if kind == ICMP_ECHO_REQUEST:
+                # the first copy is the one leaving the interface
+                # (PACKET_OUTGOING; loopback only shows the incoming one)
+                if np.isnan(sent_at[i]):
+                    sent_at[i] = stamp
+            elif kind == ICMP_ECHO_REPLY and lost[i]:
+                lost[i] = False
+                sent = sent_at[i]
+                if np.isnan(sent):
+                    # the request wasn't captured; fall back to the
+                    # time send() was called
+                    sent = user_sent[i]
+                rtts[i] = max(stamp - sent, 0.0)
+                matched += 1
@@ -7,14 +7,22 @@ overfilled.
 (c) 2021 Sohum Mendon
 '''
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterable,
     List,
     Optional,
-    Tuple,
 )
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from flow_stats import parse_flow_stats
 
 
 class RyuAPI:
@@ -25,9 +33,19 @@ class RyuAPI:
     configuration.
 
     This expects OpenFlow v1.4 for certain methods.
+
+    Connections are kept open between calls, every call has a
+    timeout, and failed connections or 502/503/504 responses are
+    retried a few times. The *_many methods query several switches
+    concurrently.
     '''
 
-    def __init__(self, url: str):
+    def __init__(
+            self,
+            url: str,
+            timeout: float = 5.0,
+            retries: int = 2,
+            max_workers: int = 16):
         '''Alows querying the Ryu API when provided the hostname.
 
         e.g. url = 192.168.1.155:8080, or 127.0.0.1:8080
@@ -35,9 +53,37 @@ class RyuAPI:
             https://ryu.readthedocs.io/en/latest/app/ofctl_rest.html
 
         Only works if ryu.app.ofctl_rest is included.
+
+        timeout is the default per-call timeout in seconds, retries is
+        how many times a failed call is retried, and max_workers bounds
+        both the concurrent calls of the *_many methods and the number
+        of pooled connections.
         '''
 
         self.url = url
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+        retry = Retry(total=retries, backoff_factor=0.1,
+                      status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self._executor = None
+
+    def close(self):
+        '''Closes the pooled connections and worker threads.'''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+
+    def __enter__(self) -> 'RyuAPI':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def _assemble_url(self, args: List[str]) -> str:
         '''Creates a URL for the REST API calls.
@@ -55,36 +101,98 @@ class RyuAPI:
             return True
         return False
 
-    def aggregate_flow_stats(self, dpid: int) -> Optional[Dict[str, Any]]:
-        '''A wrapper for the API call.
+    def _get(
+            self,
+            args: List[str],
+            timeout: Optional[float] = None) -> Optional[Any]:
+        '''GETs a REST API path and returns the decoded JSON.
 
-        See:
-            https://ryu.readthedocs.io/en/latest/app/ofctl_rest.html#get-aggregate-flow-stats
+        Returns None if the call fails or times out.
         '''
 
-        url = self._assemble_url(['stats', 'aggregateflow', str(dpid)])
+        url = self._assemble_url(args)
 
-        resp = requests.get(url)
+        try:
+            resp = self.session.get(url, timeout=timeout or self.timeout)
+        except requests.RequestException as e:
+            print('Error fetching {}: {}'.format(url, e))
+            return
         if self._handle_error_status(resp.status_code, url):
             return
 
         return resp.json()
 
-    def get_num_flows(self, switches: Tuple[int] = (4, 5)) -> int:
-        '''Gets the total number of flows over the two switches.
+    def _get_many(
+            self,
+            args: List[str],
+            dpids: Iterable[int],
+            timeout: Optional[float] = None) -> Dict[int, Optional[Any]]:
+        '''Runs _get(args + [dpid]) for every dpid concurrently.'''
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers)
+
+        dpids = list(dpids)
+        results = self._executor.map(
+            lambda dpid: self._get(args + [str(dpid)], timeout), dpids)
+        return dict(zip(dpids, results))
+
+    def aggregate_flow_stats(
+            self,
+            dpid: int,
+            timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        '''A wrapper for the API call.
+
+        See:
+            https://ryu.readthedocs.io/en/latest/app/ofctl_rest.html#get-aggregate-flow-stats
+        '''
+
+        return self._get(['stats', 'aggregateflow', str(dpid)], timeout)
+
+    def aggregate_flow_stats_many(
+            self,
+            dpids: Iterable[int],
+            timeout: Optional[float] = None
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        '''aggregate_flow_stats for several switches at once.
+
+        Returns a dict of dpid to response (None where the call failed).
+        '''
+
+        return self._get_many(['stats', 'aggregateflow'], dpids, timeout)
+
+    def get_switches(
+            self,
+            timeout: Optional[float] = None) -> Optional[List[int]]:
+        '''Returns the dpids of the connected switches, sorted.
+
+        Returns None if the call fails or times out.
+
+        See:
+            https://ryu.readthedocs.io/en/latest/app/ofctl_rest.html#get-all-switches
+        '''
+
+        dpids = self._get(['stats', 'switches'], timeout)
+        return None if dpids is None else sorted(dpids)
+
+    def get_num_flows(self, switches: Optional[Iterable[int]] = None) -> int:
+        '''Gets the total number of flows over the switches.
 
         Expects an iterable of numbers that correspond to
-        the switch id numbers. By default, it's set to the switch's
-        id numbers in the experiment.
+        the switch id numbers. By default, every switch connected
+        to the controller is counted.
 
         Note that this may return double the number of actual flows,
         since the flow rule may be installed on both the first switch
         and the second switch.
         '''
 
+        if switches is None:
+            switches = self.get_switches() or []
+
         count = 0
-        for switch_id in switches:
-            restful_json = self.aggregate_flow_stats(switch_id)
+        responses = self.aggregate_flow_stats_many(switches)
+        for switch_id, restful_json in responses.items():
             if restful_json is None:
                 continue
 
@@ -92,17 +200,90 @@ class RyuAPI:
 
         return count
 
-    def get_flow_stats(self, dpid: int) -> Optional[Dict[str, Any]]:
+    def get_flow_stats(
+            self,
+            dpid: int,
+            timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
         '''A wrapper for the API call.
 
         See:
             https://ryu.readthedocs.io/en/latest/app/ofctl_rest.html#get-all-flows-stats
         '''
 
+        return self._get(['stats', 'flow', str(dpid)], timeout)
+
+    def get_flow_stats_array(
+            self,
+            dpid: int,
+            timeout: Optional[float] = None,
+            chunk_size: int = 1 << 16) -> Optional[np.ndarray]:
+        '''Like get_flow_stats, but streams the body into a NumPy array.
+
+        The flows are parsed as they arrive and only their match
+        in_port/eth_src/eth_dst, priority, table, timeouts, counters and
+        duration are kept, in a structured array of
+        flow_stats.FLOW_DTYPE (MACs as ints). This is much lighter than
+        get_flow_stats for switches with many flows.
+
+        Returns None if the call fails or times out.
+        '''
+
         url = self._assemble_url(['stats', 'flow', str(dpid)])
 
-        resp = requests.get(url)
-        if self._handle_error_status(resp.status_code, url):
+        try:
+            with self.session.get(url, timeout=timeout or self.timeout,
+                                  stream=True) as resp:
+                if self._handle_error_status(resp.status_code, url):
+                    return
+                return parse_flow_stats(resp.iter_content(chunk_size))
+        except (requests.RequestException, ValueError) as e:
+            print('Error fetching {}: {}'.format(url, e))
             return
 
-        return resp.json()
+    def get_flow_stats_many(
+            self,
+            dpids: Iterable[int],
+            timeout: Optional[float] = None
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        '''get_flow_stats for several switches at once.
+
+        Returns a dict of dpid to response (None where the call failed).
+        '''
+
+        return self._get_many(['stats', 'flow'], dpids, timeout)
+
+
+class SwitchList:
+    '''The dpids a monitor polls.
+
+    Either a fixed list, or (with dpids=None) the switches the
+    controller reports through /stats/switches, asked again every
+    interval seconds so switches that connect later are picked up.
+    '''
+
+    def __init__(
+            self,
+            api: RyuAPI,
+            dpids: Optional[Iterable[int]] = None,
+            interval: float = 10.0,
+            clock: Callable[[], float] = time.monotonic):
+        self.api = api
+        self.discover = dpids is None
+        self.dpids = [] if dpids is None else list(dpids)
+        self.interval = interval
+        self.clock = clock
+        self._next = clock()
+
+    def __call__(self) -> List[int]:
+        '''Returns the dpids, asking the controller again if it's time.
+
+        If the controller can't be reached, the last known dpids are
+        kept (and it's asked again on the next call).
+        '''
+        now = self.clock()
+        if self.discover and now >= self._next:
+            dpids = self.api.get_switches()
+            if dpids is not None:
+                self.dpids = dpids
+                self._next = now + self.interval
+        return self.dpids
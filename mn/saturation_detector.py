@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+'''Detects flow-table exhaustion attacks from flow stats snapshots.
+
+Each snapshot is a switch's flow table as returned by
+RyuAPI.get_flow_stats_array(). Over a sliding window of the last few
+snapshots of a switch, SaturationDetector computes:
+
+- new_flow_rate: flows installed per second (a flow is new if its
+  duration is shorter than the time since the previous snapshot),
+- entropy / entropy_port: the highest Shannon entropy (in bits) of
+  the source MACs of new flows on one ingress port, and that port,
+- single_share: the fraction of the table that has matched at most
+  one packet,
+- slope: the least-squares growth of the flow count, in flows/s,
+- time_to_full: when the table reaches capacity at that slope.
+
+An alert is raised when new flows arrive faster than min_rate and
+either one port's new sources look random, most of the table is
+single-packet flows, or the table is about to fill. It is cleared once
+none of that has held for a whole window.
+
+Live, the switches are polled through RyuAPI and the snapshots can be
+recorded. A recording can be replayed offline with the same (or
+different) thresholds.
+
+usage: python3 saturation_detector.py live [--dpids 4 5 ...] [--record F]
+       python3 saturation_detector.py replay F
+'''
+
+import argparse
+from collections import deque
+import time
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from flow_monitor import TimeSeriesFile, load_time_series
+from flow_stats import FLOW_DTYPE
+from ryu import RyuAPI, SwitchList
+
+# a recorded snapshot row: when and where, then the flow
+SNAPSHOT_DTYPE = np.dtype([('time', np.float64), ('dpid', np.uint64)]
+                          + FLOW_DTYPE.descr)
+
+FEATURE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('dpid', np.uint64),
+    ('flows', np.uint32),
+    ('new_flow_rate', np.float64),
+    ('entropy', np.float64),
+    ('entropy_port', np.uint32),
+    ('single_share', np.float64),
+    ('slope', np.float64),
+    ('time_to_full', np.float64),
+    ('alert', np.bool_),
+])
+
+
+def port_entropy(in_port: np.ndarray, eth_src: np.ndarray) -> Tuple[int, float]:
+    '''Returns the port whose source MACs have the highest entropy, and it.
+
+    Returns (0, 0.0) when there is nothing to measure.
+    '''
+
+    if not len(in_port):
+        return 0, 0.0
+
+    key = (in_port.astype(np.uint64) << np.uint64(48)) | eth_src
+    pairs, counts = np.unique(key, return_counts=True)
+    ports, index = np.unique(pairs >> np.uint64(48), return_inverse=True)
+
+    total = np.bincount(index, weights=counts)
+    p = counts / total[index]
+    entropy = -np.bincount(index, weights=p * np.log2(p))
+
+    best = int(np.argmax(entropy))
+    return int(ports[best]), float(entropy[best])
+
+
+class _Window:
+    '''The last few snapshots of one switch.'''
+
+    def __init__(self, size: int):
+        self.times = deque(maxlen=size)
+        self.counts = deque(maxlen=size)
+        # (in_port, eth_src) of the flows that were new in each snapshot
+        self.new = deque(maxlen=size)
+        self.new_counts = deque(maxlen=size)
+        self.alerting = False
+        # snapshots since the alert conditions last held
+        self.quiet = 0
+
+
+class SaturationDetector:
+    '''Scores flow table snapshots and raises saturation alerts.'''
+
+    def __init__(
+            self,
+            window: int = 5,
+            capacity: int = 0,
+            min_rate: float = 20.0,
+            entropy: float = 4.0,
+            single_share: float = 0.8,
+            fill_horizon: float = 10.0):
+        '''window is the number of snapshots features are computed over.
+
+        capacity is the switch's flow_limit (0 if unknown, which
+        disables the time_to_full condition). entropy is in bits, so 4
+        means about 16 equally frequent source MACs on one port.
+        '''
+
+        if window < 2:
+            raise ValueError('window must be at least 2 (got: {})'
+                             .format(window))
+
+        self.window = window
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.entropy = entropy
+        self.single_share = single_share
+        self.fill_horizon = fill_horizon
+
+        # dpid -> _Window
+        self.windows = {}
+
+    def update(self, dpid: int, now: float, flows: np.ndarray) -> np.void:
+        '''Scores a new snapshot of a switch. Returns a FEATURE_DTYPE row.
+
+        flows is a FLOW_DTYPE array; the table-miss entry (priority 0)
+        is ignored.
+        '''
+
+        w = self.windows.get(dpid)
+        if w is None:
+            w = self.windows[dpid] = _Window(self.window)
+
+        flows = flows[flows['priority'] > 0]
+        if w.times:
+            new = flows[flows['duration'] < now - w.times[-1]]
+        else:
+            new = flows[:0]
+
+        w.times.append(now)
+        w.counts.append(len(flows))
+        sources = new[new['eth_src'] != 0]
+        w.new.append((sources['in_port'], sources['eth_src']))
+        w.new_counts.append(len(new))
+
+        row = np.zeros((), dtype=FEATURE_DTYPE)
+        row['time'] = now
+        row['dpid'] = dpid
+        row['flows'] = len(flows)
+        row['time_to_full'] = np.inf
+
+        if len(w.times) > 1:
+            times = np.array(w.times)
+            counts = np.array(w.counts, dtype=np.float64)
+            span = times[-1] - times[0]
+            if span > 0:
+                # the first snapshot's new flows predate the window
+                row['new_flow_rate'] = \
+                    (sum(w.new_counts) - w.new_counts[0]) / span
+                t = times - times.mean()
+                row['slope'] = (t * (counts - counts.mean())).sum() \
+                    / (t * t).sum()
+
+        row['entropy_port'], row['entropy'] = port_entropy(
+            np.concatenate([in_port for in_port, _ in w.new]),
+            np.concatenate([eth_src for _, eth_src in w.new]))
+        if len(flows):
+            row['single_share'] = np.count_nonzero(
+                flows['packet_count'] <= 1) / len(flows)
+        if self.capacity and row['slope'] > 0:
+            row['time_to_full'] = max(
+                0.0, (self.capacity - len(flows)) / row['slope'])
+
+        suspicious = row['new_flow_rate'] >= self.min_rate and (
+            row['entropy'] >= self.entropy
+            or row['single_share'] >= self.single_share
+            or row['time_to_full'] <= self.fill_horizon)
+        if suspicious:
+            w.quiet = 0
+            w.alerting = True
+        elif w.alerting:
+            w.quiet += 1
+            if w.quiet >= self.window:
+                w.alerting = False
+        row['alert'] = w.alerting
+        return row
+
+
+def snapshots(records: np.ndarray) -> Iterator[Tuple[float, int, np.ndarray]]:
+    '''Splits recorded SNAPSHOT_DTYPE rows into (time, dpid, flows).'''
+    if not len(records):
+        return
+    edges = np.flatnonzero((np.diff(records['time']) != 0)
+                           | (np.diff(records['dpid']) != 0)) + 1
+    for start, end in zip(np.r_[0, edges], np.r_[edges, len(records)]):
+        rows = records[start:end]
+        flows = np.empty(len(rows), dtype=FLOW_DTYPE)
+        for name in FLOW_DTYPE.names:
+            flows[name] = rows[name]
+        yield float(rows['time'][0]), int(rows['dpid'][0]), flows
+
+
+def replay(path: str, detector: SaturationDetector) -> np.ndarray:
+    '''Scores a recording. Returns one FEATURE_DTYPE row per snapshot.'''
+    rows = [detector.update(dpid, now, flows)
+            for now, dpid, flows in snapshots(load_time_series(
+                path, SNAPSHOT_DTYPE))]
+    return np.array(rows, dtype=FEATURE_DTYPE)
+
+
+def record(store: TimeSeriesFile, dpid: int, now: float, flows: np.ndarray):
+    rows = np.empty(len(flows), dtype=SNAPSHOT_DTYPE)
+    rows['time'] = now
+    rows['dpid'] = dpid
+    for name in FLOW_DTYPE.names:
+        rows[name] = flows[name]
+    store.append(rows)
+
+
+def format_row(row: np.void) -> str:
+    return ('s{} flows={} new/s={:.1f} entropy={:.2f} (port {}) '
+            'single={:.2f} slope={:.1f}/s full_in={:.1f}s'
+            .format(row['dpid'], row['flows'], row['new_flow_rate'],
+                    row['entropy'], row['entropy_port'],
+                    row['single_share'], row['slope'],
+                    row['time_to_full']))
+
+
+def _report(row: np.void, was: Dict[int, bool], verbose: bool):
+    '''Prints alert transitions (and every row if verbose).'''
+    dpid = int(row['dpid'])
+    stamp = time.strftime('%H:%M:%S', time.localtime(row['time']))
+    if row['alert'] != was.get(dpid, False):
+        print('{} {} {}'.format(stamp, 'ALERT' if row['alert'] else 'clear',
+                                format_row(row)), flush=True)
+        was[dpid] = bool(row['alert'])
+    elif verbose:
+        print('{}       {}'.format(stamp, format_row(row)), flush=True)
+
+
+def run_live(
+        api: RyuAPI,
+        dpids: Optional[List[int]],
+        detector: SaturationDetector,
+        interval: float,
+        store: Optional[TimeSeriesFile] = None,
+        verbose: bool = False):
+    # None watches every switch the controller reports
+    switches = SwitchList(api, dpids)
+    was = {}
+    next_tick = time.monotonic()
+    while True:
+        for dpid in switches():
+            flows = api.get_flow_stats_array(dpid)
+            if flows is None:
+                continue
+            now = time.time()
+            if store is not None:
+                record(store, dpid, now, flows)
+            _report(detector.update(dpid, now, flows), was, verbose)
+
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--window', type=int, default=5,
+                        help='snapshots per sliding window')
+    parser.add_argument('--capacity', type=int, default=0,
+                        help='switch flow_limit (0 if unknown)')
+    parser.add_argument('--min-rate', type=float, default=20.0,
+                        help='new flows/s below which nothing alerts')
+    parser.add_argument('--entropy', type=float, default=4.0,
+                        help='source MAC entropy (bits) of a flooding port')
+    parser.add_argument('--single-share', type=float, default=0.8,
+                        help='share of single-packet flows that alerts')
+    parser.add_argument('--fill-horizon', type=float, default=10.0,
+                        help='alert if the table fills within this many '
+                             'seconds')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='print the features of every snapshot')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    live = commands.add_parser('live', help='poll switches through Ryu')
+    live.add_argument('--url', default='localhost:8080',
+                      help='host:port of the Ryu REST API')
+    live.add_argument('--dpids', type=int, nargs='+',
+                      help='switches to watch (default: every switch the '
+                           'controller reports)')
+    live.add_argument('--interval', type=float, default=1.0,
+                      help='seconds between snapshots')
+    live.add_argument('--record', help='file to append the snapshots to')
+
+    offline = commands.add_parser('replay', help='score a recording')
+    offline.add_argument('path', help='file written with live --record')
+
+    args = parser.parse_args()
+    detector = SaturationDetector(args.window, args.capacity, args.min_rate,
+                                  args.entropy, args.single_share,
+                                  args.fill_horizon)
+
+    if args.command == 'replay':
+        start = time.perf_counter()
+        features = replay(args.path, detector)
+        elapsed = time.perf_counter() - start
+
+        was = {}
+        for row in features:
+            _report(row, was, args.verbose)
+        alerts = features[features['alert']]
+        print('{} snapshots scored in {:.2f}s, {} alerting'
+              .format(len(features), elapsed, len(alerts)))
+        if len(alerts):
+            first = alerts['time'].min() - features['time'].min()
+            print('first alert {:.1f}s into the recording'.format(first))
+        return
+
+    store = TimeSeriesFile(args.record, SNAPSHOT_DTYPE) if args.record \
+        else None
+    with RyuAPI(args.url) as api:
+        try:
+            run_live(api, args.dpids, detector, args.interval, store,
+                     args.verbose)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if store is not None:
+                store.close()
+
+
+if __name__ == '__main__':
+    main()
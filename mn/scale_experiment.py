@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+'''Measures table exhaustion and controller load on a large topology.
+
+Starts a linear, tree or fat-tree network from topo-scale.py with Ryu
+running simple_switch_14.py and ofctl_rest. Every bridge's flow table
+is capped at --flow-limit. Each benign host replays benign_traffic.py
+traffic to a server, and after --attack-start the attackers flood the
+servers with one-packet flows from new source MACs. Every --interval
+seconds it samples:
+
+    - the flow count of every switch, found through /stats/switches
+      (also saved to --output, a flow_monitor time-series file)
+    - the controller's CPU use and memory
+
+It prints one line per sample and a summary at the end; --json saves
+the summary and the series for comparing sizes.
+
+usage: sudo python3 scale_experiment.py fattree --k 8 --benign 64
+           --attackers 8 --duration 120
+       sudo python3 scale_experiment.py linear --switches 200
+'''
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import (
+    Dict,
+    List,
+)
+
+import numpy as np
+
+from mininet.log import setLogLevel
+from mininet.net import Mininet
+from mininet.node import Ryu
+
+from flow_monitor import FlowMonitor
+from ryu import RyuAPI
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+topology = importlib.import_module('topo-scale')
+
+OPENFLOW_PORT = 6653
+REST_PORT = 8080
+
+
+def _usage(pid: int) -> Dict[str, float]:
+    '''Returns the CPU seconds and resident memory (MB) of pid and its
+    children.
+    '''
+    ticks = os.sysconf('SC_CLK_TCK')
+    total = {'cpu': 0.0, 'rss': 0.0}
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open('/proc/{}/stat'.format(pid)) as fp:
+                # the fields after the command name, which may hold spaces
+                fields = fp.read().rsplit(')', 1)[1].split()
+            total['cpu'] += (int(fields[11]) + int(fields[12])) / ticks
+            with open('/proc/{}/status'.format(pid)) as fp:
+                for line in fp:
+                    if line.startswith('VmRSS:'):
+                        total['rss'] += int(line.split()[1]) / 1024
+            with open('/proc/{0}/task/{0}/children'.format(pid)) as fp:
+                pids.extend(int(child) for child in fp.read().split())
+        except OSError:
+            continue
+    return total
+
+
+def _controller_pid(port: int) -> int:
+    out = subprocess.run(
+        ['pgrep', '-o', '-f', '--', '--ofp-tcp-listen-port {}'.format(port)],
+        capture_output=True, text=True).stdout.split()
+    if not out:
+        raise RuntimeError('no controller is listening on port {}'
+                           .format(port))
+    return int(out[0])
+
+
+def _traffic(
+        host,
+        server,
+        directory: str,
+        seed: int,
+        options: List[str]) -> str:
+    '''Starts benign_traffic.py on host, sending to server.'''
+    return host.cmd(
+        'python3 {} --src {} --dst {} --dst-mac {} --iface {} --seed {} '
+        '--dir {} {} > {}.log 2>&1 &'.format(
+            os.path.join(HERE, 'benign_traffic.py'), host.IP(), server.IP(),
+            server.MAC(), host.defaultIntf(), seed, directory,
+            ' '.join(options), directory))
+
+
+def build_topology(args: argparse.Namespace):
+    counts = {'benign': args.benign, 'attackers': args.attackers,
+              'servers': args.servers}
+    if args.topology == 'linear':
+        return topology.LinearTopo(args.switches, **counts)
+    if args.topology == 'tree':
+        return topology.TreeTopo(args.depth, args.fanout, **counts)
+    return topology.FatTreeTopo(args.k, **counts)
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    topo = build_topology(args)
+
+    config = tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False)
+    with config:
+        config.write('[simple_switch]\n')
+        for option in args.set:
+            name, value = option.split('=', 1)
+            config.write('{} = {}\n'.format(name, value))
+    controller_args = '--config-file {} --wsapi-port {} ryu.app.ofctl_rest ' \
+        '{}'.format(config.name, REST_PORT,
+                    os.path.join(HERE, 'simple_switch_14.py'))
+
+    net = Mininet(topo, controller=lambda name: Ryu(
+        'c0', controller_args, port=OPENFLOW_PORT))
+    workdir = tempfile.mkdtemp(prefix='loft-scale-')
+    api = RyuAPI('localhost:{}'.format(REST_PORT), timeout=args.interval,
+                 max_workers=32)
+    try:
+        net.start()
+        net.waitConnected()
+        if args.settle:
+            print('waiting {:.0f}s for the switches to settle'
+                  .format(args.settle))
+            time.sleep(args.settle)
+
+        if args.flow_limit:
+            for switch in net.switches:
+                switch.vsctl('-- --id=@ft create Flow_Table flow_limit={} '
+                             'overflow_policy=refuse -- set Bridge {} '
+                             'flow_tables=0=@ft'
+                             .format(args.flow_limit, switch.name))
+
+        pid = _controller_pid(OPENFLOW_PORT)
+        servers = [net.get(name) for name in topo.serverHosts]
+        benign = [net.get(name) for name in topo.benignHosts]
+        attackers = [net.get(name) for name in topo.attackerHosts]
+
+        for i, host in enumerate(benign):
+            _traffic(host, servers[i % len(servers)],
+                     os.path.join(workdir, host.name), i,
+                     ['--flows', str(args.benign_flows),
+                      '--rate', str(args.benign_rate)])
+
+        monitor = FlowMonitor(api, None, args.interval, output=args.output,
+                              summary=0)
+        series = []
+        attacking = False
+        start = time.monotonic()
+        last = _usage(pid)
+        last_time = start
+        next_tick = start
+        print('{:>6} {:>8} {:>8} {:>6} {:>6} {:>6} {:>8}'.format(
+            'time', 'switches', 'flows', 'max', 'full', 'cpu%', 'rss MB'))
+        while next_tick - start < args.duration:
+            now = time.monotonic()
+            if not attacking and now - start >= args.attack_start:
+                for i, host in enumerate(attackers):
+                    _traffic(host, servers[i % len(servers)],
+                             os.path.join(workdir, host.name),
+                             len(benign) + i,
+                             ['--flows', str(int(args.attack_rate
+                                                 * args.duration)),
+                              '--rate', str(args.attack_rate),
+                              '--packets', '1', '--gap', '0.001'])
+                attacking = True
+
+            rows = monitor.sample()
+            usage = _usage(pid)
+            now = time.monotonic()
+            counts = rows['flow_count'].astype(np.int64)
+            sample = {
+                'time': round(now - start, 2),
+                'switches': len(rows),
+                'flows': int(counts.sum()),
+                'max_flows': int(counts.max()) if len(counts) else 0,
+                'full': int((counts >= args.flow_limit).sum())
+                if args.flow_limit else 0,
+                'cpu': 100 * (usage['cpu'] - last['cpu'])
+                / max(now - last_time, 1e-6),
+                'rss': usage['rss'],
+                'attacking': attacking,
+            }
+            series.append(sample)
+            last, last_time = usage, now
+            print('{time:6.1f} {switches:8} {flows:8} {max_flows:6} '
+                  '{full:6} {cpu:6.1f} {rss:8.1f}'.format(**sample),
+                  flush=True)
+
+            next_tick += args.interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+        for host in benign + attackers:
+            host.cmd('kill %python3')
+    finally:
+        api.close()
+        net.stop()
+        os.unlink(config.name)
+
+    switches = len(topo.switches())
+    full = [s['time'] for s in series if s['full']]
+    before = [s['cpu'] for s in series if not s['attacking']]
+    during = [s['cpu'] for s in series if s['attacking']]
+    return {
+        'topology': args.topology,
+        'switches': switches,
+        'hosts': len(topo.hosts()),
+        'discovered': max((s['switches'] for s in series), default=0),
+        'flow_limit': args.flow_limit,
+        'attack_rate': args.attack_rate,
+        'attackers': args.attackers,
+        'peak_flows': max((s['flows'] for s in series), default=0),
+        'peak_full': max((s['full'] for s in series), default=0),
+        'first_full': full[0] if full else None,
+        'cpu_before': float(np.mean(before)) if before else None,
+        'cpu_during': float(np.mean(during)) if during else None,
+        'peak_rss': max((s['rss'] for s in series), default=0.0),
+        'series': series,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('topology', choices=sorted(topology.TOPOLOGIES))
+    parser.add_argument('--switches', type=int, default=50,
+                        help='switches of a linear topology')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='levels below the root of a tree')
+    parser.add_argument('--fanout', type=int, default=4,
+                        help='children of each switch in a tree')
+    parser.add_argument('--k', type=int, default=6,
+                        help='ports per switch of a fat-tree (even)')
+    parser.add_argument('--benign', type=int, default=32,
+                        help='benign hosts')
+    parser.add_argument('--attackers', type=int, default=4,
+                        help='attacking hosts')
+    parser.add_argument('--servers', type=int, default=1,
+                        help='servers the traffic goes to')
+    parser.add_argument('--flow-limit', type=int, default=100,
+                        help="each switch's flow_limit (0 leaves it unset)")
+    parser.add_argument('--benign-flows', type=int, default=1000,
+                        help='flows each benign host replays')
+    parser.add_argument('--benign-rate', type=float, default=5.0,
+                        help='new flows per second per benign host')
+    parser.add_argument('--attack-rate', type=float, default=200.0,
+                        help='new flows per second per attacker')
+    parser.add_argument('--attack-start', type=float, default=20.0,
+                        help='seconds before the attackers start')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='seconds to measure for')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between samples')
+    parser.add_argument('--settle', type=float,
+                        help='seconds to wait after the switches connect '
+                             '(default: 35 for a fat-tree, for STP, '
+                             'otherwise 0)')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='OPTION=VALUE',
+                        help='a [simple_switch] controller option')
+    parser.add_argument('--output', help='time-series file of flow counts')
+    parser.add_argument('--json', help='file to save the summary to')
+    args = parser.parse_args()
+    if args.settle is None:
+        args.settle = 35.0 if args.topology == 'fattree' else 0.0
+
+    if os.geteuid() != 0:
+        sys.exit('Mininet needs root: sudo python3 {}'.format(sys.argv[0]))
+
+    setLogLevel('warning')
+    result = run(args)
+
+    summary = {key: value for key, value in result.items()
+               if key != 'series'}
+    for key, value in summary.items():
+        print('{:>12}: {}'.format(key, value))
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(result, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''A sequential test for "is RTT a slower than RTT b?".
+
+Every probe in probe.py compares pairs of RTTs: a probe that should
+miss the flow table (and go through the controller) against one that
+might hit it. SignSPRT is Wald's sequential probability ratio test on
+the sign of each pair. Under H0 (both hit, no difference) the first
+RTT is larger half of the time; under H1 (the first one missed) it is
+larger with probability p1. Pairs are added until the likelihood
+ratio crosses a bound set by the error budget (alpha, beta), so clear
+cases stop after a handful of pairs and noisy ones keep sampling, up
+to max_samples. A test that reaches max_samples without crossing
+either bound stays undecided: forcing it to the likelier side turns
+every noisy comparison into a coin flip, and about one in ten of the
+undecided ones under H0 would read as "slower". The caller decides
+what to do with those (probe.py runs a t-test on the same pairs).
+
+The sign test needs no assumption about the RTT distribution, which
+is heavy-tailed when the controller is busy. It does need p1 to be no
+higher than the true chance that a miss is slower: each pair moves the
+log-likelihood ratio by log(2 p1) or log(2 (1 - p1)), and when misses
+are slower only 70% of the time, p1 = 0.9 makes it drift towards "no
+difference". Noisy RTTs call for a lower p1, at the cost of more pairs.
+'''
+
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class SignSPRT:
+    '''Sequentially decides whether the first RTT of a pair is larger.'''
+
+    def __init__(
+            self,
+            alpha: float = 0.05,
+            beta: float = 0.05,
+            p1: float = 0.7,
+            max_samples: int = 30):
+        '''alpha is the chance of deciding "slower" when there is no
+        difference, beta the chance of missing a real difference, and
+        p1 how often a miss is slower than a hit under H1.
+        '''
+
+        if not 0 < alpha < 1 or not 0 < beta < 1:
+            raise ValueError('alpha and beta must be in (0, 1) '
+                             '(got: {}, {})'.format(alpha, beta))
+        if not 0.5 < p1 < 1:
+            raise ValueError('p1 must be in (0.5, 1) (got: {})'.format(p1))
+
+        self.max_samples = max_samples
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.step_slower = math.log(p1 / 0.5)
+        self.step_not_slower = math.log((1 - p1) / 0.5)
+
+        self.llr = 0.0
+        self.samples = 0
+        self.decision = None
+
+    def update(self, rtt_a: np.ndarray, rtt_b: np.ndarray) -> Optional[bool]:
+        '''Adds pairs of RTTs, in order. Lost probes (NaN) are skipped.
+
+        Returns True once the first RTTs are judged slower, False once
+        they are judged no different, and None while undecided,
+        including after max_samples pairs (see exhausted).
+        '''
+        for a, b in zip(np.atleast_1d(rtt_a), np.atleast_1d(rtt_b)):
+            if self.decision is not None or self.exhausted:
+                break
+            if not (np.isfinite(a) and np.isfinite(b)):
+                continue
+
+            self.samples += 1
+            self.llr += self.step_slower if a > b else self.step_not_slower
+            if self.llr >= self.upper:
+                self.decision = True
+            elif self.llr <= self.lower:
+                self.decision = False
+        return self.decision
+
+    @property
+    def exhausted(self) -> bool:
+        '''True once max_samples pairs were added without a decision.'''
+        return self.decision is None and self.samples >= self.max_samples
+
+    def confidence(self) -> float:
+        '''The posterior probability of the decision, from equal priors.'''
+        return 1 / (1 + math.exp(-abs(self.llr)))
@@ -13,14 +13,139 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+import os
+import struct
+import time
+
+from ryu import cfg
 from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
+from ryu.lib import addrconv
+from ryu.lib import hub
 from ryu.ofproto import ofproto_v1_4
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
+from ryu.lib.packet import lldp
+
+from flow_table import FlowTable, PendingInstalls
+from mac_table import MacTable
+from quarantine import PortQuarantine
+import timeout_policy
+
+# options are read from the [simple_switch] group of a file
+# passed to ryu-manager with --config-file
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.BoolOpt('fast-path', default=False,
+                help='decode only the Ethernet header on packet-in and '
+                     'reuse prebuilt actions and instructions'),
+    cfg.IntOpt('log-sample', default=0,
+               help='in fast-path mode, log one in every N packet-ins '
+                    'at INFO (0 logs at DEBUG only)'),
+    cfg.IntOpt('mac-table-size', default=4096,
+               help='maximum learned MAC addresses per datapath'),
+    cfg.FloatOpt('mac-age', default=300,
+                 help='seconds before an unrefreshed MAC entry is '
+                      'forgotten (0 never ages entries out)'),
+    cfg.FloatOpt('stats-interval', default=0,
+                 help='seconds between controller stats log lines '
+                      '(0 disables them)'),
+    cfg.IntOpt('flow-table-size', default=0,
+               help='track installed flows and evict them before this '
+                    'many are installed; should match the switch '
+                    'flow_limit minus the table-miss entry (0 disables '
+                    'tracking)'),
+    cfg.FloatOpt('flow-evict-watermark', default=0.9,
+                 help='fraction of flow-table-size at which the '
+                      'controller starts evicting flows'),
+    cfg.StrOpt('flow-evict-policy', default='lru',
+               choices=FlowTable.POLICIES,
+               help='which tracked flows to evict first'),
+    cfg.FloatOpt('flow-stats-interval', default=0,
+                 help='seconds between flow stats requests used to '
+                      'refresh flow activity (0 disables polling)'),
+    cfg.StrOpt('timeout-policy', default='fixed',
+               help='how new flows get their timeouts: fixed, adaptive '
+                    '(needs flow-table-size), or a module:Class '
+                    'TimeoutPolicy subclass'),
+    cfg.IntOpt('idle-timeout', default=10,
+               help='idle timeout of new flows (the maximum for '
+                    'adaptive)'),
+    cfg.IntOpt('hard-timeout', default=20,
+               help='hard timeout of new flows'),
+    cfg.IntOpt('adaptive-min-idle', default=1,
+               help='shortest idle timeout the adaptive policy uses'),
+    cfg.FloatOpt('adaptive-pressure', default=0.5,
+                 help='flow table occupancy above which the adaptive '
+                      'policy shortens idle timeouts'),
+    cfg.FloatOpt('adaptive-active-rate', default=1.0,
+                 help='packets per second above which the adaptive '
+                      'policy treats a flow as established'),
+    cfg.IntOpt('packet-in-meter-rate', default=0,
+               help='limit table misses sent to the controller to this '
+                    'many packets per second per ingress port, using '
+                    'OpenFlow meters (0 disables metering)'),
+    cfg.IntOpt('packet-in-meter-burst', default=0,
+               help='burst size in packets for the packet-in meters '
+                    '(0 uses the switch default)'),
+    cfg.ListOpt('packet-in-meter-groups', default=[],
+                help='ports that share one packet-in meter, as a list '
+                     'of port+port+... groups; other ports get a meter '
+                     'each'),
+    cfg.StrOpt('pipeline', default='single',
+               choices=('single', 'multi-table'),
+               help='single installs one (in_port, eth_src, eth_dst) flow '
+                    'per conversation in table 0; multi-table learns '
+                    '(in_port, eth_src) in table 0 and forwards on '
+                    'eth_dst in table 1'),
+    cfg.FloatOpt('coalesce-ttl', default=0,
+                 help='seconds during which more packet-ins for a flow '
+                      'that was just installed are only forwarded, not '
+                      'installed again (0 disables coalescing)'),
+    cfg.BoolOpt('coalesce-barrier', default=False,
+                help='follow each install with a barrier request and '
+                     'record how long the switch took to confirm it'),
+    cfg.IntOpt('packet-in-max-len', default=0,
+               help='bytes of a table-miss frame sent to the controller, '
+                    'with the rest buffered on the switch and forwarded '
+                    'by buffer_id (0 sends whole frames with '
+                    'OFPCML_NO_BUFFER)'),
+    cfg.IntOpt('quarantine-threshold', default=0,
+               help='quarantine an ingress port once it has installed more '
+                    'than this many flows within quarantine-window seconds '
+                    '(0 disables quarantine)'),
+    cfg.FloatOpt('quarantine-window', default=1.0,
+                 help='seconds over which flows per port are counted'),
+    cfg.IntOpt('quarantine-duration', default=30,
+               help='seconds a port stays quarantined'),
+    cfg.StrOpt('quarantine-action', default='drop',
+               choices=('drop', 'meter'),
+               help='drop all traffic from a quarantined port, or meter it '
+                    'to the controller, which forwards it without '
+                    'installing flows'),
+    cfg.IntOpt('quarantine-rate', default=10,
+               help='packets per second a quarantined port may send to the '
+                    'controller with quarantine-action = meter'),
+], group='simple_switch')
+
+# dst, src, ethertype
+ETH_HEADER = struct.Struct('!6s6sH')
+
+# tables used by the multi-table pipeline
+SRC_TABLE = 0
+DST_TABLE = 1
+
+# quarantine rules override every learned flow. Meter ids are split
+# by parity so the two kinds can never collide: packet-in meters are
+# odd and a quarantined port's meter is twice its port number
+QUARANTINE_PRIORITY = 100
+# link probes reach the controller even through a quarantine rule
+LINK_PROBE_PRIORITY = QUARANTINE_PRIORITY + 1
 
 
 class SimpleSwitch14(app_manager.RyuApp):
@@ -28,38 +153,677 @@ class SimpleSwitch14(app_manager.RyuApp):
 
     def __init__(self, *args, **kwargs):
         super(SimpleSwitch14, self).__init__(*args, **kwargs)
+        # dpid -> MacTable
         self.mac_to_port = {}
 
+        conf = self.CONF.simple_switch
+        self.fast_path = conf.fast_path
+        self.log_sample = conf.log_sample
+        self.mac_table_size = conf.mac_table_size
+        self.mac_age = conf.mac_age
+        self.stats_interval = conf.stats_interval
+        self.flow_table_size = conf.flow_table_size
+        self.flow_evict_watermark = conf.flow_evict_watermark
+        self.flow_evict_policy = conf.flow_evict_policy
+        self.flow_stats_interval = conf.flow_stats_interval
+        self.timeout_policy = timeout_policy.make_policy(
+            conf.timeout_policy, conf)
+        if self.timeout_policy.uses_occupancy and self.flow_table_size <= 0:
+            # occupancy would always be 0, so it would act like fixed
+            raise ValueError('timeout_policy {} needs flow_table_size '
+                             '(got: {})'.format(conf.timeout_policy,
+                                                self.flow_table_size))
+        self.meter_rate = conf.packet_in_meter_rate
+        self.meter_burst = conf.packet_in_meter_burst
+        self.multi_table = conf.pipeline == 'multi-table'
+        self.coalesce_barrier = conf.coalesce_barrier
+        self.packet_in_max_len = conf.packet_in_max_len
+        # dpids that sent truncated frames without buffering them
+        self.unbuffered = set()
+        self.truncated_packet_ins = 0
+        # (dpid, in_port, src, dst) of recent installs, when coalescing
+        self.pending = None
+        if conf.coalesce_ttl > 0:
+            self.pending = PendingInstalls(conf.coalesce_ttl)
+        self.meter_groups = [
+            frozenset(int(port) for port in group.split('+'))
+            for group in conf.packet_in_meter_groups]
+        self.packet_in_count = 0
+        self.table_full_errors = 0
+
+        # (dpid, in_port) of ports that flood new flows, when enabled
+        self.quarantine = None
+        if conf.quarantine_threshold > 0:
+            self.quarantine = PortQuarantine(conf.quarantine_threshold,
+                                             conf.quarantine_window,
+                                             conf.quarantine_duration)
+        self.quarantine_action = conf.quarantine_action
+        self.quarantine_rate = conf.quarantine_rate
+        # dpid -> quarantine meter ids added to the switch
+        self.quarantine_meters = {}
+        # (dpid, port) of links to other switches, found by sending LLDP
+        # probes out of every port; they carry everyone's new sources,
+        # so they are never quarantined
+        self.trunk_ports = set()
+        # (dpid, port) -> its random probe token, and back
+        self.probe_tokens = {}
+        self.probe_origins = {}
+        # dpid -> port numbers, when probing
+        self.ports = {}
+
+        # dpid -> Datapath, for switches that are connected
+        self.datapaths = {}
+        # dpid -> FlowTable, when flow tracking is on
+        self.flow_tables = {}
+        # dpid -> meter_id -> ports, and the last meter stats received
+        self.meters = {}
+        self.meter_stats = {}
+        # (dpid, xid) -> time sent, for barriers after installs
+        self.barriers = {}
+
+        # (dpid, port) -> (actions, instructions), only used in fast path
+        self._output_cache = {}
+
+        if self.stats_interval > 0:
+            self.stats_thread = hub.spawn(self._log_stats)
+        if self.flow_table_size > 0 and self.flow_stats_interval > 0:
+            self.flow_stats_thread = hub.spawn(self._poll_flow_stats)
+
+    def _mac_table(self, dpid):
+        table = self.mac_to_port.get(dpid)
+        if table is None:
+            table = MacTable(self.mac_table_size, self.mac_age)
+            self.mac_to_port[dpid] = table
+        return table
+
+    def _flow_table(self, dpid):
+        '''Returns the datapath's flow model, or None if tracking is off.'''
+        if self.flow_table_size <= 0:
+            return None
+        flows = self.flow_tables.get(dpid)
+        if flows is None:
+            flows = FlowTable(self.flow_table_size,
+                              self.flow_evict_watermark,
+                              self.flow_evict_policy)
+            self.flow_tables[dpid] = flows
+        return flows
+
+    def stats(self):
+        '''Returns controller-side counters, keyed by dpid.'''
+        return {
+            'packet_in': self.packet_in_count,
+            'table_full_errors': self.table_full_errors,
+            'mac_table': {dpid: table.stats()
+                          for dpid, table in self.mac_to_port.items()},
+            'flow_table': {dpid: flows.stats()
+                           for dpid, flows in self.flow_tables.items()},
+            'meters': {dpid: {meter_id: dict(
+                                  ports=sorted(ports),
+                                  **self.meter_stats.get(dpid, {})
+                                  .get(meter_id, {}))
+                              for meter_id, ports in meters.items()}
+                       for dpid, meters in self.meters.items()},
+            'pending': self.pending.stats() if self.pending else {},
+            'truncated_packet_in': self.truncated_packet_ins,
+            'quarantine': self.quarantine.stats() if self.quarantine else {},
+            'trunk_ports': sorted(self.trunk_ports),
+        }
+
+    def _log_stats(self):
+        while True:
+            hub.sleep(self.stats_interval)
+            if self.meter_rate > 0:
+                for datapath in list(self.datapaths.values()):
+                    parser = datapath.ofproto_parser
+                    datapath.send_msg(parser.OFPMeterStatsRequest(datapath))
+            self.logger.info("stats %s", self.stats())
+
+    def _poll_flow_stats(self):
+        while True:
+            for datapath in list(self.datapaths.values()):
+                parser = datapath.ofproto_parser
+                datapath.send_msg(parser.OFPFlowStatsRequest(datapath))
+            hub.sleep(self.flow_stats_interval)
+
+    @set_ev_cls(ofp_event.EventOFPStateChange,
+                [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def _state_change_handler(self, ev):
+        datapath = ev.datapath
+        if ev.state == MAIN_DISPATCHER:
+            self.datapaths[datapath.id] = datapath
+        elif ev.state == DEAD_DISPATCHER:
+            self.datapaths.pop(datapath.id, None)
+            self.forget_datapath(datapath.id)
+
+    def forget_datapath(self, dpid):
+        '''Drops the per-switch state of a disconnected datapath.'''
+        # the switch forgets its flows when the connection drops
+        self.flow_tables.pop(dpid, None)
+        self.meters.pop(dpid, None)
+        self.meter_stats.pop(dpid, None)
+        self.unbuffered.discard(dpid)
+        self.quarantine_meters.pop(dpid, None)
+        if self.quarantine is not None:
+            self.quarantine.forget(lambda port: port[0] == dpid)
+        self.ports.pop(dpid, None)
+        # the far ends stay trunks: they still face this switch
+        self.trunk_ports = {port for port in self.trunk_ports
+                            if port[0] != dpid}
+        self.barriers = {key: sent for key, sent in self.barriers.items()
+                         if key[0] != dpid}
+
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        # install table-miss flow entry
-        #
-        # We specify NO BUFFER to max_len of the output action due to
-        # OVS bug. At this moment, if we specify a lesser number, e.g.,
-        # 128, OVS will send Packet-In with invalid buffer_id and
-        # truncated packet data. In that case, we cannot output packets
-        # correctly.  The bug has been fixed in OVS v2.1.0.
-        match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
-
-    def add_flow(self, datapath, priority, match, actions, **kwargs):
+        if self.multi_table:
+            # unknown destinations are flooded by the switch itself
+            flood = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+            self.add_flow(datapath, 0, parser.OFPMatch(), flood,
+                          table_id=DST_TABLE)
+
+        if self.quarantine is not None:
+            # the ports are probed once they are known
+            match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_LLDP)
+            actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
+                                              ofproto.OFPCML_NO_BUFFER)]
+            self.add_flow(datapath, LINK_PROBE_PRIORITY, match, actions)
+
+        if self.meter_rate <= 0:
+            # install table-miss flow entry
+            match = parser.OFPMatch()
+            self.add_flow(datapath, 0, match, self._miss_actions(datapath))
+        else:
+            # with metering, each port gets its own table-miss entry
+            # once the port is known; start from a clean meter table
+            self.meters[datapath.id] = {}
+            datapath.send_msg(parser.OFPMeterMod(
+                datapath, command=ofproto.OFPMC_DELETE,
+                meter_id=ofproto.OFPM_ALL))
+
+        if self.meter_rate > 0 or self.quarantine is not None:
+            datapath.send_msg(parser.OFPPortDescStatsRequest(datapath, 0))
+
+    def _miss_actions(self, datapath):
+        '''Returns the table-miss actions that send frames to the controller.
+
+        By default we specify NO BUFFER to max_len of the output action
+        due to OVS bug. If we specify a lesser number, e.g., 128, OVS
+        before v2.1.0 sends Packet-In with invalid buffer_id and
+        truncated packet data, and we cannot output packets correctly.
+        With packet-in-max-len set, only the first max_len bytes are
+        sent and the switch buffers the frame; a switch that turns out
+        not to buffer is put back on NO BUFFER (see _packet_in_handler).
+        '''
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+        max_len = ofproto.OFPCML_NO_BUFFER
+        if self.packet_in_max_len > 0 and datapath.id not in self.unbuffered:
+            max_len = self.packet_in_max_len
+        return [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, max_len)]
+
+    def _stop_buffering(self, datapath):
+        '''Reinstalls the datapath's table-miss entries with NO BUFFER.'''
+        self.unbuffered.add(datapath.id)
+        self.logger.warning("switch %s truncates packet-ins without "
+                            "buffering them; sending whole frames instead",
+                            datapath.id)
+
+        if self.meter_rate <= 0:
+            self.add_flow(datapath, 0, datapath.ofproto_parser.OFPMatch(),
+                          self._miss_actions(datapath))
+            return
+        for ports in list(self.meters.get(datapath.id, {}).values()):
+            for port_no in list(ports):
+                self._add_metered_miss(datapath, port_no)
+
+    def _meter_id(self, port_no):
+        '''Returns the packet-in meter a port belongs to.
+
+        Port groups take ids 1, 3, ..., and a port outside every group
+        gets a meter of its own after those; all of them are odd.
+        '''
+        for index, group in enumerate(self.meter_groups):
+            if port_no in group:
+                return 2 * index + 1
+        return 2 * (len(self.meter_groups) + port_no) - 1
+
+    @staticmethod
+    def _quarantine_meter_id(port_no):
+        '''Returns the meter of a quarantined port, an even id.'''
+        return 2 * port_no
+
+    def _add_metered_miss(self, datapath, port_no):
+        '''Sends a port's table misses to the controller through a meter.'''
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if port_no > ofproto.OFPP_MAX:
+            return
+
+        meters = self.meters.setdefault(datapath.id, {})
+        meter_id = self._meter_id(port_no)
+        if meter_id not in meters:
+            flags = ofproto.OFPMF_PKTPS | ofproto.OFPMF_STATS
+            if self.meter_burst > 0:
+                flags |= ofproto.OFPMF_BURST
+            bands = [parser.OFPMeterBandDrop(rate=self.meter_rate,
+                                             burst_size=self.meter_burst)]
+            datapath.send_msg(parser.OFPMeterMod(
+                datapath, command=ofproto.OFPMC_ADD, flags=flags,
+                meter_id=meter_id, bands=bands))
+            meters[meter_id] = set()
+        meters[meter_id].add(port_no)
+
+        actions = self._miss_actions(datapath)
+        inst = [parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER),
+                parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
                                              actions)]
+        match = parser.OFPMatch(in_port=port_no)
+        self.add_flow(datapath, 0, match, actions, inst=inst)
+
+    @set_ev_cls(ofp_event.EventOFPPortDescStatsReply,
+                [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _port_desc_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        if self.meter_rate > 0:
+            for port in ev.msg.body:
+                self._add_metered_miss(datapath, port.port_no)
+        if self.quarantine is not None:
+            self.ports[datapath.id] = {
+                port.port_no for port in ev.msg.body
+                if port.port_no <= datapath.ofproto.OFPP_MAX}
+            # the switches connected earlier couldn't reach this one
+            datapaths = dict(self.datapaths)
+            datapaths[datapath.id] = datapath
+            for other in datapaths.values():
+                self._probe_links(other)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def _port_status_handler(self, ev):
+        msg = ev.msg
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        port_no = msg.desc.port_no
+        if self.quarantine is not None and port_no <= ofproto.OFPP_MAX:
+            if msg.reason == ofproto.OFPPR_ADD:
+                self.ports.setdefault(datapath.id, set()).add(port_no)
+                self._probe_links(datapath, [port_no])
+            elif msg.reason == ofproto.OFPPR_DELETE:
+                self.ports.get(datapath.id, set()).discard(port_no)
+                self.trunk_ports.discard((datapath.id, port_no))
+
+        if self.meter_rate <= 0:
+            return
+        if msg.reason == ofproto.OFPPR_ADD:
+            self._add_metered_miss(datapath, port_no)
+        elif msg.reason == ofproto.OFPPR_DELETE:
+            match = datapath.ofproto_parser.OFPMatch(in_port=port_no)
+            self.delete_flow(datapath, 0, match)
+            meters = self.meters.get(datapath.id, {})
+            meters.get(self._meter_id(port_no), set()).discard(port_no)
+
+    @set_ev_cls(ofp_event.EventOFPMeterStatsReply, MAIN_DISPATCHER)
+    def _meter_stats_reply_handler(self, ev):
+        stats = self.meter_stats.setdefault(ev.msg.datapath.id, {})
+        for stat in ev.msg.body:
+            stats[stat.meter_id] = {
+                'packets': stat.packet_in_count,
+                'bytes': stat.byte_in_count,
+                'dropped': sum(band.packet_band_count
+                               for band in stat.band_stats),
+            }
+
+    def add_flow(self, datapath, priority, match, actions, inst=None,
+                 **kwargs):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        if inst is None:
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                 actions)]
 
         mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
                                 match=match, instructions=inst,
                                 **kwargs)
         datapath.send_msg(mod)
 
+    def _output(self, datapath, port):
+        '''Returns the output actions and instructions for a port.
+
+        In fast-path mode these are built once per (dpid, port) and
+        shared by every FlowMod and PacketOut to that port afterwards.
+        '''
+        key = (datapath.id, port)
+        if self.fast_path and key in self._output_cache:
+            return self._output_cache[key]
+
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        actions = [parser.OFPActionOutput(port)]
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                             actions)]
+        if self.fast_path:
+            self._output_cache[key] = (actions, inst)
+        return actions, inst
+
+    def delete_flow(self, datapath, priority, match, table_id=0):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id,
+                                priority=priority, match=match,
+                                command=ofproto.OFPFC_DELETE_STRICT,
+                                out_port=ofproto.OFPP_ANY,
+                                out_group=ofproto.OFPG_ANY)
+        datapath.send_msg(mod)
+
+    @staticmethod
+    def _flow_key(match):
+        '''Returns the (in_port, src, dst) key of a table 0 flow.
+
+        dst is None for the source entries of the multi-table pipeline.
+        Flows without in_port and eth_src aren't tracked.
+        '''
+        in_port = match.get('in_port')
+        src = match.get('eth_src')
+        if in_port is None or src is None:
+            return None
+
+        dst = match.get('eth_dst')
+        return (in_port,
+                int(src.replace(':', ''), 16),
+                None if dst is None else int(dst.replace(':', ''), 16))
+
+    def _key_match(self, parser, key):
+        '''Returns the OFPMatch a _flow_key came from.'''
+        in_port, src, dst = key
+        src = src.to_bytes(6, 'big')
+        if dst is None:
+            return self._source_match(parser, in_port, src)
+        return self._exact_match(parser, in_port, src, dst.to_bytes(6, 'big'))
+
+    def _evict_flows(self, datapath, flows):
+        '''Deletes the flows the model wants gone to make room.
+
+        An evicted source entry takes its table 1 forwarding flow with
+        it, so that table doesn't keep growing while table 0 is capped.
+        '''
+        parser = datapath.ofproto_parser
+        for key in flows.evict():
+            self.delete_flow(datapath, 1, self._key_match(parser, key))
+            in_port, src, dst = key
+            if dst is None:
+                match = parser.OFPMatch(
+                    eth_dst=src.to_bytes(6, 'big').hex(':'))
+                self.delete_flow(datapath, 1, match, table_id=DST_TABLE)
+
+    def _track_flow(self, datapath, key):
+        '''Makes room for a table 0 flow and picks its timeouts.
+
+        Returns (idle_timeout, hard_timeout, flags) for the FlowMod.
+        '''
+        flags = 0
+        occupancy = rate = 0.0
+        flows = self._flow_table(datapath.id)
+        if flows is not None:
+            if key not in flows:
+                self._evict_flows(datapath, flows)
+            occupancy = flows.occupancy()
+            rate = flows.rate(key)
+            flows.add(key)
+            flags = datapath.ofproto.OFPFF_SEND_FLOW_REM
+
+        idle_timeout, hard_timeout = self.timeout_policy.timeouts(
+            occupancy, rate)
+        return idle_timeout, hard_timeout, flags
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        flows = self.flow_tables.get(msg.datapath.id)
+        key = self._flow_key(msg.match)
+        if flows is None or key is None:
+            return
+
+        reasons = {
+            ofproto.OFPRR_IDLE_TIMEOUT: 'idle_timeout',
+            ofproto.OFPRR_HARD_TIMEOUT: 'hard_timeout',
+            ofproto.OFPRR_DELETE: 'delete',
+            ofproto.OFPRR_EVICTION: 'switch_eviction',
+        }
+        duration = msg.duration_sec + msg.duration_nsec / 1e9
+        flows.remove(key, reasons.get(msg.reason, 'other'),
+                     msg.packet_count / max(duration, 1e-3))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def _flow_stats_reply_handler(self, ev):
+        flows = self.flow_tables.get(ev.msg.datapath.id)
+        if flows is None:
+            return
+
+        for stat in ev.msg.body:
+            key = self._flow_key(stat.match)
+            if key is not None:
+                flows.touch(key, stat.packet_count)
+
+    def _claim_install(self, datapath, key):
+        '''Returns False if the same flow was installed moments ago.'''
+        if self.pending is None:
+            return True
+        return self.pending.claim((datapath.id,) + key)
+
+    def _send_barrier(self, datapath):
+        parser = datapath.ofproto_parser
+        barrier = parser.OFPBarrierRequest(datapath)
+        xid = datapath.set_xid(barrier)
+        self.barriers[(datapath.id, xid)] = time.monotonic()
+        datapath.send_msg(barrier)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def _barrier_reply_handler(self, ev):
+        msg = ev.msg
+        sent = self.barriers.pop((msg.datapath.id, msg.xid), None)
+        if sent is not None and self.pending is not None:
+            self.pending.confirm(sent)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def _error_msg_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        if (msg.type == ofproto.OFPET_FLOW_MOD_FAILED
+                and msg.code == ofproto.OFPFMFC_TABLE_FULL):
+            # the model was out of step with the switch
+            self.table_full_errors += 1
+            self.logger.debug("flow table full on %s", msg.datapath.id)
+
+    def _exact_match(self, parser, in_port, src, dst):
+        '''Returns the OFPMatch for one (in_port, src, dst) flow.
+
+        The fast path hands OFPMatch its fields already normalized and
+        in OXM order, which skips re-parsing the MAC strings.
+        '''
+        dst = dst.hex(':')
+        src = src.hex(':')
+        if self.fast_path:
+            return parser.OFPMatch(_ordered_fields=[
+                ('in_port', in_port), ('eth_dst', dst), ('eth_src', src)])
+        return parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
+
+    def _source_match(self, parser, in_port, src):
+        '''Returns the OFPMatch for a learned (in_port, src) pair.'''
+        src = src.hex(':')
+        if self.fast_path:
+            return parser.OFPMatch(_ordered_fields=[
+                ('in_port', in_port), ('eth_src', src)])
+        return parser.OFPMatch(in_port=in_port, eth_src=src)
+
+    def _destination_match(self, parser, dst):
+        '''Returns the table 1 OFPMatch for traffic to a learned host.'''
+        dst = dst.hex(':')
+        if self.fast_path:
+            return parser.OFPMatch(_ordered_fields=[('eth_dst', dst)])
+        return parser.OFPMatch(eth_dst=dst)
+
+    def _install_multi_table(self, datapath, in_port, src, src_mac):
+        '''Installs the flows for a newly learned source.
+
+        Table 0 lets the source through to table 1 from this port, and
+        table 1 forwards traffic addressed to it out of this port. The
+        switch then needs one flow per host in each table rather than
+        one per conversation.
+        '''
+        parser = datapath.ofproto_parser
+        idle_timeout, hard_timeout, flags = self._track_flow(
+            datapath, (in_port, src_mac, None))
+
+        match = self._source_match(parser, in_port, src)
+        inst = [parser.OFPInstructionGotoTable(DST_TABLE)]
+        self.add_flow(datapath, 1, match, None, inst=inst,
+                      table_id=SRC_TABLE, idle_timeout=idle_timeout,
+                      hard_timeout=hard_timeout, flags=flags)
+
+        actions, inst = self._output(datapath, in_port)
+        match = self._destination_match(parser, src)
+        self.add_flow(datapath, 1, match, actions, inst=inst,
+                      table_id=DST_TABLE, idle_timeout=idle_timeout,
+                      hard_timeout=hard_timeout)
+
+    def _probe_links(self, datapath, ports=None):
+        '''Sends an LLDP probe out of each port (default: all known).
+
+        Each (dpid, port) has its own random token in the probe's
+        chassis id. A host only ever sees its own port's token, and a
+        probe that comes back to the switch it left is ignored, so a
+        host can't pass its port off as a link to another switch.
+        '''
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        if ports is None:
+            ports = self.ports.get(datapath.id, ())
+        for port_no in sorted(ports):
+            origin = (datapath.id, port_no)
+            token = self.probe_tokens.get(origin)
+            if token is None:
+                token = self.probe_tokens[origin] = os.urandom(8)
+                self.probe_origins[token] = origin
+
+            pkt = packet.Packet()
+            pkt.add_protocol(ethernet.ethernet(
+                dst=lldp.LLDP_MAC_NEAREST_BRIDGE,
+                src='02:00:00:00:00:00',
+                ethertype=ether_types.ETH_TYPE_LLDP))
+            pkt.add_protocol(lldp.lldp([
+                lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED,
+                               chassis_id=token),
+                lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT,
+                            port_id=str(port_no).encode()),
+                lldp.TTL(ttl=120),
+                lldp.End(),
+            ]))
+            pkt.serialize()
+            datapath.send_msg(parser.OFPPacketOut(
+                datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                in_port=ofproto.OFPP_CONTROLLER,
+                actions=[parser.OFPActionOutput(port_no)], data=pkt.data))
+
+    def _link_probe_in(self, datapath, in_port, data):
+        '''Marks both ends of the link a probe came over as trunks.'''
+        probe = packet.Packet(data).get_protocol(lldp.lldp)
+        if probe is None or not probe.tlvs:
+            return
+        token = getattr(probe.tlvs[0], 'chassis_id', None)
+        origin = self.probe_origins.get(token)
+        if origin is None or origin[0] == datapath.id:
+            return
+        for port in (origin, (datapath.id, in_port)):
+            if port not in self.trunk_ports:
+                self.logger.info("port %s of switch %s links to another "
+                                 "switch; it won't be quarantined",
+                                 port[1], port[0])
+                self.trunk_ports.add(port)
+
+    def _count_install(self, datapath, in_port):
+        '''Counts a flow installed for a port, quarantining it if needed.
+
+        Links to other switches aren't counted: they carry the new
+        sources of every host behind them.
+        '''
+        port = (datapath.id, in_port)
+        if (self.quarantine is not None and port not in self.trunk_ports
+                and self.quarantine.record(port)):
+            self._quarantine_port(datapath, in_port)
+
+    def _quarantine_port(self, datapath, in_port):
+        '''Covers a port with one rule instead of a flow per source.
+
+        The rule has a higher priority than the learned flows, so those
+        stop matching and idle out, and it expires by itself after
+        quarantine-duration. With the meter action, the port's frames
+        still reach the controller, at quarantine-rate at most.
+        '''
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.logger.warning("quarantining port %s of switch %s for %ss",
+                            in_port, datapath.id,
+                            self.quarantine.duration)
+
+        inst = []
+        if self.quarantine_action == 'meter':
+            meter_id = self._quarantine_meter_id(in_port)
+            meters = self.quarantine_meters.setdefault(datapath.id, set())
+            command = ofproto.OFPMC_MODIFY if meter_id in meters \
+                else ofproto.OFPMC_ADD
+            bands = [parser.OFPMeterBandDrop(rate=self.quarantine_rate)]
+            datapath.send_msg(parser.OFPMeterMod(
+                datapath, command=command, flags=ofproto.OFPMF_PKTPS,
+                meter_id=meter_id, bands=bands))
+            meters.add(meter_id)
+
+            inst = [parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER),
+                    parser.OFPInstructionActions(
+                        ofproto.OFPIT_APPLY_ACTIONS,
+                        self._miss_actions(datapath))]
+
+        self.add_flow(datapath, QUARANTINE_PRIORITY,
+                      parser.OFPMatch(in_port=in_port), None, inst=inst,
+                      table_id=SRC_TABLE,
+                      hard_timeout=self.quarantine.duration)
+
+    def _parse_eth(self, data):
+        '''Returns (dst, src, ethertype) of a frame, or None if truncated.
+
+        The addresses are returned as 6-byte strings. The fast path
+        unpacks the 14-byte header directly instead of decoding every
+        protocol layer with ryu.lib.packet.
+        '''
+        if self.fast_path:
+            if len(data) < ETH_HEADER.size:
+                return None
+            return ETH_HEADER.unpack_from(data)
+
+        pkt = packet.Packet(data)
+        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        return (addrconv.mac.text_to_bin(eth.dst),
+                addrconv.mac.text_to_bin(eth.src),
+                eth.ethertype)
+
+    def _log_packet_in(self, dpid, src, dst, in_port):
+        self.packet_in_count += 1
+        if not self.fast_path:
+            self.logger.info("packet in %s %s %s %s",
+                             dpid, src.hex(':'), dst.hex(':'), in_port)
+        elif self.log_sample and self.packet_in_count % self.log_sample == 0:
+            self.logger.info("packet in %s %s %s %s (%d total)",
+                             dpid, src.hex(':'), dst.hex(':'), in_port,
+                             self.packet_in_count)
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("packet in %s %s %s %s",
+                              dpid, src.hex(':'), dst.hex(':'), in_port)
+
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
         msg = ev.msg
@@ -68,36 +832,77 @@ class SimpleSwitch14(app_manager.RyuApp):
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        eth = self._parse_eth(msg.data)
+        if eth is None:
+            return
+        dst, src, ethertype = eth
 
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
-            # ignore lldp packet
+        if ethertype == ether_types.ETH_TYPE_LLDP:
+            # never learned from; our own probes find the links
+            if self.quarantine is not None:
+                self._link_probe_in(datapath, in_port, msg.data)
             return
-        dst = eth.dst
-        src = eth.src
+
+        # a truncated frame that wasn't buffered can't be forwarded,
+        # but it is still good for learning and installing the flow
+        truncated = (msg.buffer_id == ofproto.OFP_NO_BUFFER
+                     and len(msg.data) < msg.total_len)
+        if truncated:
+            self.truncated_packet_ins += 1
+            if datapath.id not in self.unbuffered:
+                self._stop_buffering(datapath)
 
         dpid = datapath.id
-        self.mac_to_port.setdefault(dpid, {})
+        mac_table = self._mac_table(dpid)
 
-        self.logger.info("packet in %s %s %s %s", dpid, src, dst, in_port)
+        self._log_packet_in(dpid, src, dst, in_port)
+
+        # a quarantined port's frames are forwarded (with the meter
+        # action) but never learned from or installed
+        quarantined = (self.quarantine is not None
+                       and self.quarantine.suppress((dpid, in_port)))
+        if quarantined and self.quarantine_action == 'drop':
+            return
 
         # learn a mac address to avoid FLOOD next time.
-        self.mac_to_port[dpid][src] = in_port
+        src_mac = int.from_bytes(src, 'big')
+        dst_mac = int.from_bytes(dst, 'big')
+        if not quarantined:
+            mac_table.learn(src_mac, in_port)
 
-        if dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][dst]
-        else:
+        out_port = mac_table.get(dst_mac)
+        if out_port is None:
             out_port = ofproto.OFPP_FLOOD
 
-        actions = [parser.OFPActionOutput(out_port)]
+        actions, inst = self._output(datapath, out_port)
 
         # install a flow to avoid packet_in next time
         # this is where we can set the idle and hard timeouts
-        if out_port != ofproto.OFPP_FLOOD:
-            match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
-            self.add_flow(datapath, 1, match, actions,
-                          idle_timeout=10, hard_timeout=20)
+        if quarantined:
+            key = None
+        elif self.multi_table:
+            key = (in_port, src_mac, None)
+        elif out_port != ofproto.OFPP_FLOOD:
+            key = (in_port, src_mac, dst_mac)
+        else:
+            key = None
+
+        if key is not None and self._claim_install(datapath, key):
+            if self.multi_table:
+                self._install_multi_table(datapath, in_port, src, src_mac)
+            else:
+                idle_timeout, hard_timeout, flags = self._track_flow(
+                    datapath, key)
+                match = self._exact_match(parser, in_port, src, dst)
+                self.add_flow(datapath, 1, match, actions, inst=inst,
+                              idle_timeout=idle_timeout,
+                              hard_timeout=hard_timeout, flags=flags)
+            if self.coalesce_barrier:
+                self._send_barrier(datapath)
+            self._count_install(datapath, in_port)
+
+        if truncated:
+            return
 
         data = None
         if msg.buffer_id == ofproto.OFP_NO_BUFFER:
@@ -106,3 +911,4 @@ class SimpleSwitch14(app_manager.RyuApp):
         out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
                                   in_port=in_port, actions=actions, data=data)
         datapath.send_msg(out)
+
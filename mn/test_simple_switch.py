@@ -0,0 +1,165 @@
+'''Tests of SimpleSwitch14 against emulated switches.
+
+The switches are bench_pipeline.EmulatedSwitch objects, driven in
+process, so no Mininet or OVS is needed.
+
+usage: python3 -m unittest test_simple_switch (from this directory)
+'''
+
+import unittest
+
+# sets up sys.path so the ryu package isn't shadowed by ryu.py
+from bench_packet_in import make_events, make_frame
+from bench_pipeline import EmulatedSwitch
+
+from ryu import cfg
+from ryu.controller import ofp_event
+from ryu.ofproto import ofproto_v1_4, ofproto_v1_4_parser as parser
+
+import simple_switch_14
+
+cfg.CONF(args=[], project='ryu')
+
+
+class SwitchTest(unittest.TestCase):
+    '''Starts each test from the default [simple_switch] options.'''
+
+    options = {}
+
+    def setUp(self):
+        for name, value in self.options.items():
+            cfg.CONF.set_override(name, value, group='simple_switch')
+        self.app = simple_switch_14.SimpleSwitch14()
+
+    def tearDown(self):
+        for name in self.options:
+            cfg.CONF.clear_override(name, group='simple_switch')
+
+    def connect(self, dpid: int, ports, links=None) -> EmulatedSwitch:
+        '''Connects an emulated switch with the given port numbers.
+
+        links maps some of the ports to (switch, port) of switches
+        already connected.
+        '''
+        switch = EmulatedSwitch(dpid, self.app)
+        switch.ports.update(ports)
+        for port, (other, other_port) in (links or {}).items():
+            switch.link(port, other, other_port)
+        features = parser.OFPSwitchFeatures(switch)
+        features.datapath = switch
+        self.app.switch_features_handler(
+            ofp_event.EventOFPSwitchFeatures(features))
+
+        reply = parser.OFPPortDescStatsReply(switch, body=[
+            parser.OFPPort(port_no=port, hw_addr='00:00:00:00:00:00',
+                           name='port{}'.format(port).encode(), config=0,
+                           state=0, properties=[])
+            for port in ports])
+        self.app._port_desc_reply_handler(
+            ofp_event.EventOFPPortDescStatsReply(reply))
+        return switch
+
+
+def miss_max_lens(switch: EmulatedSwitch):
+    '''Returns in_port -> max_len of each per-port table-miss entry.'''
+    max_lens = {}
+    for (in_port,), (_, inst) in switch.tables[0].get(('in_port',),
+                                                      {}).items():
+        for i in inst:
+            if isinstance(i, parser.OFPInstructionActions):
+                max_lens[in_port] = i.actions[0].max_len
+    return max_lens
+
+
+class StopBufferingTest(SwitchTest):
+    '''A switch that truncates without buffering, with metered misses.'''
+
+    options = {'packet_in_meter_rate': 10, 'packet_in_max_len': 128}
+
+    def test_metered_misses_go_back_to_whole_frames(self):
+        switch = self.connect(4, [1, 2, 3])
+        self.assertEqual(miss_max_lens(switch), {1: 128, 2: 128, 3: 128})
+
+        # a cut-down frame without a buffer id, as OVS sends
+        frame = make_frame('02:00:00:00:00:01', '00:00:00:00:00:02', 200)
+        ev = make_events(switch, [(1, frame)])[0]
+        ev.msg.data = frame[:128]
+        self.app._packet_in_handler(ev)
+
+        self.assertIn(4, self.app.unbuffered)
+        no_buffer = ofproto_v1_4.OFPCML_NO_BUFFER
+        self.assertEqual(miss_max_lens(switch),
+                         {1: no_buffer, 2: no_buffer, 3: no_buffer})
+
+
+class Host:
+    '''The far end of a link that keeps the frames it receives.'''
+
+    def __init__(self):
+        self.links = {}
+        self.frames = []
+
+    def receive(self, in_port: int, frame: bytes):
+        self.frames.append(frame)
+
+
+class QuarantineTest(SwitchTest):
+    '''Two switches, s4 with hosts ch and ah, s5 with host sh.'''
+
+    options = {'quarantine_threshold': 5, 'quarantine_window': 10.0}
+
+    def setUp(self):
+        super().setUp()
+        # s4: 1 ch, 2 ah, 3 uplink; s5: 1 uplink, 2 sh
+        self.s4 = self.connect(4, [1, 2, 3])
+        self.s5 = self.connect(5, [1, 2], links={1: (self.s4, 3)})
+
+    def test_links_are_found(self):
+        self.assertEqual(self.app.trunk_ports, {(4, 3), (5, 1)})
+
+    def test_only_the_flooding_edge_port_is_quarantined(self):
+        # sh announces itself, so both switches install flows towards it
+        self.s5.receive(2, make_frame('00:00:00:00:00:03',
+                                      'ff:ff:ff:ff:ff:ff'))
+        for i in range(20):
+            self.s4.receive(2, make_frame('02:00:00:00:{:02x}:{:02x}'
+                                          .format(i // 256, i % 256),
+                                          '00:00:00:00:00:03'))
+
+        quarantine = self.app.quarantine
+        self.assertTrue(quarantine.active((4, 2)))
+        self.assertFalse(quarantine.active((5, 1)))
+        self.assertFalse(quarantine.active((4, 3)))
+
+        # ch still reaches sh through s5's uplink
+        packet_ins = self.s5.packet_ins
+        self.s4.receive(1, make_frame('00:00:00:00:00:01',
+                                      '00:00:00:00:00:03'))
+        self.assertEqual(self.s5.packet_ins, packet_ins + 1)
+        self.assertEqual(self.app._mac_table(5).get(0x000000000001), 1)
+
+    def test_replayed_probes_are_ignored(self):
+        # ah sends the probe it got back into its own port
+        host = Host()
+        self.s4.link(2, host, 1)
+        self.app._probe_links(self.s4, [2])
+        self.s4.receive(2, host.frames[-1])
+        self.assertNotIn((4, 2), self.app.trunk_ports)
+
+
+class MeterIdTest(unittest.TestCase):
+    '''Packet-in and quarantine meters never share an id.'''
+
+    def test_id_spaces_are_disjoint(self):
+        app = simple_switch_14.SimpleSwitch14.__new__(
+            simple_switch_14.SimpleSwitch14)
+        ports = list(range(1, 200)) + [1000, 0xfeff]
+        for groups in ([], [[1, 2]], [[3, 4], [5, 6], [7]]):
+            app.meter_groups = groups
+            packet_in = {app._meter_id(port) for port in ports}
+            quarantine = {app._quarantine_meter_id(port) for port in ports}
+            self.assertFalse(packet_in & quarantine)
+
+
+if __name__ == '__main__':
+    unittest.main()
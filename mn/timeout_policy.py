@@ -0,0 +1,110 @@
+'''Policies that choose the idle and hard timeouts of new flows.
+
+SimpleSwitch14 asks its policy for (idle_timeout, hard_timeout) every
+time it installs a flow, passing the current flow table occupancy and
+the packet rate last observed for that flow. The policy is picked with
+[simple_switch] timeout_policy, either by name from POLICIES or as a
+'module:Class' path to a TimeoutPolicy subclass.
+'''
+
+import importlib
+from typing import Tuple
+
+
+class TimeoutPolicy:
+    '''Base class. Returns the configured timeouts unchanged.'''
+
+    # whether timeouts() looks at occupancy, which is only known when
+    # the controller models the flow table (flow_table_size)
+    uses_occupancy = False
+
+    def __init__(self, idle_timeout: int = 10, hard_timeout: int = 20):
+        self.idle_timeout = idle_timeout
+        self.hard_timeout = hard_timeout
+
+    @classmethod
+    def from_conf(cls, conf) -> 'TimeoutPolicy':
+        '''Builds the policy from the [simple_switch] options.'''
+        return cls(conf.idle_timeout, conf.hard_timeout)
+
+    def timeouts(self, occupancy: float, rate: float) -> Tuple[int, int]:
+        '''Returns (idle_timeout, hard_timeout) for a new flow.
+
+        occupancy is the fraction of the flow table in use (0 when
+        flow tracking is off) and rate is the flow's last observed
+        packet rate in packets per second (0 if it has none).
+        '''
+        return self.idle_timeout, self.hard_timeout
+
+
+class FixedTimeouts(TimeoutPolicy):
+    '''The original behaviour: every flow gets the same timeouts.'''
+
+
+class AdaptiveTimeouts(TimeoutPolicy):
+    '''Shortens the idle timeout of quiet flows as the table fills up.
+
+    Below the pressure occupancy every flow gets the configured
+    timeouts. Above it, flows that have not been seen sending at
+    least active_rate packets per second get an idle timeout that
+    shrinks linearly down to min_idle as the table becomes full, so
+    they leave room for new flows sooner. Established flows keep the
+    full idle timeout. The hard timeout is never changed.
+    '''
+
+    uses_occupancy = True
+
+    def __init__(
+            self,
+            idle_timeout: int = 10,
+            hard_timeout: int = 20,
+            min_idle: int = 1,
+            pressure: float = 0.5,
+            active_rate: float = 1.0):
+        super().__init__(idle_timeout, hard_timeout)
+        if not 0 <= pressure < 1:
+            raise ValueError('pressure must be in [0, 1) (got: {})'
+                             .format(pressure))
+        self.min_idle = min(min_idle, idle_timeout)
+        self.pressure = pressure
+        self.active_rate = active_rate
+
+    @classmethod
+    def from_conf(cls, conf) -> 'AdaptiveTimeouts':
+        return cls(conf.idle_timeout, conf.hard_timeout,
+                   conf.adaptive_min_idle, conf.adaptive_pressure,
+                   conf.adaptive_active_rate)
+
+    def timeouts(self, occupancy: float, rate: float) -> Tuple[int, int]:
+        if occupancy <= self.pressure or rate >= self.active_rate:
+            return self.idle_timeout, self.hard_timeout
+
+        # how far past the pressure point the table is, in [0, 1]
+        load = min((occupancy - self.pressure) / (1 - self.pressure), 1.0)
+        idle = self.idle_timeout - (self.idle_timeout - self.min_idle) * load
+        return max(self.min_idle, round(idle)), self.hard_timeout
+
+
+POLICIES = {
+    'fixed': FixedTimeouts,
+    'adaptive': AdaptiveTimeouts,
+}
+
+
+def make_policy(name: str, conf) -> TimeoutPolicy:
+    '''Returns the policy called name, configured from conf.
+
+    name is a key of POLICIES or a 'module:Class' import path.
+    '''
+    if name in POLICIES:
+        cls = POLICIES[name]
+    elif ':' in name:
+        module, attr = name.split(':', 1)
+        cls = getattr(importlib.import_module(module), attr)
+    else:
+        raise ValueError('Unknown timeout policy {} (expected one of {} '
+                         'or module:Class)'.format(name, list(POLICIES)))
+
+    if not (isinstance(cls, type) and issubclass(cls, TimeoutPolicy)):
+        raise ValueError('{} is not a TimeoutPolicy'.format(name))
+    return cls.from_conf(conf)
@@ -22,16 +22,23 @@ from mininet.node import OVSSwitch
 
 class TestbedTopo( Topo ):
 
-    def __init__( self ):
+    def __init__( self, instance=None ):
+        """instance numbers the node names (ah3, s3x4, ...) so several
+           networks can run side by side; dpids stay 4 and 5."""
 
         Topo.__init__( self )
 
-        client = self.addHost( 'ch')
-        attacker = self.addHost( 'ah' )
-        server = self.addHost( 'sh' )
+        suffix = '' if instance is None else str( instance )
+        prefix = '' if instance is None else '{}x'.format( instance )
 
-        clientSwitch = self.addSwitch( 's4', cls = OVSSwitch, protocols='OpenFlow14' )
-        serverSwitch = self.addSwitch( 's5', cls = OVSSwitch, protocols='OpenFlow14' )
+        client = self.addHost( 'ch' + suffix )
+        attacker = self.addHost( 'ah' + suffix )
+        server = self.addHost( 'sh' + suffix )
+
+        clientSwitch = self.addSwitch( 's' + prefix + '4', cls = OVSSwitch,
+                                       protocols='OpenFlow14', dpid='4' )
+        serverSwitch = self.addSwitch( 's' + prefix + '5', cls = OVSSwitch,
+                                       protocols='OpenFlow14', dpid='5' )
 
         self.addLink(client, clientSwitch)
         self.addLink(attacker, clientSwitch)
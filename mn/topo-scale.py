@@ -0,0 +1,140 @@
+"""Parametric topologies for scaling experiments.
+
+Linear, tree and fat-tree layouts of OpenFlow 1.4 Open vSwitch
+switches, with benign hosts (h1, h2, ...), attackers (a1, a2, ...) and
+servers (srv1, ...) spread over the edge switches. Switch si has dpid
+i; nothing else depends on the numbering, since the monitors discover
+the switches through the controller's /stats/switches.
+
+    linear   switches s1 - s2 - ... - sN, hosts on all of them
+    tree     depth levels of fanout children each, hosts on the leaves
+    fattree  a k-ary fat-tree: (k/2)^2 core switches and k pods of k/2
+             aggregation and k/2 edge switches (5k^2/4 in all), hosts
+             on the edge switches
+
+The fat-tree has redundant paths, so its switches run STP to keep the
+learning switch's floods from looping; give it about 30 seconds to
+converge after the network starts.
+
+Pass e.g. '--topo fattree,4,16,2,1' (k, benign, attackers, servers) or
+'--topo linear,50,100,10' to mn along with '--custom topo-scale.py'.
+"""
+
+from mininet.topo import Topo
+from mininet.node import OVSSwitch
+
+class ScaleTopo( Topo ):
+    "Hosts attached round-robin to the edge switches a subclass builds."
+
+    def build( self, *shape, benign=4, attackers=1, servers=1 ):
+        self.benignHosts = []
+        self.attackerHosts = []
+        self.serverHosts = []
+
+        edges = self.buildSwitches( *shape )
+
+        # servers from the last edge switch back, everyone else from
+        # the first one forward, so a flood crosses the network
+        for i in range( servers ):
+            server = self.addHost( 'srv%d' % ( i + 1 ) )
+            self.addLink( server, edges[ -1 - i % len( edges ) ] )
+            self.serverHosts.append( server )
+        for i in range( benign ):
+            host = self.addHost( 'h%d' % ( i + 1 ) )
+            self.addLink( host, edges[ i % len( edges ) ] )
+            self.benignHosts.append( host )
+        for i in range( attackers ):
+            attacker = self.addHost( 'a%d' % ( i + 1 ) )
+            # interleaved with the benign hosts
+            self.addLink( attacker,
+                          edges[ i * len( edges ) // attackers ] )
+            self.attackerHosts.append( attacker )
+
+    def buildSwitches( self, *shape ):
+        "Adds the switches and returns the ones hosts attach to."
+        raise NotImplementedError
+
+    def addNumberedSwitch( self, **opts ):
+        "Adds switch s<n> with dpid n, n counting from 1."
+        n = len( self.switches() ) + 1
+        return self.addSwitch( 's%d' % n, cls=OVSSwitch,
+                               protocols='OpenFlow14', dpid='%x' % n,
+                               **opts )
+
+class LinearTopo( ScaleTopo ):
+    "A chain of switches."
+
+    def build( self, switches=4, **params ):
+        ScaleTopo.build( self, switches, **params )
+
+    def buildSwitches( self, switches=4 ):
+        if switches < 1:
+            raise ValueError( 'need at least one switch (got: %s)'
+                              % switches )
+        chain = [ self.addNumberedSwitch() for _ in range( switches ) ]
+        for left, right in zip( chain, chain[ 1: ] ):
+            self.addLink( left, right )
+        return chain
+
+class TreeTopo( ScaleTopo ):
+    "A tree of depth levels below the root, fanout children each."
+
+    def build( self, depth=2, fanout=4, **params ):
+        ScaleTopo.build( self, depth, fanout, **params )
+
+    def buildSwitches( self, depth=2, fanout=4 ):
+        if depth < 0 or fanout < 1:
+            raise ValueError( 'need depth >= 0 and fanout >= 1 '
+                              '(got: %s, %s)' % ( depth, fanout ) )
+        level = [ self.addNumberedSwitch() ]
+        for _ in range( depth ):
+            children = []
+            for parent in level:
+                for _ in range( fanout ):
+                    child = self.addNumberedSwitch()
+                    self.addLink( parent, child )
+                    children.append( child )
+            level = children
+        return level
+
+class FatTreeTopo( ScaleTopo ):
+    "A k-ary fat-tree, with STP on every switch."
+
+    def build( self, k=4, **params ):
+        ScaleTopo.build( self, k, **params )
+
+    def buildSwitches( self, k=4 ):
+        if k < 2 or k % 2:
+            raise ValueError( 'k must be even and at least 2 (got: %s)'
+                              % k )
+        half = k // 2
+        core = [ self.addNumberedSwitch( stp=True )
+                 for _ in range( half * half ) ]
+        edges = []
+        for _ in range( k ):
+            aggregation = [ self.addNumberedSwitch( stp=True )
+                            for _ in range( half ) ]
+            pod = [ self.addNumberedSwitch( stp=True )
+                    for _ in range( half ) ]
+            for i, agg in enumerate( aggregation ):
+                # each aggregation switch reaches its own group of cores
+                for switch in core[ i * half:( i + 1 ) * half ]:
+                    self.addLink( agg, switch )
+                for edge in pod:
+                    self.addLink( agg, edge )
+            edges.extend( pod )
+        return edges
+
+TOPOLOGIES = { 'linear': LinearTopo, 'tree': TreeTopo,
+               'fattree': FatTreeTopo }
+
+def _positional( cls ):
+    "Lets mn pass the shape, then benign, attackers and servers."
+    shape = { LinearTopo: 1, TreeTopo: 2, FatTreeTopo: 1 }[ cls ]
+    def make( *args ):
+        counts = dict( zip( ( 'benign', 'attackers', 'servers' ),
+                            args[ shape: ] ) )
+        return cls( *args[ :shape ], **counts )
+    return make
+
+topos = { name: _positional( cls ) for name, cls in TOPOLOGIES.items() }